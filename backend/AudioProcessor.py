@@ -4,41 +4,801 @@ Handles the actual audio processing using the audio-separator library.
 """
 from services.log_interceptor import intercept
 import os
+import json
 import logging
-from typing import Dict, Optional, Callable
+import numpy as np
+import soundfile as sf
+from concurrent.futures import Future, wait as wait_futures
+from contextlib import contextmanager
+from importlib.metadata import version, PackageNotFoundError
+from typing import Any, Dict, Iterator, List, Optional, Callable, Set, Tuple, TYPE_CHECKING
 
 from audio_separator.separator import Separator
-from modules import MODULE_REGISTRY, get_module
+from modules import MODULE_REGISTRY, DEFAULT_PRESET, ORIGINAL_TERM, get_module, get_consumed_stems, get_preset_params, is_derived
+from ModelCache import ModelCache
+from ResultCache import ResultCache
+from StemEncoder import StemEncoder, EncodeBatch
+from utils.pcm import PcmStore, PCM_CHANNELS
+from utils.audio_blocks import array_blocks, mix_blocks
+from utils.chunking import ChunkCheckpoint, DEFAULT_REGION_PADDING_SECONDS, plan_windows, crossfade, splice_blocks, open_partial, partial_path
+from utils.state import write_json
+
+if TYPE_CHECKING:
+    from SegmentPool import SegmentPool
+
+# Default memory budget for resident models
+DEFAULT_MODEL_CACHE_BYTES = 4096 * 1024 ** 2
+
+# Overlap crossfaded between consecutive chunks of long inputs
+DEFAULT_CHUNK_OVERLAP_SECONDS = 5.0
+
+# Segment-parallel inference decodes at the sample rate every supported model uses,
+# so the API process does not need to load the model to know it
+SEGMENT_SAMPLE_RATE = 44100
+MIN_SEGMENT_SECONDS = 30.0
+
+# Derived modules combine stems at the rate every supported model writes
+DERIVED_SAMPLE_RATE = 44100
+
+# Checkpoints of chunked separations, relative to the project folder
+CHUNK_FOLDER = os.path.join(".cache", "chunks")
+
+# Normalization gains of each module's stems, relative to the project folder
+GAINS_FOLDER = os.path.join(".cache", "gains")
+
+# Hand-over modes for stems consumed by dependent modules
+INTERMEDIATE_MEMORY = "memory"
+INTERMEDIATE_RAW = "raw"
+INTERMEDIATE_OFF = "off"
+INTERMEDIATE_MODES = (INTERMEDIATE_MEMORY, INTERMEDIATE_RAW, INTERMEDIATE_OFF)
+
+try:
+    _AUDIO_SEPARATOR_VERSION = version("audio-separator")
+except PackageNotFoundError:
+    _AUDIO_SEPARATOR_VERSION = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def _as_frames(stem_source: Any) -> np.ndarray:
+    """Returns a stem as a float32 array of shape (samples, channels)."""
+    source = np.asarray(stem_source, dtype=np.float32)
+    if source.ndim == 2 and source.shape[0] <= 2 < source.shape[1]:
+        source = source.T
+    return source
+
+
+def _normalization_gain(instance: Any, peak: float) -> float:
+    """Gain audio-separator's peak normalization applies to audio with the given peak."""
+    max_peak = getattr(instance, "normalization_threshold", 0.9)
+    min_peak = getattr(instance, "amplification_threshold", 0.0)
+    if peak > max_peak:
+        return max_peak / peak
+    if min_peak and 0 < peak < min_peak:
+        return min_peak / peak
+    return 1.0
+
+
+def _peak(array: np.ndarray, block_frames: int = 1 << 20) -> float:
+    """Absolute peak of an array, read in blocks so memmaps are not loaded at once."""
+    peak = 0.0
+    for start in range(0, len(array), block_frames):
+        block = array[start:start + block_frames]
+        if block.size:
+            peak = max(peak, float(np.max(np.abs(block))))
+    return peak
+
+
+def _normalize_stem(instance: Any, stem_source: Any) -> Tuple[np.ndarray, float]:
+    """
+    Applies audio-separator's output peak normalization to a stem.
+    
+    Returns:
+        float32 array of shape (samples, channels) and the gain applied to it
+    """
+    source = _as_frames(stem_source)
+    gain = _normalization_gain(instance, _peak(source))
+    return (source * gain if gain != 1.0 else source), gain
+
+
+def _splice_region(existing: np.ndarray, separated: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Blends a re-separated window into the stem audio it replaces.
+    
+    The window is level-matched to the existing stem (least squares over the
+    padding around [start, end), where both are separations of the same audio),
+    then crossfaded in over the leading padding and out over the trailing one.
+    
+    Returns:
+        float32 array of the window's length, clipped to [-1, 1]
+    """
+    padding = np.r_[0:start, end:len(existing)]
+    reference = padding if len(padding) else slice(None)
+    energy = float(np.sum(np.square(separated[reference], dtype=np.float64)))
+    gain = float(np.sum(existing[reference].astype(np.float64) * separated[reference])) / energy if energy > 0 else 1.0
+    gain = min(4.0, max(0.25, gain))  # Near-silent padding gives no usable estimate
+    
+    region = separated * np.float32(gain)
+    region[:start] = crossfade(existing[:start], region[:start])
+    region[end:] = crossfade(region[end:], existing[end:])
+    return np.clip(region, -1.0, 1.0)
+
+
+def _chunk_progress(callback: Optional[Callable[[str, str], None]], index: int, total: int):
+    """Wraps a progress callback so per-window percentages report progress over the whole input."""
+    if callback is None:
+        return None
+    
+    def scaled(message: str, event_type: str = "processing"):
+        if event_type == "processing" and "%" in message:
+            try:
+                percent = float(message.split("%")[0].split()[-1])
+                message = f"{(index + percent / 100) / total * 100:.0f}%"
+            except (ValueError, IndexError):
+                pass
+        callback(message, event_type)
+    return scaled
+
+
 class AudioProcessor:
     """
     Stateless executor for audio separation modules.
     
     This class focuses solely on running audio separations.
     Project/session state management is handled by AudioProject.
+    Loaded models are kept resident in a ModelCache between runs.
     """
     
-    def __init__(self, output_format: str = "flac"):
+    def __init__(
+        self,
+        output_format: str = "flac",
+        model_cache_bytes: int = DEFAULT_MODEL_CACHE_BYTES,
+        result_cache: Optional[ResultCache] = None,
+        intermediate_mode: str = INTERMEDIATE_MEMORY,
+        encoder: Optional[StemEncoder] = None,
+        chunk_seconds: float = 0.0,
+        chunk_overlap_seconds: float = DEFAULT_CHUNK_OVERLAP_SECONDS,
+        segment_pool: Optional["SegmentPool"] = None
+    ):
         """
         Initialize the processor.
         
         Args:
             output_format: Output format for separated audio (default: flac)
+            model_cache_bytes: Memory budget for loaded models (0 disables caching)
+            result_cache: Optional cache of separation outputs shared across projects
+            intermediate_mode: How stems consumed by dependent modules are handed over:
+                "memory" (arrays kept in-process), "raw" (float32 files, works across
+                processes) or "off" (children decode the written stem file)
+            encoder: Background stem encoder (default: StemEncoder with default settings)
+            chunk_seconds: Inputs longer than this are separated in overlapping chunks
+                with bounded memory and per-chunk checkpoints (0 disables chunking)
+            chunk_overlap_seconds: Overlap crossfaded between consecutive chunks (and segments)
+            segment_pool: Worker processes separating segments of one input in parallel
+                (CPU-only servers); None runs each module in a single pass
         """
+        if intermediate_mode not in INTERMEDIATE_MODES:
+            raise ValueError(f"Unknown intermediate mode: {intermediate_mode}")
         self.output_format = output_format
-        self.separator = Separator(output_format=self.output_format)
+        self.model_cache = ModelCache(max_bytes=model_cache_bytes)
+        self.result_cache = result_cache
+        self.intermediate_mode = intermediate_mode
+        self.encoder = encoder if encoder is not None else StemEncoder()
+        self.chunk_seconds = chunk_seconds
+        self.chunk_overlap_seconds = chunk_overlap_seconds
+        self.segment_pool = segment_pool
+    
+    def get_separation_params(self, module_name: str, preset: str = DEFAULT_PRESET) -> Dict[str, Any]:
+        """
+        Returns the parameters that affect a module's output (part of the result cache key).
+        
+        Args:
+            module_name: Name of the module
+            preset: Speed/quality preset (see modules.SEPARATION_PRESETS)
+        """
+        return {
+            "preset": preset,
+            "preset_params": get_preset_params(module_name, preset),
+            "output_format": self.output_format,
+            "custom_output_names": get_module(module_name)["custom_output_names"],
+            "audio_separator": _AUDIO_SEPARATOR_VERSION,
+            "chunk_seconds": self.chunk_seconds,
+            "segment_workers": self.segment_pool.max_workers if self.segment_pool else 0,
+        }
+    
+    def _load_separator(
+        self,
+        model_filename: str,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None
+    ) -> Separator:
+        """
+        Creates a Separator with the given model loaded.
+        
+        Args:
+            model_filename: Model checkpoint to load
+            interceptor_callback: Callback function (message, event_type) for download progress
+            
+        Returns:
+            Separator instance ready to run
+        """
+        separator = Separator(output_format=self.output_format)
+        
+        # Load model - wrap with intercept to capture download progress
+        logger.info(f"Loading model: {model_filename}")
+        with intercept(interceptor_callback, event_type="model_download"):
+            separator.load_model(model_filename=model_filename)
+        return separator
+    
+    @contextmanager
+    def _applied_preset(self, separator: Separator, module_name: str, preset: str):
+        """
+        Applies a preset's architecture parameters to the loaded model for one run.
+        
+        audio-separator reads them from the model instance at separation time, so
+        the same cached model serves every preset.
+        """
+        instance = separator.model_instance
+        params = get_preset_params(module_name, preset)
+        previous = {key: getattr(instance, key) for key in params if hasattr(instance, key)}
+        for key in previous:
+            setattr(instance, key, params[key])
+        try:
+            yield
+        finally:
+            for key, value in previous.items():
+                setattr(instance, key, value)
+    
+    @contextmanager
+    def _decoded_input(self, separator: Separator, pcm_store: Optional[PcmStore]):
+        """
+        Makes the loaded model read its input from the shared PCM store.
+        
+        audio-separator decodes the input path in `prepare_mix`, which also accepts
+        an array; the model instance's method is swapped for the duration of the run.
+        """
+        instance = separator.model_instance
+        if pcm_store is None:
+            yield
+            return
+        
+        original_prepare_mix = instance.prepare_mix
+        
+        def prepare_mix(mix):
+            if isinstance(mix, str):
+                try:
+                    mix = pcm_store.open(mix, instance.sample_rate)
+                except RuntimeError as e:
+                    logger.warning(f"Falling back to direct decode: {e}")
+            return original_prepare_mix(mix)
+        
+        instance.prepare_mix = prepare_mix
+        try:
+            yield
+        finally:
+            instance.__dict__.pop("prepare_mix", None)
+    
+    @contextmanager
+    def _stem_writer(
+        self,
+        separator: Separator,
+        module_name: str,
+        output_dir: str,
+        consumed: Set[str],
+        pcm_store: Optional[PcmStore],
+        encode_batch: Optional[EncodeBatch],
+        written: Dict[str, Optional[Future]],
+        gains: Dict[str, float]
+    ):
+        """
+        Takes over writing the module's stems (audio-separator's `write_audio`).
+        
+        Stems consumed by dependent modules are handed to the PCM store, so children
+        read the array instead of decoding the file. FLAC stems are queued on the
+        background encoder instead of being encoded before the next inference.
+        
+        Args:
+            separator: Separator about to run
+            module_name: Module being run (encode time is accounted to it)
+            output_dir: Directory the stems are written to
+            consumed: Output filenames used as input by dependent modules
+            pcm_store: Shared decoded inputs of the job
+            encode_batch: Batch to queue encodes on (None writes synchronously)
+            written: Filled with filename -> encode Future (None if written synchronously)
+            gains: Filled with filename -> peak normalization gain applied to the stem
+        """
+        instance = separator.model_instance
+        handoff = pcm_store is not None and self.intermediate_mode != INTERMEDIATE_OFF
+        background = encode_batch is not None and self.output_format.lower() == "flac"
+        original_write_audio = instance.write_audio
+        
+        def write_audio(stem_path, stem_source):
+            name = os.path.basename(stem_path)
+            path = os.path.join(output_dir, name)
+            if not background and not (handoff and name in consumed):
+                gains[name] = _normalization_gain(instance, _peak(_as_frames(stem_source)))
+                written[name] = None
+                return original_write_audio(stem_path, stem_source)
+            
+            # Same peak normalization the writer applies, so children see what the file holds
+            source, gains[name] = _normalize_stem(instance, stem_source)
+            if handoff and name in consumed:
+                in_memory = self.intermediate_mode == INTERMEDIATE_MEMORY
+                pcm_store.put(path, instance.sample_rate, source, in_memory=in_memory)
+            if background:
+                written[name] = encode_batch.submit(module_name, path, source, instance.sample_rate)
+            else:
+                written[name] = None
+                original_write_audio(stem_path, stem_source)
+        
+        instance.write_audio = write_audio
+        try:
+            yield
+        finally:
+            instance.__dict__.pop("write_audio", None)
+    
+    def _chunkable_input(self, separator: Separator, input_path: str, pcm_store: Optional[PcmStore]) -> Optional[np.ndarray]:
+        """
+        Returns the decoded input if it is long enough to be separated in chunks, else None.
+        Chunking reads windows from the job's PCM store, so it needs one.
+        """
+        if not self.chunk_seconds or pcm_store is None:
+            return None
+        sample_rate = separator.model_instance.sample_rate
+        try:
+            mix = pcm_store.open(input_path, sample_rate)
+        except RuntimeError as e:
+            logger.warning(f"Cannot chunk {os.path.basename(input_path)}: {e}")
+            return None
+        if len(mix) <= (self.chunk_seconds + self.chunk_overlap_seconds) * sample_rate:
+            return None
+        return mix
+    
+    def _separate_window(
+        self,
+        separator: Separator,
+        window: np.ndarray,
+        input_path: str,
+        custom_output_names: Dict[str, str],
+        interceptor_callback: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Runs the loaded model on an in-memory window and captures the raw stems
+        instead of writing them.
+        
+        Input amplification is disabled for the window: the caller normalizes the
+        whole input once, so quiet passages are not boosted chunk by chunk.
+        
+        Returns:
+            Mapping of output filename -> float32 array of shape (samples, channels)
+        """
+        instance = separator.model_instance
+        original_prepare_mix = instance.prepare_mix
+        amplification = getattr(instance, "amplification_threshold", None)
+        captured: Dict[str, np.ndarray] = {}
+        
+        def prepare_mix(mix):
+            return original_prepare_mix(window)
+        
+        def write_audio(stem_path, stem_source):
+            captured[os.path.basename(stem_path)] = _as_frames(stem_source)
+        
+        instance.prepare_mix = prepare_mix
+        instance.write_audio = write_audio
+        if amplification:
+            instance.amplification_threshold = 0.0
+        try:
+            with intercept(interceptor_callback, event_type="processing"):
+                separator.separate(input_path, custom_output_names=custom_output_names)
+        finally:
+            instance.__dict__.pop("prepare_mix", None)
+            instance.__dict__.pop("write_audio", None)
+            if amplification:
+                instance.amplification_threshold = amplification
+        return captured
+    
+    def separate_window(
+        self,
+        module_name: str,
+        window: np.ndarray,
+        input_path: str,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        preset: str = DEFAULT_PRESET
+    ) -> Dict[str, np.ndarray]:
+        """
+        Separates an in-memory window with the module's model (loaded through the model cache).
+        Used by segment workers.
+        
+        Args:
+            module_name: Module to run
+            window: Audio of shape (samples, channels)
+            input_path: Original input path (names the outputs)
+            interceptor_callback: Callback function (message, event_type) for progress updates
+            preset: Speed/quality preset
+            
+        Returns:
+            Mapping of output filename -> float32 array of shape (samples, channels)
+        """
+        config = get_module(module_name)
+        if not config:
+            raise ValueError(f"Unknown module: {module_name}")
+        loader = lambda: self._load_separator(config["model"], interceptor_callback)
+        with self.model_cache.acquire(config["model"], loader) as separator, \
+                self._applied_preset(separator, module_name, preset):
+            return self._separate_window(separator, window, input_path, config["custom_output_names"], interceptor_callback)
+    
+    def reprocess_region(
+        self,
+        module_name: str,
+        input_path: str,
+        output_dir: str,
+        start_seconds: float,
+        end_seconds: float,
+        pcm_store: PcmStore,
+        padding_seconds: float = DEFAULT_REGION_PADDING_SECONDS,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        preset: str = DEFAULT_PRESET
+    ) -> Dict[str, str]:
+        """
+        Re-separates [start, end] of a module's input (plus padding) and splices
+        the result into the module's existing stem files.
+        
+        Each stem is rewritten next to itself and moved into place, so a result
+        cache entry hardlinked to the old file keeps its content.
+        
+        Args:
+            module_name: Module whose stems are updated
+            input_path: Input the module was run on
+            output_dir: Directory holding the stems
+            start_seconds: Start of the region
+            end_seconds: End of the region
+            pcm_store: Shared decoded inputs of the job
+            padding_seconds: Context separated on each side and used for the crossfades
+            interceptor_callback: Callback function (message, event_type) for progress updates
+            preset: Speed/quality preset to separate the region with
+            
+        Returns:
+            Mapping of stem_key -> rewritten output path
+            
+        Raises:
+            ValueError: If the module is unknown, the region is empty or a stem does not match the input
+        """
+        config = get_module(module_name)
+        if not config:
+            raise ValueError(f"Unknown module: {module_name}")
+        
+        sample_rate = SEGMENT_SAMPLE_RATE
+        mix = pcm_store.open(input_path, sample_rate)
+        start = max(0, int(start_seconds * sample_rate))
+        end = min(len(mix), int(end_seconds * sample_rate))
+        if end <= start:
+            raise ValueError(f"Empty region [{start_seconds}, {end_seconds}] for an input of {len(mix) / sample_rate:.1f}s")
+        padding = int(max(0.0, padding_seconds) * sample_rate)
+        first, last = max(0, start - padding), min(len(mix), end + padding)
+        
+        # Same input gain as a chunked pass, so the window sees the level the whole input did
+        input_gain = min(1.0, _normalization_gain(None, _peak(mix)))
+        window = np.asarray(mix[first:last], dtype=np.float32) * np.float32(input_gain)
+        logger.info(f"Re-separating {module_name} from {first / sample_rate:.1f}s to {last / sample_rate:.1f}s ({preset})")
+        stems = self.separate_window(module_name, window, input_path, interceptor_callback, preset)
+        
+        outputs = {}
+        for stem_key, filename in config["custom_output_names"].items():
+            path = os.path.join(output_dir, f"{filename}.{self.output_format}")
+            source = stems.get(os.path.basename(path))
+            if source is None or not os.path.exists(path):
+                logger.warning(f"Skipping region update of missing stem: {path}")
+                continue
+            
+            with sf.SoundFile(path) as f:
+                if f.samplerate != sample_rate or f.frames < last:
+                    raise ValueError(f"{os.path.basename(path)} does not match the module input ({f.frames} frames at {f.samplerate} Hz)")
+                channels = f.channels
+                f.seek(first)
+                existing = f.read(last - first, dtype="float32", always_2d=True)
+            
+            # Models may pad their output; align it to the window and the stem's layout
+            if len(source) < last - first:
+                source = np.pad(source, ((0, last - first - len(source)), (0, 0)))
+            source = source[:last - first]
+            if source.shape[1] != channels:
+                source = np.repeat(source[:, :1], channels, axis=1) if source.shape[1] == 1 else source[:, :channels]
+            
+            region = _splice_region(existing, np.array(source, dtype=np.float32), start - first, end - first)
+            self.encoder.encode_blocks(path, splice_blocks(path, region, first), sample_rate, channels)
+            outputs[stem_key] = path
+        
+        logger.info(f"Region of '{module_name}' updated. Stems: {list(outputs.keys())}")
+        return outputs
+    
+    def _execute_chunked(
+        self,
+        module_name: str,
+        input_path: str,
+        mix: np.ndarray,
+        sample_rate: int,
+        output_dir: str,
+        chunk_frames: int,
+        separate_windows: Callable[[List[Tuple[int, int]], float, int], Iterator[Dict[str, np.ndarray]]],
+        instance: Any = None,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        checkpoint_key: Optional[str] = None,
+        preset: str = DEFAULT_PRESET,
+        gains: Optional[Dict[str, float]] = None
+    ) -> Dict[str, None]:
+        """
+        Separates an input window by window with bounded memory.
+        
+        Consecutive windows overlap and are crossfaded. Every finished chunk is
+        appended to a partial stem next to the output (<stem>.partial.wav), so the
+        separated prefix is playable while later chunks run, and checkpointed under
+        the project's .cache/chunks/<module>, so a restarted job resumes after the
+        last finished chunk. The partials hold the stems at the input normalization
+        gain applied to every window; at the end the stem files are encoded from
+        them, normalized by the peak over the whole stem like a single pass.
+        
+        Args:
+            module_name: Module being run
+            input_path: Path to the input audio file
+            mix: Decoded input of shape (samples, channels), typically a memmap
+            sample_rate: Sample rate of mix
+            output_dir: Directory to write output files
+            chunk_frames: Distance between window starts
+            separate_windows: Function (windows, input_gain, first_index) yielding each
+                window's stems in order
+            instance: Model instance providing the normalization thresholds (None uses the defaults)
+            interceptor_callback: Callback function (message, event_type) for progress updates
+            checkpoint_key: Identifies the input for resuming (e.g. the result cache key)
+            preset: Speed/quality preset the windows are separated with
+            gains: Filled with filename -> overall gain of the stem relative to the
+                input (input and output normalization)
+            
+        Returns:
+            Mapping of output filename -> None (written synchronously)
+        """
+        config = get_module(module_name)
+        overlap_frames = min(int(self.chunk_overlap_seconds * sample_rate), chunk_frames // 2)
+        windows = plan_windows(len(mix), chunk_frames, overlap_frames)
+        
+        checkpoint = ChunkCheckpoint(os.path.join(output_dir, CHUNK_FOLDER, module_name), {
+            "input": checkpoint_key or os.path.basename(input_path),
+            "model": config["model"],
+            "frames": len(mix),
+            "sample_rate": sample_rate,
+            "chunk_frames": chunk_frames,
+            "overlap_frames": overlap_frames,
+            "preset": preset,
+        })
+        first = checkpoint.load()
+        tails = checkpoint.tails()
+        
+        # Normalize the input once, like a single pass would, so every window sees the same gain
+        input_gain = min(1.0, _normalization_gain(instance, _peak(mix)))
+        
+        partials: Dict[str, sf.SoundFile] = {}
+        try:
+            if first:
+                # Resume appending where the last finished chunk ended
+                resume_frames = windows[first][0] if first < len(windows) else len(mix)
+                try:
+                    for name in checkpoint.state["stems"]:
+                        partials[name] = open_partial(
+                            partial_path(os.path.join(output_dir, name)), sample_rate, 0, resume_frames
+                        )
+                except ValueError as e:
+                    logger.warning(f"{e}; separating {module_name} from the start")
+                    for partial in partials.values():
+                        partial.close()
+                    partials = {}
+                    checkpoint.clear()
+                    first, tails = checkpoint.load(), {}
+            logger.info(f"Separating {module_name} in {len(windows)} chunks ({first} already done)")
+            
+            results = separate_windows(windows[first:], input_gain, first)
+            for index, stems in enumerate(results, start=first):
+                start, end = windows[index]
+                next_start = windows[index + 1][0] if index + 1 < len(windows) else end
+                
+                new_tails = {}
+                for name, source in stems.items():
+                    # Models may pad their output; align it to the window
+                    if len(source) < end - start:
+                        source = np.pad(source, ((0, end - start - len(source)), (0, 0)))
+                    segment = np.array(source[:next_start - start])
+                    tail = tails.get(name)
+                    if tail is not None and len(tail):
+                        segment[:len(tail)] = crossfade(tail, segment[:len(tail)])
+                    new_tails[name] = source[next_start - start:end - start]
+                    
+                    partial = partials.get(name)
+                    if partial is None:
+                        partial = partials[name] = open_partial(
+                            partial_path(os.path.join(output_dir, name)), sample_rate, segment.shape[1]
+                        )
+                    partial.write(segment)
+                    partial.flush()  # Updates the WAV header, so readers see the new chunk
+                
+                checkpoint.save_chunk(index, new_tails)
+                tails = new_tails
+                if interceptor_callback:
+                    published = ",".join(os.path.basename(partial_path(name)) for name in partials)
+                    interceptor_callback(f"{index + 1}/{len(windows)}/{next_start / sample_rate:.1f}/{published}", "chunk")
+        finally:
+            for partial in partials.values():
+                partial.close()
+        
+        # Normalized by the peak over the whole stem, like audio-separator does in a single pass
+        written: Dict[str, None] = {}
+        for name in partials:
+            path = os.path.join(output_dir, name)
+            with sf.SoundFile(partial_path(path)) as partial:
+                peak = 0.0
+                for block in partial.blocks(blocksize=65536, frames=len(mix), dtype="float32", always_2d=True):
+                    peak = max(peak, float(np.max(np.abs(block))) if block.size else 0.0)
+                gain = _normalization_gain(instance, peak)
+                partial.seek(0)
+                blocks = (
+                    block * np.float32(gain)
+                    for block in partial.blocks(blocksize=65536, frames=len(mix), dtype="float32", always_2d=True)
+                )
+                self.encoder.encode_blocks(path, blocks, sample_rate, partial.channels)
+            os.remove(partial_path(path))
+            written[name] = None
+            if gains is not None:
+                gains[name] = input_gain * gain
+        checkpoint.clear()
+        return written
+    
+    def _execute_local_chunks(
+        self,
+        separator: Separator,
+        module_name: str,
+        input_path: str,
+        mix: np.ndarray,
+        output_dir: str,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        checkpoint_key: Optional[str] = None,
+        preset: str = DEFAULT_PRESET,
+        gains: Optional[Dict[str, float]] = None
+    ) -> Dict[str, None]:
+        """Chunked separation of a long input with the already loaded model (preset applied), one window at a time."""
+        instance = separator.model_instance
+        custom_output_names = get_module(module_name)["custom_output_names"]
+        
+        def separate_windows(windows, input_gain, first):
+            total = first + len(windows)
+            for index, (start, end) in enumerate(windows, start=first):
+                window = np.asarray(mix[start:end], dtype=np.float32) * np.float32(input_gain)
+                yield self._separate_window(
+                    separator, window, input_path, custom_output_names,
+                    _chunk_progress(interceptor_callback, index, total)
+                )
+        
+        return self._execute_chunked(
+            module_name, input_path, mix, instance.sample_rate, output_dir,
+            int(self.chunk_seconds * instance.sample_rate), separate_windows,
+            instance, interceptor_callback, checkpoint_key, preset, gains
+        )
+    
+    def _execute_segments(
+        self,
+        module_name: str,
+        input_path: str,
+        output_dir: str,
+        pcm_store: PcmStore,
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        checkpoint_key: Optional[str] = None,
+        preset: str = DEFAULT_PRESET,
+        gains: Optional[Dict[str, float]] = None
+    ) -> Optional[Dict[str, None]]:
+        """
+        Separates the input in overlapping segments spread over the segment pool.
+        
+        Segments are sized so every worker gets one (capped at chunk_seconds for long inputs).
+        
+        Returns:
+            Mapping of output filename -> None, or None if the input could not be decoded
+        """
+        sample_rate = SEGMENT_SAMPLE_RATE
+        try:
+            mix = pcm_store.open(input_path, sample_rate)
+            pcm_path = pcm_store.export(input_path, sample_rate)
+        except RuntimeError as e:
+            logger.warning(f"Cannot split {os.path.basename(input_path)} into segments: {e}")
+            return None
+        
+        segment_frames = -(-len(mix) // self.segment_pool.max_workers)
+        if self.chunk_seconds:
+            segment_frames = min(segment_frames, int(self.chunk_seconds * sample_rate))
+        segment_frames = max(segment_frames, int(MIN_SEGMENT_SECONDS * sample_rate))
+        
+        def separate_windows(windows, input_gain, first):
+            total = first + len(windows)
+            for index, stems in enumerate(self.segment_pool.map(
+                module_name, input_path, pcm_path, len(mix), windows, input_gain, preset
+            ), start=first):
+                if interceptor_callback:
+                    interceptor_callback(f"{(index + 1) / total * 100:.0f}%", "processing")
+                yield stems
+        
+        logger.info(f"Processing module: {module_name} on {self.segment_pool.max_workers} segment workers...")
+        return self._execute_chunked(
+            module_name, input_path, mix, sample_rate, output_dir, segment_frames,
+            separate_windows, None, interceptor_callback, checkpoint_key, preset, gains
+        )
+    
+    @staticmethod
+    def _gains_path(output_dir: str, module_name: str) -> str:
+        """Path of the file recording a module's stem gains."""
+        return os.path.join(output_dir, GAINS_FOLDER, f"{module_name}.json")
+    
+    def _save_gains(self, output_dir: str, module_name: str, gains: Dict[str, float]) -> None:
+        """Records the peak normalization gain of each of a module's stems (stem_key -> gain)."""
+        path = self._gains_path(output_dir, module_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json(path, gains, indent=2)
+    
+    def get_stem_gains(self, output_dir: str, module_name: str) -> Dict[str, float]:
+        """Returns the recorded gains of a module's stems (empty if none were recorded, i.e. unity)."""
+        try:
+            with open(self._gains_path(output_dir, module_name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+    
+    def _execute_derived(self, module_name: str, input_path: str, output_dir: str, pcm_store: Optional[PcmStore]) -> Dict[str, str]:
+        """
+        Evaluates a derived module: each output is a gain-weighted sum of the
+        parent's stems (in output_dir) and the original input, computed block by
+        block. Sources are read through the PCM store, which resamples them to one
+        rate and stereo and holds stems the parent just handed over; a shorter
+        source counts as silence past its end.
+        
+        The parent's stems were peak normalized one by one, so each stem's gain is
+        undone first to bring it back to the level of the original.
+        
+        Returns:
+            Mapping of stem_key -> output_filepath (written before this returns)
+        """
+        config = get_module(module_name)
+        parent_names = get_module(config["depends_on"])["custom_output_names"]
+        store = pcm_store if pcm_store is not None else PcmStore(os.path.join(output_dir, ".cache", "pcm", module_name))
+        
+        def source_path(term: str) -> str:
+            if term == ORIGINAL_TERM:
+                return input_path
+            return os.path.join(output_dir, f"{parent_names[term]}.{self.output_format}")
+        
+        try:
+            terms = {term for formula in config["formula"].values() for term in formula}
+            sources = {term: store.open(source_path(term), DERIVED_SAMPLE_RATE) for term in terms}
+            stem_gains = self.get_stem_gains(output_dir, config["depends_on"])
+            
+            outputs = {}
+            for stem_key, formula in config["formula"].items():
+                path = os.path.join(output_dir, f"{config['custom_output_names'][stem_key]}.{self.output_format}")
+                weights = [gain / stem_gains.get(term, 1.0) for term, gain in formula.items()]
+                blocks = mix_blocks([array_blocks(sources[term]) for term in formula], weights, PCM_CHANNELS)
+                self.encoder.encode_blocks(path, blocks, DERIVED_SAMPLE_RATE, PCM_CHANNELS)
+                outputs[stem_key] = path
+        finally:
+            if pcm_store is None:
+                store.clear()
+        
+        logger.info(f"Module '{module_name}' derived. Outputs: {list(outputs.keys())}")
+        return outputs
     
     def execute_module(
         self, 
         module_name: str, 
         input_path: str, 
         output_dir: str,
-        interceptor_callback: Optional[Callable[[str, str], None]] = None
+        interceptor_callback: Optional[Callable[[str, str], None]] = None,
+        cache_key: Optional[str] = None,
+        pcm_store: Optional[PcmStore] = None,
+        encode_batch: Optional[EncodeBatch] = None,
+        preset: str = DEFAULT_PRESET
     ) -> Dict[str, str]:
         """
         Executes a single module separation.
@@ -48,6 +808,12 @@ class AudioProcessor:
             input_path: Path to the input audio file
             output_dir: Directory to write output files
             interceptor_callback: Callback function (message, event_type) for progress updates
+            cache_key: Result cache key for this run (see AudioProject.get_module_cache_key)
+            pcm_store: Shared decoded inputs of the job (None decodes the input directly)
+            encode_batch: Job-wide encode batch. When given, stems may still be encoding
+                when this returns; the caller must wait on the batch. When omitted, all
+                stems are on disk before this returns.
+            preset: Speed/quality preset (see modules.SEPARATION_PRESETS)
             
         Returns:
             Mapping of stem_key -> output_filepath
@@ -58,32 +824,93 @@ class AudioProcessor:
         config = get_module(module_name)
         if not config:
             raise ValueError(f"Unknown module: {module_name}")
+        if is_derived(module_name):
+            return self._execute_derived(module_name, input_path, output_dir, pcm_store)
         
-        # Set output directory
-        self.separator.output_dir = output_dir
+        expected = {
+            stem_key: os.path.join(output_dir, f"{filename}.{self.output_format}")
+            for stem_key, filename in config["custom_output_names"].items()
+        }
         
-        # Load model - wrap with intercept to capture download progress
-        logger.info(f"Loading model: {config['model']} for {module_name}")
-        with intercept(interceptor_callback, event_type="model_download"):
-            self.separator.load_model(model_filename=config["model"])
+        # Reuse stems from an identical earlier run if available
+        if self.result_cache is not None and cache_key:
+            outputs = self.result_cache.lookup(cache_key, expected)
+            if outputs is not None:
+                self._save_gains(output_dir, module_name, self.result_cache.gains(cache_key))
+                logger.info(f"Module '{module_name}' served from result cache. Outputs: {list(outputs.keys())}")
+                return outputs
         
-        # Run separation - wrap with intercept to capture processing progress
-        logger.info(f"Processing module: {module_name}...")
-        with intercept(interceptor_callback, event_type="processing"):
-            self.separator.separate(
-                input_path,
-                custom_output_names=config["custom_output_names"]
-            )
+        consumed = {
+            os.path.basename(expected[stem_key])
+            for stem_key in get_consumed_stems(module_name) if stem_key in expected
+        }
+        batch = encode_batch if encode_batch is not None else self.encoder.batch()
+        written: Dict[str, Optional[Future]] = {}
+        gains: Dict[str, float] = {}
+        
+        # On CPU servers with a segment pool the input is split across worker processes
+        segmented = None
+        if self.segment_pool is not None and pcm_store is not None:
+            segmented = self._execute_segments(module_name, input_path, output_dir, pcm_store, interceptor_callback, cache_key, preset, gains)
+        if segmented is not None:
+            written.update(segmented)
+            consumed = set()
+        else:
+            # Get a loaded model from the cache (loads on miss)
+            loader = lambda: self._load_separator(config["model"], interceptor_callback)
+            with self.model_cache.acquire(config["model"], loader) as separator, \
+                    self._applied_preset(separator, module_name, preset):
+                # Set output directory (the model instance keeps its own copy from load time)
+                separator.output_dir = output_dir
+                separator.model_instance.output_dir = output_dir
+            
+                # Long inputs are separated in chunks; dependent modules then decode the written stems
+                mix = self._chunkable_input(separator, input_path, pcm_store)
+                if mix is not None:
+                    written.update(self._execute_local_chunks(
+                        separator, module_name, input_path, mix, output_dir, interceptor_callback, cache_key, preset, gains
+                    ))
+                    consumed = set()
+                else:
+                    # Run separation - wrap with intercept to capture processing progress
+                    logger.info(f"Processing module: {module_name} ({preset})...")
+                    with intercept(interceptor_callback, event_type="processing"), \
+                            self._decoded_input(separator, pcm_store), \
+                            self._stem_writer(separator, module_name, output_dir, consumed, pcm_store, batch, written, gains):
+                        separator.separate(
+                            input_path,
+                            custom_output_names=config["custom_output_names"]
+                        )
         
         # Map and return output paths
         outputs = {}
-        for stem_key, filename in config["custom_output_names"].items():
-            full_path = os.path.join(output_dir, f"{filename}.{self.output_format}")
-            if os.path.exists(full_path):
+        for stem_key, full_path in expected.items():
+            if os.path.basename(full_path) in written or os.path.exists(full_path):
                 outputs[stem_key] = full_path
             else:
                 logger.warning(f"Expected output file not found: {full_path}")
         
+        stem_gains = {stem_key: gains.get(os.path.basename(path), 1.0) for stem_key, path in outputs.items()}
+        self._save_gains(output_dir, module_name, stem_gains)
+        pending = [f for f in written.values() if f is not None]
+        
+        def store_result():
+            if all(os.path.exists(p) for p in outputs.values()) and len(outputs) == len(expected):
+                self.result_cache.store(
+                    cache_key, outputs, config["model"], self.get_separation_params(module_name, preset), stem_gains
+                )
+        
+        if self.result_cache is not None and cache_key:
+            batch.when_done(pending, store_result)
+        
+        if encode_batch is None:
+            batch.wait()
+        elif self.intermediate_mode == INTERMEDIATE_OFF:
+            # Dependent modules decode the stem files, so those must be on disk first
+            for name in consumed:
+                if written.get(name) is not None:
+                    wait_futures([written[name]])
+        
         logger.info(f"Module '{module_name}' completed. Outputs: {list(outputs.keys())}")
         return outputs
 
@@ -4,18 +4,31 @@ Handles project lifecycle, module execution tracking, and dependency resolution.
 """
 import os
 import json
+import time
 import logging
 from typing import Dict, List, Optional, Any, TYPE_CHECKING
 
-from modules import MODULE_REGISTRY, get_module, get_dependency_chain
+from modules import MODULE_REGISTRY, DEFAULT_PRESET, get_module, get_dependency_chain, get_input_stems, is_derived
+from utils.pcm import PcmStore
+from utils.chunking import DEFAULT_REGION_PADDING_SECONDS
+from utils.state import project_lock, write_json
 
 if TYPE_CHECKING:
     from AudioProcessor import AudioProcessor
+    from ModuleScheduler import ModuleScheduler
+    from StemEncoder import EncodeBatch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Hidden per-project folder for derived working files (never listed as stems)
+CACHE_FOLDER = ".cache"
+# Sub-folder of CACHE_FOLDER holding the stems of an excerpt preview
+PREVIEW_FOLDER = "preview"
+# Sub-folder of CACHE_FOLDER holding the waveform peak pyramid of each stem
+PEAKS_FOLDER = "peaks"
+
 
 class AudioProject:
     """
@@ -42,6 +55,10 @@ class AudioProject:
             "input_original": None,
             "results": {}
         }
+        self._pcm_store: Optional[PcmStore] = None
+        self.encode_batch: Optional["EncodeBatch"] = None  # Set by the job to encode stems in the background
+        self.preset = DEFAULT_PRESET  # Speed/quality preset of the modules run by the current job
+        self.use_result_cache = True  # Off for throwaway runs whose outputs would never be looked up again
     
     @classmethod
     def create(cls, audio_file: str, project_id: str, base_library: str) -> "AudioProject":
@@ -128,22 +145,33 @@ class AudioProject:
         """Saves the current processing state to metadata.json."""
         path = self._get_metadata_path()
         try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(self.state, f, indent=4, ensure_ascii=False)
+            with project_lock(self.session_folder):
+                write_json(path, self.state, indent=4, ensure_ascii=False)
         except IOError as e:
             logger.error(f"Failed to save state to {path}: {e}")
     
+    def get_cache_folder(self, *parts: str) -> str:
+        """Returns a path inside the project's hidden working folder."""
+        return os.path.join(self.session_folder, CACHE_FOLDER, *parts)
+    
+    def get_pcm_store(self) -> PcmStore:
+        """Returns the store of decoded inputs shared by the modules of this project."""
+        if self._pcm_store is None:
+            self._pcm_store = PcmStore(self.get_cache_folder("pcm"))
+        return self._pcm_store
+    
     def get_original_file(self) -> Optional[str]:
         """Returns the path to the original input file."""
         return self.state.get("input_original")
     
     def get_executed_modules(self) -> List[str]:
-        """Returns list of modules that have already been executed."""
-        return list(self.state.get("results", {}).keys())
+        """Returns list of modules that have already been executed (stale results excluded)."""
+        return [name for name, result in self.state.get("results", {}).items() if not result.get("stale")]
     
     def is_module_completed(self, module_name: str) -> bool:
-        """Checks if a module has already been executed."""
-        return module_name in self.state.get("results", {})
+        """Checks if a module has already been executed and its outputs are up to date."""
+        result = self.state.get("results", {}).get(module_name)
+        return result is not None and not result.get("stale")
     
     def get_module_output(self, module_name: str, stem_key: str) -> Optional[str]:
         """
@@ -190,6 +218,12 @@ class AudioProject:
         parent_module = config["depends_on"]
         input_stem_key = config.get("input_stem")
         
+        # Derived modules read the parent's stems next to the original
+        if is_derived(module_name):
+            if not self.is_module_completed(parent_module):
+                raise ValueError(f"Dependency '{parent_module}' has not been executed.")
+            return self.get_original_file()
+        
         if not input_stem_key:
             raise ValueError(f"Module '{module_name}' has dependency but no input_stem defined")
         
@@ -211,12 +245,70 @@ class AudioProject:
         
         return parent_output
     
+    def get_module_cache_key(self, module_name: str, processor: "AudioProcessor") -> Optional[str]:
+        """
+        Builds the result cache key for a module run on this project.
+        
+        Root modules are keyed by the hash of the decoded original audio; dependent
+        modules chain their parent's key and input stem, so no stem needs hashing.
+        
+        Args:
+            module_name: Name of the module
+            processor: AudioProcessor that will run the module
+            
+        Returns:
+            Cache key, or None if result caching is disabled or the parent has no key
+        """
+        if not self.use_result_cache or processor.result_cache is None or is_derived(module_name):
+            return None  # Derived stems are cheaper to recompute than to cache
+        
+        config = get_module(module_name)
+        parent_module = config.get("depends_on")
+        if parent_module:
+            parent_key = self.state.get("results", {}).get(parent_module, {}).get("cache_key")
+            if not parent_key:
+                return None
+            input_key = f"{parent_key}:{config.get('input_stem')}"
+        else:
+            input_key = self.state.get("input_key")
+            if not input_key:
+                original = self.get_original_file()
+                if not original or not os.path.exists(original):
+                    return None
+                try:
+                    # Hash the shared decode so the original is only decoded once per job
+                    input_key = processor.result_cache.hash_pcm(self.get_pcm_store().open(original, 44100))
+                except RuntimeError:
+                    input_key = processor.result_cache.hash_audio(original)
+                self.state["input_key"] = input_key
+                self._save_state()
+        
+        return processor.result_cache.make_key(input_key, config["model"], processor.get_separation_params(module_name, self.preset))
+    
+    def get_input_seconds(self) -> Optional[float]:
+        """Returns the length of the original audio in seconds (from the job's shared decode)."""
+        if self.state.get("input_seconds") is None:
+            original = self.get_original_file()
+            if not original or not os.path.exists(original):
+                return None
+            try:
+                self.state["input_seconds"] = round(len(self.get_pcm_store().open(original, 44100)) / 44100, 2)
+            except RuntimeError as e:
+                logger.warning(f"Could not measure input length: {e}")
+                return None
+            self._save_state()
+        return self.state["input_seconds"]
+    
     def record_module_result(
         self, 
         module_name: str, 
         model: str, 
         input_used: str, 
-        outputs: Dict[str, str]
+        outputs: Dict[str, str],
+        duration: Optional[float] = None,
+        cache_key: Optional[str] = None,
+        preset: Optional[str] = None,
+        cached: bool = False
     ) -> None:
         """
         Records the result of a module execution.
@@ -226,12 +318,24 @@ class AudioProject:
             model: Model filename used
             input_used: Path to input file that was processed
             outputs: Mapping of stem_key -> output_filepath
+            duration: Execution time in seconds (excluding background encoding)
+            cache_key: Result cache key the outputs are stored under
+            preset: Speed/quality preset the module ran with
+            cached: Whether the outputs were reused from the result cache
         """
         self.state["results"][module_name] = {
             "model": model,
             "input_used": input_used,
             "outputs": outputs
         }
+        if duration is not None:
+            self.state["results"][module_name]["duration"] = round(duration, 2)
+        if cache_key:
+            self.state["results"][module_name]["cache_key"] = cache_key
+        if preset:
+            self.state["results"][module_name]["preset"] = preset
+        if cached:
+            self.state["results"][module_name]["cached"] = True
         self._save_state()
         logger.info(f"Recorded result for module '{module_name}'")
     
@@ -272,11 +376,18 @@ class AudioProject:
         
         # Execute the module
         logger.info(f"Executing module: {module_name}")
+        started = time.time()
+        cache_key = self.get_module_cache_key(module_name, processor)
+        cached = bool(cache_key) and processor.result_cache.has(cache_key)
         outputs = processor.execute_module(
             module_name=module_name,
             input_path=input_path,
             output_dir=self.session_folder,
             interceptor_callback=sse_message_handler.interceptor_callback,
+            cache_key=cache_key,
+            pcm_store=self.get_pcm_store(),
+            encode_batch=self.encode_batch,
+            preset=self.preset,
         )
         
         # Record result
@@ -284,22 +395,162 @@ class AudioProject:
             module_name=module_name,
             model=config["model"],
             input_used=input_path,
-            outputs=outputs
+            outputs=outputs,
+            duration=time.time() - started,
+            cache_key=cache_key,
+            preset=self.preset,
+            cached=cached
         )
         
         return outputs
     
-    def run_modules(self, modules: List[str], processor: "AudioProcessor", sse_message_handler: "SSEMessageHandler") -> Dict[str, Any]:
+    def reprocess_region(
+        self,
+        module_name: str,
+        start: float,
+        end: float,
+        processor: "AudioProcessor",
+        sse_message_handler: "SSEMessageHandler",
+        padding: float = DEFAULT_REGION_PADDING_SECONDS,
+        cascade: bool = True
+    ) -> Dict[str, List[str]]:
+        """
+        Re-separates [start, end] seconds of a completed module and splices the
+        result into its stems, recording the region in the module's results.
+        
+        Child modules fed by an updated stem are re-processed over the same
+        region when `cascade` is set; otherwise they and their descendants are
+        marked stale, so the next run_modules runs them again.
+        
+        Args:
+            module_name: Name of the module to update
+            start: Start of the region in seconds
+            end: End of the region in seconds
+            processor: AudioProcessor instance for executing separations
+            padding: Context separated on each side of the region
+            cascade: Whether to update the region in child modules too
+            
+        Returns:
+            Dict with the `updated` and `stale` module names
+            
+        Raises:
+            ValueError: If the module has not been executed
+        """
+        if not self.is_module_completed(module_name):
+            raise ValueError(f"Module '{module_name}' has not been executed")
+        
+        config = get_module(module_name)
+        sse_message_handler.set_module(module_name)
+        sse_message_handler.set_current_model(config["model"])
+        started = time.time()
+        if is_derived(module_name):
+            # Derived stems are recomputed whole from the updated stems, in milliseconds
+            outputs = processor.execute_module(
+                module_name=module_name,
+                input_path=self.get_module_input(module_name),
+                output_dir=self.session_folder,
+                pcm_store=self.get_pcm_store(),
+            )
+        else:
+            outputs = processor.reprocess_region(
+                module_name=module_name,
+                input_path=self.get_module_input(module_name),
+                output_dir=self.session_folder,
+                start_seconds=start,
+                end_seconds=end,
+                pcm_store=self.get_pcm_store(),
+                padding_seconds=padding,
+                interceptor_callback=sse_message_handler.interceptor_callback,
+                preset=self.preset,
+            )
+        
+        # The stems no longer match the result cache entry they were stored under
+        result = self.state["results"][module_name]
+        result.pop("cache_key", None)
+        result.pop("cached", None)
+        result.setdefault("regions", []).append({
+            "start": round(start, 2),
+            "end": round(end, 2),
+            "preset": self.preset,
+            "stems": sorted(outputs),
+            "duration": round(time.time() - started, 2)
+        })
+        self._save_state()
+        sse_message_handler.send_module_completed()
+        
+        report = {"updated": [module_name], "stale": []}
+        for child, child_config in MODULE_REGISTRY.items():
+            if child_config.get("depends_on") != module_name or not set(get_input_stems(child)) & set(outputs):
+                continue
+            if not self.is_module_completed(child):
+                continue
+            if cascade:
+                child_report = self.reprocess_region(child, start, end, processor, sse_message_handler, padding, cascade)
+                report["updated"] += child_report["updated"]
+                report["stale"] += child_report["stale"]
+            else:
+                report["stale"] += self._mark_stale(child)
+        return report
+    
+    def _mark_stale(self, module_name: str) -> List[str]:
+        """Marks a module and every completed descendant as stale. Returns their names."""
+        result = self.state["results"][module_name]
+        result["stale"] = True
+        result.pop("cache_key", None)
+        stale = [module_name]
+        for child, child_config in MODULE_REGISTRY.items():
+            if child_config.get("depends_on") == module_name and self.is_module_completed(child):
+                stale += self._mark_stale(child)
+        self._save_state()
+        return stale
+    
+    def flush_encodes(self) -> Dict[str, Any]:
+        """
+        Waits for the stems queued on `encode_batch` to be written and records
+        each module's encode time. Outputs that failed to encode are dropped
+        from the results.
+        
+        Returns:
+            The batch report (`encode_seconds` per module, `errors` per path)
+        """
+        if self.encode_batch is None:
+            return {'encode_seconds': {}, 'errors': {}}
+        report = self.encode_batch.wait()
+        self.encode_batch = None
+        
+        results = self.state.get("results", {})
+        for module_name, seconds in report['encode_seconds'].items():
+            if module_name in results:
+                results[module_name]["encode_seconds"] = round(seconds, 2)
+        for module_name, result in results.items():
+            outputs = result.get("outputs", {})
+            for stem_key in [k for k, path in outputs.items() if path in report['errors']]:
+                logger.error(f"Dropping output '{stem_key}' of module '{module_name}': {report['errors'][outputs[stem_key]]}")
+                del outputs[stem_key]
+        self._save_state()
+        return report
+    
+    def run_modules(
+        self,
+        modules: List[str],
+        processor: "AudioProcessor",
+        sse_message_handler: "SSEMessageHandler",
+        scheduler: Optional["ModuleScheduler"] = None
+    ) -> Dict[str, Any]:
         """
         Runs multiple modules, resolving dependencies automatically.
         
         Args:
             modules: List of module names to run
             processor: AudioProcessor instance for executing separations
+            scheduler: Optional ModuleScheduler that runs independent modules in parallel
             
         Returns:
             The complete project state after processing
         """
+        if scheduler is not None:
+            return scheduler.run(self, modules, processor, sse_message_handler)
+        
         for module_name in modules:
             if module_name not in MODULE_REGISTRY:
                 logger.warning(f"Unknown module requested: {module_name}")
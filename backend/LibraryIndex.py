@@ -0,0 +1,326 @@
+"""
+LibraryIndex: Persistent SQLite index of the projects in the library folder.
+It holds each project's metadata, its stems with their sizes and mtimes,
+and its executed modules.
+The index is updated whenever a project is written or deleted, and is
+reconciled with the disk by comparing folder and metadata mtimes. Only
+project folders that changed while the server was down are read again.
+"""
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.chunking import PARTIAL_SUFFIX
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = ".library.sqlite3"
+METADATA_FILE = "metadata.json"
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac')
+# Bump when the schema or the indexed fields change; the index is then rebuilt from disk
+SCHEMA_VERSION = 3
+# Sort orders of query_projects -> indexed column
+SORT_COLUMNS = {'id': 'id', 'date': 'date', 'name': 'sort_name'}
+
+_SCHEMA = """
+CREATE TABLE projects (
+    folder TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    original TEXT,
+    thumbnail TEXT,
+    sort_name TEXT NOT NULL,
+    folder_mtime_ns INTEGER NOT NULL,
+    metadata_mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX projects_id ON projects (id, folder);
+CREATE INDEX projects_date ON projects (date, folder);
+CREATE INDEX projects_name ON projects (sort_name, folder);
+CREATE TABLE stems (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (folder, name)
+) WITHOUT ROWID;
+CREATE TABLE modules (
+    folder TEXT NOT NULL,
+    module TEXT NOT NULL,
+    PRIMARY KEY (folder, module)
+) WITHOUT ROWID;
+CREATE INDEX modules_module ON modules (module, folder);
+CREATE TABLE info (
+    generation TEXT NOT NULL,
+    revision INTEGER NOT NULL
+);
+"""
+
+
+class LibraryIndex:
+    """
+    Index of the library, one row per project folder, per stem and per
+    executed module.
+
+    Projects are returned as dicts with `folder`, `id`, `name`, `date`,
+    `original`, `thumbnail` and `stems` (sorted filenames, the original
+    excluded). Every change bumps a revision, which identifies the state of
+    the index for conditional requests. The connection is shared between
+    threads behind a lock; the database runs in WAL mode so readers in other
+    processes are not blocked.
+    """
+
+    def __init__(self, library_folder: str, index_path: Optional[str] = None):
+        """
+        Args:
+            library_folder: Folder holding one sub-folder per project
+            index_path: SQLite file (default: a hidden file in the library folder)
+        """
+        self.library_folder = library_folder
+        self.index_path = index_path or os.path.join(library_folder, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Creates the schema, dropping an index written by another schema version."""
+        with self._lock, self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+            for table in ("projects", "stems", "modules", "info"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    self._conn.execute(statement)
+            # A new generation keeps revisions of a rebuilt index from matching old ones
+            self._conn.execute("INSERT INTO info VALUES (?, 0)", (uuid.uuid4().hex,))
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _bump(self) -> None:
+        """Marks the index as changed (call inside a write transaction)."""
+        self._conn.execute("UPDATE info SET revision = revision + 1")
+
+    def get_revision(self) -> str:
+        """Identifies the current state of the index; it changes whenever a project is (re-)indexed or removed."""
+        with self._lock:
+            row = self._conn.execute("SELECT generation, revision FROM info").fetchone()
+        return f"{row['generation']}.{row['revision']}"
+
+    @staticmethod
+    def _stamp(folder_path: str) -> Tuple[int, int]:
+        """mtimes (ns) of a project folder and of its metadata file (0 if missing)."""
+        folder_mtime = os.stat(folder_path).st_mtime_ns
+        try:
+            metadata_mtime = os.stat(os.path.join(folder_path, METADATA_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            metadata_mtime = 0
+        return folder_mtime, metadata_mtime
+
+    def index_project(self, folder_path: str, defaults: Optional[Dict[str, Any]] = None) -> None:
+        """
+        (Re-)reads one project folder into the index.
+
+        Args:
+            folder_path: The project folder
+            defaults: Values for `id`, `name`, `date` and `original` when
+                metadata.json lacks them (otherwise the folder name is used)
+
+        Raises:
+            OSError: If the folder cannot be read
+        """
+        folder = os.path.basename(folder_path)
+        defaults = defaults or {}
+        with self._lock:
+            # Stamped before reading, so changes made meanwhile are picked up by the next reconcile
+            folder_mtime, metadata_mtime = self._stamp(folder_path)
+            meta = {}
+            if metadata_mtime:
+                try:
+                    with open(os.path.join(folder_path, METADATA_FILE), 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (json.JSONDecodeError, IOError) as e:
+                    logger.warning(f"Error reading metadata for {folder}: {e}")
+            original = meta.get('original_file') or defaults.get('original')
+            name = meta.get('name') or defaults.get('name') or folder
+            modules = [
+                (folder, module) for module, result in (meta.get('results') or {}).items()
+                if not result.get('stale')
+            ]
+
+            stems = []
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(AUDIO_EXTENSIONS) and not entry.name.endswith(PARTIAL_SUFFIX) \
+                            and entry.name != original and entry.is_file():
+                        stat = entry.stat()
+                        stems.append((folder, entry.name, stat.st_size, stat.st_mtime_ns))
+
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        folder,
+                        meta.get('id') or defaults.get('id') or folder,
+                        name,
+                        meta.get('date') or defaults.get('date') or folder,
+                        original,
+                        meta.get('thumbnail'),
+                        name.casefold(),
+                        folder_mtime,
+                        metadata_mtime,
+                    )
+                )
+                self._conn.execute("DELETE FROM stems WHERE folder = ?", (folder,))
+                self._conn.executemany("INSERT INTO stems VALUES (?, ?, ?, ?)", stems)
+                self._conn.execute("DELETE FROM modules WHERE folder = ?", (folder,))
+                self._conn.executemany("INSERT INTO modules VALUES (?, ?)", modules)
+                self._bump()
+
+    def remove_project(self, folder: str) -> None:
+        """Drops a project folder from the index."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM projects WHERE folder = ?", (folder,))
+            self._conn.execute("DELETE FROM stems WHERE folder = ?", (folder,))
+            self._conn.execute("DELETE FROM modules WHERE folder = ?", (folder,))
+            self._bump()
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Brings the index in line with the library folder. Folders whose mtimes
+        differ from the indexed ones are read again and folders that are gone
+        are dropped; the others cost two stat calls.
+
+        Returns:
+            Counts of `projects` on disk, `updated` and `removed` ones
+        """
+        with self._lock:
+            known = {
+                row['folder']: (row['folder_mtime_ns'], row['metadata_mtime_ns'])
+                for row in self._conn.execute("SELECT folder, folder_mtime_ns, metadata_mtime_ns FROM projects")
+            }
+        seen = set()
+        updated = 0
+        if os.path.isdir(self.library_folder):
+            with os.scandir(self.library_folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_dir():
+                        continue
+                    seen.add(entry.name)
+                    try:
+                        if known.get(entry.name) != self._stamp(entry.path):
+                            self.index_project(entry.path)
+                            updated += 1
+                    except Exception as e:
+                        logger.error(f"Error indexing {entry.name}: {e}")
+        removed = [folder for folder in known if folder not in seen]
+        for folder in removed:
+            self.remove_project(folder)
+        return {'projects': len(seen), 'updated': updated, 'removed': len(removed)}
+
+    def _stems(self, folders: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        if folders is None:
+            rows = self._conn.execute("SELECT folder, name FROM stems ORDER BY name")
+        else:
+            placeholders = ", ".join("?" * len(folders))
+            rows = self._conn.execute(f"SELECT folder, name FROM stems WHERE folder IN ({placeholders}) ORDER BY name", folders)
+        stems: Dict[str, List[str]] = {}
+        for row in rows:
+            stems.setdefault(row['folder'], []).append(row['name'])
+        return stems
+
+    @staticmethod
+    def _project(row: sqlite3.Row, stems: Dict[str, List[str]]) -> Dict[str, Any]:
+        return {
+            'folder': row['folder'],
+            'id': row['id'],
+            'name': row['name'],
+            'date': row['date'],
+            'original': row['original'],
+            'thumbnail': row['thumbnail'],
+            'stems': stems.get(row['folder'], []),
+        }
+
+    def get_project(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the indexed project with this id, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM projects WHERE id = ? LIMIT 1", (project_id,)).fetchone()
+            if row is None:
+                return None
+            return self._project(row, self._stems([row['folder']]))
+
+    def list_projects(self) -> List[Dict[str, Any]]:
+        """Returns every indexed project, newest id first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM projects ORDER BY id DESC").fetchall()
+            stems = self._stems()
+        return [self._project(row, stems) for row in rows]
+
+    def query_projects(
+        self,
+        sort: str = 'id',
+        descending: bool = True,
+        name_prefix: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        modules: Sequence[str] = (),
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Returns one page of the projects matching the filters, using the
+        indexes for sorting, filtering and seeking to the page.
+
+        Args:
+            sort: `id`, `date` or `name` (case-insensitive); ties are broken by folder
+            descending: Sort direction
+            name_prefix: Only projects whose name starts with this (case-insensitive)
+            date_from: Only projects dated at or after this (a prefix of the `date` timestamp, e.g. 20240101)
+            date_to: Only projects dated at or before this (same form, inclusive)
+            modules: Only projects where all these modules were executed (and are not stale)
+            after: Sort key of the last project of the previous page, as returned by sort_key
+            limit: Page size (None: all)
+
+        Returns:
+            (projects of the page, number of projects matching the filters)
+        """
+        column = SORT_COLUMNS[sort]
+        conditions, params = [], []
+        if name_prefix:
+            prefix = name_prefix.casefold()
+            conditions.append("sort_name >= ? AND sort_name < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date < ?")
+            params.append(date_to + "\U0010ffff")
+        for module in modules:
+            conditions.append("EXISTS (SELECT 1 FROM modules m WHERE m.folder = projects.folder AND m.module = ?)")
+            params.append(module)
+        where = " AND ".join(conditions) or "1"
+        direction = "DESC" if descending else "ASC"
+
+        page_conditions, page_params = where, list(params)
+        if after is not None:
+            page_conditions += f" AND ({column}, folder) {'<' if descending else '>'} (?, ?)"
+            page_params += list(after)
+        sql = f"SELECT * FROM projects WHERE {page_conditions} ORDER BY {column} {direction}, folder {direction}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            page_params.append(limit)
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM projects WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(sql, page_params).fetchall()
+            stems = self._stems([row['folder'] for row in rows]) if rows else {}
+        return [dict(self._project(row, stems), sort_key=(row[column], row['folder'])) for row in rows], total
@@ -0,0 +1,206 @@
+"""
+ModelCache: Keeps loaded separation models resident between module runs.
+Entries are keyed by model filename and evicted least-recently-used once the
+configured memory budget is exceeded.
+"""
+import gc
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def estimate_separator_bytes(separator: Any, model_filename: str) -> int:
+    """
+    Estimates the resident size of a loaded Separator.
+
+    Uses the parameter/buffer sizes of the underlying torch module when available,
+    falling back to the size of the checkpoint on disk (e.g. ONNX models).
+
+    Args:
+        separator: Separator instance with a loaded model
+        model_filename: Filename of the loaded model
+
+    Returns:
+        Estimated size in bytes (0 if unknown)
+    """
+    instance = getattr(separator, "model_instance", None)
+    for attr in ("model_run", "demucs_model_instance", "model"):
+        model = getattr(instance, attr, None)
+        if model is None or not hasattr(model, "parameters"):
+            continue
+        try:
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            total += sum(b.numel() * b.element_size() for b in model.buffers())
+            if total:
+                return total
+        except Exception:
+            continue
+
+    model_path = os.path.join(getattr(separator, "model_file_dir", "") or "", model_filename)
+    if os.path.isfile(model_path):
+        return os.path.getsize(model_path)
+    return 0
+
+
+class _CacheEntry:
+    """A single resident model and its bookkeeping."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.value: Any = None
+        self.size_bytes = 0
+        self.last_used = 0.0
+        self.lock = threading.Lock()  # Held while the model is loading or in use
+
+
+class ModelCache:
+    """
+    Memory-bounded LRU cache of loaded models.
+
+    A model that is currently in use is never evicted; the most recently
+    used model is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int, sizer: Callable[[Any, str], int] = estimate_separator_bytes):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget for resident models (0 disables caching)
+            sizer: Function (value, key) -> estimated size in bytes
+        """
+        self.max_bytes = max_bytes
+        self._sizer = sizer
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def acquire(self, key: str, loader: Callable[[], Any]) -> Iterator[Any]:
+        """
+        Yields the cached value for `key`, loading it with `loader` on a miss.
+
+        The entry is locked for the duration of the block so the same model
+        instance is never used by two callers at once.
+
+        Args:
+            key: Cache key (model filename)
+            loader: Zero-argument function that loads the value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CacheEntry(key)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+        with entry.lock:
+            with self._lock:
+                if entry.value is None:
+                    self.misses += 1
+                    hit = False
+                else:
+                    self.hits += 1
+                    hit = True
+
+            if hit:
+                logger.info(f"Model cache hit: {key}")
+            else:
+                logger.info(f"Model cache miss: {key}")
+                try:
+                    entry.value = loader()
+                except Exception:
+                    with self._lock:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                    raise
+                entry.size_bytes = self._sizer(entry.value, key)
+
+            entry.last_used = time.time()
+            self._evict(keep=key)
+            try:
+                yield entry.value
+            finally:
+                entry.last_used = time.time()
+
+        if self.max_bytes <= 0:
+            self._evict(keep=None)
+
+    def _evict(self, keep: Optional[str]) -> None:
+        """Evicts least-recently-used idle entries until the budget is met."""
+        released = []
+        with self._lock:
+            used = sum(e.size_bytes for e in self._entries.values())
+            for key in list(self._entries.keys()):
+                if used <= self.max_bytes and self.max_bytes > 0:
+                    break
+                if key == keep:
+                    continue
+                entry = self._entries[key]
+                if entry.value is None or not entry.lock.acquire(blocking=False):
+                    continue  # Loading or in use
+                try:
+                    del self._entries[key]
+                    used -= entry.size_bytes
+                    released.append(entry.value)
+                    entry.value = None
+                    self.evictions += 1
+                    logger.info(f"Evicted model from cache: {key} ({entry.size_bytes / (1024 ** 2):.0f} MB)")
+                finally:
+                    entry.lock.release()
+
+        if released:
+            self._release(released)
+
+    def _release(self, values: list) -> None:
+        """Frees memory held by evicted models."""
+        for value in values:
+            instance = getattr(value, "model_instance", None)
+            clear_gpu_cache = getattr(instance, "clear_gpu_cache", None)
+            del instance
+            if callable(clear_gpu_cache):
+                try:
+                    clear_gpu_cache()
+                except Exception as e:
+                    logger.warning(f"Failed to clear GPU cache: {e}")
+        values.clear()
+        gc.collect()
+
+    def clear(self) -> None:
+        """Evicts every idle entry."""
+        budget = self.max_bytes
+        self.max_bytes = 0
+        try:
+            self._evict(keep=None)
+        finally:
+            self.max_bytes = budget
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters and the resident models."""
+        with self._lock:
+            entries = [
+                {
+                    'model': e.key,
+                    'size_mb': round(e.size_bytes / (1024 ** 2), 1),
+                    'last_used': e.last_used,
+                }
+                for e in self._entries.values() if e.value is not None
+            ]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'budget_mb': round(self.max_bytes / (1024 ** 2), 1),
+                'used_mb': round(sum(e['size_mb'] for e in entries), 1),
+                'models': entries,
+            }
@@ -0,0 +1,301 @@
+"""
+ModuleScheduler: Executes the module DAG of a project.
+Independent branches run concurrently in worker processes; dependent modules
+start as soon as their parent has finished.
+"""
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Any, TYPE_CHECKING
+
+import workers
+from StemEncoder import DEFAULT_FLAC_COMPRESSION_LEVEL
+from modules import MODULE_REGISTRY, DEFAULT_PRESET, get_module, get_execution_dag, get_topological_levels, get_critical_path
+
+if TYPE_CHECKING:
+    from AudioProcessor import AudioProcessor
+    from AudioProject import AudioProject
+    from PresetCosts import PresetCosts
+    from services.SSEMessageHandler import SSEMessageHandler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ModuleScheduler:
+    """
+    Runs requested modules (and their missing dependencies) in DAG order.
+
+    With max_workers <= 1 modules run one at a time in-process, using the
+    shared AudioProcessor. Otherwise each module runs in a pool of worker
+    processes, each holding its own model cache.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        output_format: str = "flac",
+        model_cache_bytes: int = 0,
+        torch_threads: Optional[int] = None,
+        result_cache_config: Optional[Dict[str, Any]] = None,
+        intermediate_mode: str = "raw",
+        flac_compression_level: int = DEFAULT_FLAC_COMPRESSION_LEVEL,
+        chunk_seconds: float = 0.0,
+        preset_costs: Optional["PresetCosts"] = None
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_workers: Maximum number of modules running at the same time
+            output_format: Output format used by worker processes
+            model_cache_bytes: Total model cache budget, split across worker processes
+            torch_threads: Intra-op torch threads per worker process (None keeps the default)
+            result_cache_config: ResultCache arguments for worker processes (None disables result caching)
+            intermediate_mode: Stem hand-over mode in worker processes ("memory" is promoted to "raw",
+                since dependent modules may run in another process)
+            flac_compression_level: FLAC compression level used by worker processes
+            chunk_seconds: Chunk length for long inputs in worker processes (0 disables chunking)
+            preset_costs: Where measured module costs per preset are recorded
+        """
+        self.max_workers = max(1, max_workers)
+        self.output_format = output_format
+        self.model_cache_bytes = model_cache_bytes
+        self.torch_threads = torch_threads
+        self.result_cache_config = result_cache_config
+        self.intermediate_mode = "raw" if intermediate_mode == "memory" else intermediate_mode
+        self.flac_compression_level = flac_compression_level
+        self.chunk_seconds = chunk_seconds
+        self.preset_costs = preset_costs
+        self.durations: Dict[str, float] = {}  # Last measured run time per module (seconds)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+
+    def plan(self, project: "AudioProject", modules: List[str]) -> Dict[str, Any]:
+        """
+        Builds the execution plan for the requested modules.
+
+        Returns:
+            Dict with the pending DAG, its parallel levels and the critical path.
+            `estimated_seconds` is only set when every module on the path has a measured duration.
+        """
+        dag = get_execution_dag(modules, completed=project.get_executed_modules())
+        levels = get_topological_levels(dag)
+        critical_path, cost = get_critical_path(dag, self.durations)
+        measured = all(m in self.durations for m in critical_path)
+        return {
+            'dag': dag,
+            'levels': levels,
+            'critical_path': critical_path,
+            'estimated_seconds': round(cost, 1) if measured and critical_path else None,
+        }
+
+    def run(
+        self,
+        project: "AudioProject",
+        modules: List[str],
+        processor: "AudioProcessor",
+        sse_message_handler: "SSEMessageHandler"
+    ) -> Dict[str, Any]:
+        """
+        Runs multiple modules, resolving dependencies automatically.
+
+        Args:
+            project: Project to run the modules on
+            modules: List of module names to run
+            processor: AudioProcessor used for in-process execution
+            sse_message_handler: Handler for progress updates
+
+        Returns:
+            The complete project state after processing
+        """
+        valid = []
+        for module_name in modules:
+            if module_name not in MODULE_REGISTRY:
+                logger.warning(f"Unknown module requested: {module_name}")
+                continue
+            valid.append(module_name)
+
+        plan = self.plan(project, valid)
+        logger.info(
+            f"Execution plan for '{project.project_id}': levels={plan['levels']}, "
+            f"critical path={plan['critical_path']} (estimated {plan['estimated_seconds']}s)"
+        )
+        sse_message_handler.send_schedule({
+            'levels': plan['levels'],
+            'critical_path': plan['critical_path'],
+            'estimated_seconds': plan['estimated_seconds'],
+        })
+
+        # Requested modules that already ran just report completion
+        for module_name in valid:
+            if project.is_module_completed(module_name):
+                sse_message_handler.for_module(module_name).send_module_completed()
+
+        widest = max((len(level) for level in plan['levels']), default=0)
+        if self.max_workers <= 1 or widest <= 1:
+            self._run_local(project, plan, processor, sse_message_handler)
+        else:
+            self._run_parallel(project, plan, processor, sse_message_handler)
+
+        return project.state
+
+    def _run_local(self, project: "AudioProject", plan: Dict[str, Any], processor: "AudioProcessor", sse_message_handler: "SSEMessageHandler") -> None:
+        """Runs the plan one module at a time in this process."""
+        failed = set()
+        for level in plan['levels']:
+            for module_name in level:
+                if any(p in failed for p in plan['dag'][module_name]):
+                    logger.error(f"Skipping module '{module_name}': dependency failed")
+                    failed.add(module_name)
+                    continue
+                try:
+                    project.run_module(module_name, processor, sse_message_handler)
+                    self._record_duration(project, module_name)
+                except Exception as e:
+                    logger.error(f"Error processing module '{module_name}': {e}")
+                    failed.add(module_name)
+                    # Continue with other modules if one fails
+
+    def _run_parallel(self, project: "AudioProject", plan: Dict[str, Any], processor: "AudioProcessor", sse_message_handler: "SSEMessageHandler") -> None:
+        """Runs the plan on the worker pool, starting modules as soon as their parents finish."""
+        pool = self._get_pool()
+        progress_queue = self._get_manager().Queue()
+        handlers: Dict[str, "SSEMessageHandler"] = {}
+
+        # Forward progress messages from worker processes to the module's SSE handler
+        stop = threading.Event()
+        def forward():
+            while not stop.is_set() or not progress_queue.empty():
+                try:
+                    module_name, message, event_type = progress_queue.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                except (EOFError, OSError):
+                    return
+                handler = handlers.get(module_name)
+                if handler:
+                    handler.interceptor_callback(message, event_type)
+        forwarder = threading.Thread(target=forward, name=f"progress-{project.project_id}", daemon=True)
+        forwarder.start()
+
+        pending = dict(plan['dag'])
+        running: Dict[Any, tuple] = {}
+        failed = set()
+        try:
+            while pending or running:
+                # Drop modules whose dependency failed
+                for module_name in [m for m, parents in pending.items() if any(p in failed for p in parents)]:
+                    logger.error(f"Skipping module '{module_name}': dependency failed")
+                    failed.add(module_name)
+                    del pending[module_name]
+
+                # Start every ready module while there are free workers
+                remaining = len(pending)
+                ready = [m for m, parents in pending.items() if all(project.is_module_completed(p) for p in parents)]
+                for module_name in ready:
+                    if len(running) >= self.max_workers:
+                        break
+                    config = get_module(module_name)
+                    handler = sse_message_handler.for_module(module_name)
+                    handler.set_current_model(config["model"])
+                    handlers[module_name] = handler
+                    try:
+                        input_path = project.get_module_input(module_name)
+                        cache_key = project.get_module_cache_key(module_name, processor)
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"Error processing module '{module_name}': {e}")
+                        failed.add(module_name)
+                        del pending[module_name]
+                        continue
+
+                    cached = bool(cache_key) and processor.result_cache.has(cache_key)
+                    logger.info(f"Executing module: {module_name} (worker process)")
+                    future = pool.submit(workers.run_module_task, module_name, input_path, project.session_folder, progress_queue, cache_key, project.get_pcm_store().folder, project.preset)
+                    running[future] = (module_name, input_path, cache_key, cached, time.time())
+                    del pending[module_name]
+
+                if not running:
+                    if pending and len(pending) == remaining:
+                        logger.error(f"No runnable modules left, giving up on: {sorted(pending)}")
+                        break
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    module_name, input_path, cache_key, cached, started = running.pop(future)
+                    try:
+                        outputs = future.result()
+                    except BrokenProcessPool as e:
+                        logger.error(f"Worker pool crashed while processing '{module_name}': {e}")
+                        failed.add(module_name)
+                        self._reset_pool()
+                        pool = self._get_pool()
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error processing module '{module_name}': {e}")
+                        failed.add(module_name)
+                        continue
+
+                    project.record_module_result(
+                        module_name=module_name,
+                        model=get_module(module_name)["model"],
+                        input_used=input_path,
+                        outputs=outputs,
+                        duration=time.time() - started,
+                        cache_key=cache_key,
+                        preset=project.preset,
+                        cached=cached
+                    )
+                    self._record_duration(project, module_name)
+                    handlers[module_name].send_module_completed()
+        finally:
+            stop.set()
+            forwarder.join(timeout=5)
+
+    def _record_duration(self, project: "AudioProject", module_name: str) -> None:
+        result = project.state.get("results", {}).get(module_name, {})
+        if result.get("duration") is None or result.get("cached"):
+            return  # Cache hits say nothing about the module's cost
+        self.durations[module_name] = result["duration"]
+        if self.preset_costs is not None:
+            audio_seconds = project.get_input_seconds()
+            if audio_seconds:
+                self.preset_costs.record(module_name, result.get("preset", DEFAULT_PRESET), result["duration"], audio_seconds)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=workers.init_worker,
+                    initargs=(self.output_format, self.model_cache_bytes // self.max_workers, self.torch_threads, self.result_cache_config, self.intermediate_mode, self.flac_compression_level, self.chunk_seconds),
+                )
+            return self._pool
+
+    def _get_manager(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager
+
+    def _reset_pool(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def shutdown(self) -> None:
+        """Stops worker processes."""
+        self._reset_pool()
+        with self._lock:
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
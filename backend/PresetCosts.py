@@ -0,0 +1,82 @@
+"""
+PresetCosts: Measured processing cost of each module per speed/quality preset.
+Costs are kept as a moving average of the realtime factor (processing seconds
+per second of audio) and persisted so they survive restarts.
+"""
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict
+
+from modules import MODULE_REGISTRY, PRESET_NAMES, DEFAULT_PRESET
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Weight of a new measurement in the moving average
+SMOOTHING = 0.3
+
+
+class PresetCosts:
+    """Realtime factor per (module, preset), stored in a small JSON file."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: JSON file the measurements are persisted to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._factors: Dict[str, Dict[str, float]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._factors = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def record(self, module_name: str, preset: str, seconds: float, audio_seconds: float) -> None:
+        """
+        Adds a measurement of a module run.
+
+        Args:
+            module_name: Module that ran
+            preset: Preset it ran with
+            seconds: Inference time
+            audio_seconds: Length of the processed audio
+        """
+        if audio_seconds <= 0 or seconds <= 0:
+            return
+        factor = seconds / audio_seconds
+        with self._lock:
+            by_preset = self._factors.setdefault(module_name, {})
+            previous = by_preset.get(preset)
+            by_preset[preset] = factor if previous is None else previous + SMOOTHING * (factor - previous)
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._factors, f, indent=2)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not save preset costs: {e}")
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns, per module and preset, the realtime factor and the cost relative
+        to the default preset (None until both have been measured).
+        """
+        with self._lock:
+            factors = {m: dict(p) for m, p in self._factors.items()}
+        result = {}
+        for module_name in MODULE_REGISTRY:
+            measured = factors.get(module_name, {})
+            baseline = measured.get(DEFAULT_PRESET)
+            result[module_name] = {
+                preset: {
+                    'realtime_factor': round(measured[preset], 3) if preset in measured else None,
+                    'relative_cost': round(measured[preset] / baseline, 2) if preset in measured and baseline else None,
+                }
+                for preset in PRESET_NAMES
+            }
+        return result
@@ -0,0 +1,258 @@
+"""
+ResultCache: Content-addressed store of separation outputs shared across projects.
+Entries are keyed by (input audio, model, separation params); a hit materializes
+the stems into the project folder as hardlinks (or fast copies across filesystems).
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import subprocess
+from typing import Any, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ENTRY_FILE = "entry.json"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hardlinks src to dst, falling back to a (kernel-side where available) copy."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """
+    On-disk cache of module outputs.
+
+    Layout: <root>/<key[:2]>/<key>/{entry.json, <stem files>}.
+    The entry.json mtime is the last access time used for age/LRU eviction.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_age_seconds: float):
+        """
+        Initialize the cache.
+
+        Args:
+            root: Cache directory (should be on the same filesystem as the library for hardlinks)
+            max_bytes: Total size budget for cached stems
+            max_age_seconds: Entries not accessed for longer than this are evicted
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def hash_audio(path: str, sample_rate: int = 44100) -> str:
+        """
+        Hashes the decoded audio of a file (stereo float32 at sample_rate), so the
+        same recording hashes the same regardless of container or tags.
+        Falls back to hashing the raw file bytes if ffmpeg is unavailable.
+        """
+        digest = hashlib.sha256()
+        command = [
+            "ffmpeg", "-v", "error", "-nostdin", "-i", path,
+            "-map", "0:a:0", "-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "-"
+        ]
+        try:
+            with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as proc:
+                for chunk in iter(lambda: proc.stdout.read(HASH_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+            if proc.returncode == 0:
+                return f"pcm-{digest.hexdigest()}"
+            logger.warning(f"ffmpeg could not decode {path} for hashing (exit {proc.returncode}), hashing file bytes")
+        except OSError as e:
+            logger.warning(f"ffmpeg unavailable for hashing ({e}), hashing file bytes")
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return f"file-{digest.hexdigest()}"
+
+    @staticmethod
+    def hash_pcm(array) -> str:
+        """
+        Hashes an already decoded stereo float32 array (see utils.pcm.PcmStore).
+        Matches hash_audio for the same file at the same sample rate.
+        """
+        digest = hashlib.sha256()
+        frames_per_chunk = HASH_CHUNK_BYTES // (array.shape[1] * 4)
+        for start in range(0, len(array), frames_per_chunk):
+            digest.update(array[start:start + frames_per_chunk].tobytes())
+        return f"pcm-{digest.hexdigest()}"
+
+    @staticmethod
+    def make_key(input_key: str, model: str, params: Dict[str, Any]) -> str:
+        """Builds the cache key for running `model` with `params` on the input identified by `input_key`."""
+        payload = json.dumps({"input": input_key, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def has(self, key: str) -> bool:
+        """Returns True if a result is stored under `key`."""
+        return os.path.exists(os.path.join(self._entry_dir(key), ENTRY_FILE))
+
+    def lookup(self, key: str, output_paths: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """
+        Materializes a cached result into the given output paths.
+
+        Args:
+            key: Cache key
+            output_paths: Mapping of stem_key -> destination path
+
+        Returns:
+            Mapping of stem_key -> output path on a hit, None on a miss
+        """
+        entry_dir = self._entry_dir(key)
+        entry_path = os.path.join(entry_dir, ENTRY_FILE)
+        with self._lock:
+            try:
+                with open(entry_path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return None
+
+            cached = entry.get("outputs", {})
+            if any(stem_key not in cached for stem_key in output_paths):
+                return None
+
+            outputs = {}
+            try:
+                for stem_key, destination in output_paths.items():
+                    link_or_copy(os.path.join(entry_dir, cached[stem_key]), destination)
+                    outputs[stem_key] = destination
+            except OSError as e:
+                logger.warning(f"Failed to materialize cached result {key}: {e}")
+                return None
+
+            os.utime(entry_path)  # Mark as recently used
+        logger.info(f"Result cache hit: {key}")
+        return outputs
+
+    def gains(self, key: str) -> Dict[str, float]:
+        """Returns the normalization gains stored with a result (stem_key -> gain, empty if none)."""
+        try:
+            with open(os.path.join(self._entry_dir(key), ENTRY_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("gains", {})
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def store(
+        self,
+        key: str,
+        outputs: Dict[str, str],
+        model: str,
+        params: Dict[str, Any],
+        gains: Optional[Dict[str, float]] = None
+    ) -> None:
+        """
+        Adds a finished result to the cache, then enforces the size and age limits.
+
+        Args:
+            key: Cache key
+            outputs: Mapping of stem_key -> output path produced by the separation
+            model: Model filename (recorded for inspection)
+            params: Separation params (recorded for inspection)
+            gains: Peak normalization gain applied to each stem (stem_key -> gain)
+        """
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir) or not outputs:
+            return
+
+        staging = os.path.join(self.root, f".staging-{key}-{os.getpid()}-{threading.get_ident()}")
+        try:
+            os.makedirs(staging, exist_ok=True)
+            files = {}
+            size = 0
+            for stem_key, path in outputs.items():
+                name = f"{stem_key}{os.path.splitext(path)[1]}"
+                link_or_copy(path, os.path.join(staging, name))
+                files[stem_key] = name
+                size += os.path.getsize(path)
+
+            with open(os.path.join(staging, ENTRY_FILE), "w", encoding="utf-8") as f:
+                json.dump({
+                    "model": model,
+                    "params": params,
+                    "outputs": files,
+                    "gains": gains or {},
+                    "size": size,
+                    "created": time.time(),
+                }, f, indent=2)
+
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            os.rename(staging, entry_dir)
+            logger.info(f"Stored result in cache: {key} ({size / (1024 ** 2):.1f} MB)")
+        except OSError as e:
+            # Another process may have stored the same key first
+            logger.warning(f"Could not store result {key} in cache: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.enforce_limits()
+
+    def enforce_limits(self) -> None:
+        """Evicts expired entries, then least-recently-used ones until the size budget is met."""
+        with self._lock:
+            entries = []
+            for shard in os.listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                if shard.startswith(".") or not os.path.isdir(shard_dir):
+                    continue
+                for key in os.listdir(shard_dir):
+                    entry_path = os.path.join(shard_dir, key, ENTRY_FILE)
+                    try:
+                        with open(entry_path, "r", encoding="utf-8") as f:
+                            size = json.load(f).get("size", 0)
+                        entries.append((os.path.getmtime(entry_path), size, os.path.join(shard_dir, key)))
+                    except (OSError, json.JSONDecodeError):
+                        continue
+
+            entries.sort()  # Oldest access first
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            for last_used, size, entry_dir in entries:
+                expired = now - last_used > self.max_age_seconds
+                if not expired and total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                logger.info(f"Evicted cached result {os.path.basename(entry_dir)} ({'expired' if expired else 'size limit'})")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the number of entries and their total size."""
+        count = 0
+        size = 0
+        with self._lock:
+            for shard in os.listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                if shard.startswith(".") or not os.path.isdir(shard_dir):
+                    continue
+                for key in os.listdir(shard_dir):
+                    try:
+                        with open(os.path.join(shard_dir, key, ENTRY_FILE), "r", encoding="utf-8") as f:
+                            size += json.load(f).get("size", 0)
+                        count += 1
+                    except (OSError, json.JSONDecodeError):
+                        continue
+        return {
+            'entries': count,
+            'size_mb': round(size / (1024 ** 2), 1),
+            'budget_mb': round(self.max_bytes / (1024 ** 2), 1),
+            'max_age_days': round(self.max_age_seconds / 86400, 1),
+        }
@@ -0,0 +1,120 @@
+"""
+SegmentPool: Segment-parallel inference for CPU-only servers.
+One module's input is split into overlapping segments that are separated
+concurrently in worker processes, each holding its own copy of the model.
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import workers
+from modules import DEFAULT_PRESET
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SegmentPool:
+    """
+    Pool of worker processes separating segments of one input.
+
+    Workers read their segment straight from the job's raw PCM file and keep
+    their model loaded between segments (and between jobs), so a model is
+    loaded once per worker rather than once per segment.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        torch_threads: Optional[int] = None,
+        model_cache_bytes: int = 0,
+        output_format: str = "flac"
+    ):
+        """
+        Initialize the pool (worker processes start on first use).
+
+        Args:
+            max_workers: Number of worker processes (segments separated at the same time)
+            torch_threads: Intra-op torch threads per worker (None: CPU count / workers)
+            model_cache_bytes: Total model cache budget, split across workers (each keeps at least its last model)
+            output_format: Output format of the worker processors
+        """
+        self.max_workers = max(1, max_workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.model_cache_bytes = model_cache_bytes
+        self.output_format = output_format
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Starting {self.max_workers} segment workers ({self.torch_threads} torch threads each)")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=workers.init_worker,
+                    initargs=(self.output_format, max(1, self.model_cache_bytes // self.max_workers), self.torch_threads),
+                )
+            return self._pool
+
+    def map(
+        self,
+        module_name: str,
+        input_path: str,
+        pcm_path: str,
+        frames: int,
+        windows: List[Tuple[int, int]],
+        gain: float = 1.0,
+        preset: str = DEFAULT_PRESET
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Separates the given windows of a raw PCM input in parallel.
+
+        At most two windows per worker are in flight, so finished windows
+        waiting for a slower predecessor do not pile up in memory.
+
+        Args:
+            module_name: Module to run
+            input_path: Original input path (names the outputs)
+            pcm_path: Raw stereo float32 file holding the decoded input
+            frames: Number of frames in pcm_path
+            windows: (start, end) frame ranges to separate
+            gain: Gain applied to the input before separation
+            preset: Speed/quality preset
+
+        Yields:
+            Mapping of output filename -> stem array for each window, in order
+        """
+        pool = self._get_pool()
+        in_flight = deque()
+        pending = iter(windows)
+        try:
+            while True:
+                while len(in_flight) < 2 * self.max_workers:
+                    window = next(pending, None)
+                    if window is None:
+                        break
+                    in_flight.append(pool.submit(
+                        workers.separate_segment_task, module_name, input_path, pcm_path, frames, window[0], window[1], gain, preset
+                    ))
+                if not in_flight:
+                    return
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        """Stops worker processes."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
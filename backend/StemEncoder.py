@@ -0,0 +1,178 @@
+"""
+StemEncoder: Background encoding of separated stems.
+Stems are handed over as arrays and encoded to FLAC on a thread pool while the
+next inference runs; a job waits on its EncodeBatch before it completes.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+import soundfile as sf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# FLAC compression levels use the reference encoder's 0 (fastest) - 8 (smallest) scale
+DEFAULT_FLAC_COMPRESSION_LEVEL = 5
+
+
+class EncodeBatch:
+    """
+    The encodes submitted by one job.
+
+    Tracks encode time per tag (module name) and runs callbacks once a group
+    of files is on disk.
+    """
+
+    def __init__(self, encoder: "StemEncoder"):
+        self._encoder = encoder
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+        self._callbacks: List[threading.Event] = []
+        self.seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def submit(self, tag: str, path: str, data: np.ndarray, sample_rate: int) -> Future:
+        """Queues `data` to be encoded to `path`; encode time is accounted to `tag`."""
+        future = self._encoder.executor.submit(self._encode, tag, path, data, sample_rate)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def _encode(self, tag: str, path: str, data: np.ndarray, sample_rate: int) -> float:
+        # Accounted in the worker thread so wait() never returns before the bookkeeping
+        try:
+            seconds = self._encoder.encode(path, data, sample_rate)
+        except Exception as e:
+            logger.error(f"Failed to encode {os.path.basename(path)}: {e}")
+            with self._lock:
+                self.errors[path] = str(e)
+            raise
+        with self._lock:
+            self.seconds[tag] = self.seconds.get(tag, 0.0) + seconds
+        return seconds
+
+    def when_done(self, futures: List[Future], callback: Callable[[], Any]) -> None:
+        """
+        Runs `callback` once every future in `futures` has finished (immediately if empty).
+        wait() also waits for the callback.
+        """
+        finished = threading.Event()
+        with self._lock:
+            self._callbacks.append(finished)
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def run_callback():
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Post-encode callback failed: {e}")
+            finally:
+                finished.set()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] != 0:
+                    return
+            run_callback()
+
+        if not futures:
+            run_callback()
+            return
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def wait(self) -> Dict[str, Any]:
+        """
+        Blocks until every submitted encode has finished.
+
+        Returns:
+            Dict with `encode_seconds` per tag and `errors` per failed path
+        """
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass  # Recorded in errors
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for finished in callbacks:
+            finished.wait()
+        with self._lock:
+            return {'encode_seconds': dict(self.seconds), 'errors': dict(self.errors)}
+
+
+class StemEncoder:
+    """Thread pool that writes stems to FLAC with a configurable compression level."""
+
+    def __init__(self, max_workers: int = 2, compression_level: int = DEFAULT_FLAC_COMPRESSION_LEVEL, subtype: str = "PCM_16"):
+        """
+        Initialize the encoder.
+
+        Args:
+            max_workers: Number of concurrent encodes
+            compression_level: FLAC compression level, 0 (fastest) to 8 (smallest)
+            subtype: Sample format written to the file
+        """
+        self.compression_level = min(8, max(0, compression_level))
+        self.subtype = subtype
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="stem-encoder")
+
+    def batch(self) -> EncodeBatch:
+        return EncodeBatch(self)
+
+    def encode(self, path: str, data: np.ndarray, sample_rate: int) -> float:
+        """
+        Encodes one stem. The file is written next to its destination and moved
+        into place, so readers never see a partial file.
+
+        Returns:
+            Encode time in seconds
+        """
+        started = time.time()
+        temp_path = f"{path}.part"
+        try:
+            sf.write(
+                temp_path, data, sample_rate,
+                format="FLAC", subtype=self.subtype,
+                compression_level=self.compression_level / 8
+            )
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return time.time() - started
+
+    def encode_blocks(self, path: str, blocks: Iterable[np.ndarray], sample_rate: int, channels: int) -> float:
+        """
+        Encodes a stem streamed as consecutive blocks (e.g. a chunked separation),
+        so the whole stem never has to be in memory. Non-FLAC paths use the
+        format implied by the extension.
+
+        Returns:
+            Encode time in seconds
+        """
+        started = time.time()
+        temp_path = f"{path}.part"
+        if path.lower().endswith(".flac"):
+            options = {"format": "FLAC", "subtype": self.subtype, "compression_level": self.compression_level / 8}
+        else:
+            options = {"format": os.path.splitext(path)[1][1:].upper()}
+        try:
+            with sf.SoundFile(temp_path, "w", samplerate=sample_rate, channels=channels, **options) as f:
+                for block in blocks:
+                    f.write(block)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return time.time() - started
@@ -7,28 +7,39 @@ import static_ffmpeg
 # Ensure ffmpeg paths
 static_ffmpeg.add_paths()
 
-# Setup Flask
-app = Flask(__name__)
-
-# CORS: Restrict to known frontend origins (add production URL when deploying)
-CORS(app, origins=[
-    'http://localhost:3000',
-    'http://localhost:5173',
-    'http://127.0.0.1:3000',
-    'http://127.0.0.1:5173',
-])
-
-# Import Routes
-from routes.projects_routes import projects_bp
-from routes.audio_routes import audio_bp
-from routes.sse_routes import sse_bp
-from routes.settings_routes import settings_bp
-
-# Register Blueprints
-app.register_blueprint(projects_bp, url_prefix='/api')
-app.register_blueprint(audio_bp, url_prefix='/api')
-app.register_blueprint(sse_bp, url_prefix='/api')
-app.register_blueprint(settings_bp, url_prefix='/api')
+def create_app() -> Flask:
+    # Setup Flask
+    app = Flask(__name__)
+    # Let a fronting server (e.g. Apache mod_xsendfile, lighttpd) send files instead of Python
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+
+    # CORS: Restrict to known frontend origins (add production URL when deploying)
+    CORS(app, origins=[
+        'http://localhost:3000',
+        'http://localhost:5173',
+        'http://127.0.0.1:3000',
+        'http://127.0.0.1:5173',
+    ], expose_headers=['ETag', 'X-Next-Cursor', 'X-Total-Count', 'X-Playback-Proxy', 'X-Mixdown-Cache'])
+
+    # Import Routes
+    from routes.projects_routes import projects_bp
+    from routes.audio_routes import audio_bp
+    from routes.sse_routes import sse_bp
+    from routes.settings_routes import settings_bp
+    from routes.jobs_routes import jobs_bp
+
+    # Register Blueprints
+    app.register_blueprint(projects_bp, url_prefix='/api')
+    app.register_blueprint(audio_bp, url_prefix='/api')
+    app.register_blueprint(sse_bp, url_prefix='/api')
+    app.register_blueprint(settings_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    return app
+
+# Worker processes (spawned for parallel module execution) re-import this file
+# as __mp_main__; they must not build the app and its services.
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
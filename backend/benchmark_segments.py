@@ -0,0 +1,78 @@
+"""
+Benchmark of segment-parallel inference (SEGMENT_WORKERS) on CPU.
+
+Separates one input with each module at increasing worker counts and reports
+wall-clock time and speedup over a single-pass run. Every configuration runs
+once untimed first, so model loading in the workers is not measured.
+
+Usage:
+    python benchmark_segments.py song.flac --workers 1 2 4 8 16
+    python benchmark_segments.py song.flac --modules htdemucs_4s --workers 1 4 --torch-threads 4
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import static_ffmpeg
+
+from AudioProcessor import AudioProcessor
+from SegmentPool import SegmentPool
+from utils.pcm import PcmStore
+
+
+def run_once(processor: AudioProcessor, module_name: str, input_path: str, work_dir: str) -> float:
+    """Separates input_path into a fresh folder and returns the wall-clock time."""
+    output_dir = tempfile.mkdtemp(dir=work_dir)
+    pcm_store = PcmStore(os.path.join(output_dir, ".cache", "pcm"))
+    try:
+        pcm_store.open(input_path, 44100)  # Decoding is shared by every mode, keep it out of the timing
+        started = time.perf_counter()
+        processor.execute_module(module_name, input_path, output_dir, pcm_store=pcm_store)
+        return time.perf_counter() - started
+    finally:
+        pcm_store.clear()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Audio file to separate")
+    parser.add_argument("--modules", nargs="+", default=["htdemucs_4s", "vocal_instrumental"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--torch-threads", type=int, default=None, help="Torch threads per worker (default: CPU count / workers)")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per configuration (best is reported)")
+    args = parser.parse_args()
+
+    static_ffmpeg.add_paths()
+    input_path = os.path.abspath(args.input)
+    work_dir = tempfile.mkdtemp(prefix="segment-bench-")
+    results = []
+    try:
+        for module_name in args.modules:
+            baseline = None
+            for workers in args.workers:
+                pool = SegmentPool(max_workers=workers, torch_threads=args.torch_threads) if workers > 1 else None
+                processor = AudioProcessor(chunk_seconds=0, segment_pool=pool)
+                try:
+                    run_once(processor, module_name, input_path, work_dir)  # Warm-up: loads the models
+                    seconds = min(run_once(processor, module_name, input_path, work_dir) for _ in range(args.repeat))
+                finally:
+                    if pool:
+                        pool.shutdown()
+                    processor.model_cache.clear()
+                baseline = baseline or seconds
+                results.append((module_name, workers, seconds, baseline / seconds))
+                print(f"{module_name:<22} workers={workers:<3} {seconds:8.1f}s  x{baseline / seconds:.2f}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nCPU count: {os.cpu_count()}")
+    print(f"{'module':<22} {'workers':>7} {'seconds':>9} {'speedup':>8}")
+    for module_name, workers, seconds, speedup in results:
+        print(f"{module_name:<22} {workers:>7} {seconds:>9.1f} {speedup:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
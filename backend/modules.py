@@ -2,7 +2,7 @@
 Module Registry: Defines all available audio separation modules.
 Each module has configuration for the model, dependencies, and output naming.
 """
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Iterable, Tuple
 
 MODULE_REGISTRY: Dict[str, Dict[str, Any]] = {
     "vocal_instrumental": {
@@ -82,9 +82,76 @@ MODULE_REGISTRY: Dict[str, Dict[str, Any]] = {
             "Bass": "bass_htdemucs.bass",
             "Other": "other_htdemucs.other",
         }
+    },
+    # Derived modules: linear combinations of the parent's stems ("<stem key>": gain)
+    # and the original input ("original": gain), evaluated without loading a model
+    "no_drums": {
+        "type": "derived",
+        "description": "Original mix without the drums",
+        "welcome_text": "The song with the drums taken out, computed from the 4-stem split. Great for drummers who want to play along.",
+        "category": "Derived",
+        "model": None,
+        "depends_on": "htdemucs_4s",
+        "input_stem": None,
+        "formula": {
+            "NoDrums": {"original": 1.0, "Drums": -1.0}
+        },
+        "custom_output_names": {
+            "NoDrums": "no_drums_htdemucs.instrumental"
+        }
+    },
+    "instrumental_no_bass": {
+        "type": "derived",
+        "description": "Instrumental without the bass (drums + other)",
+        "welcome_text": "The backing track with both the vocals and the bass removed, computed from the 4-stem split. Handy for bass players.",
+        "category": "Derived",
+        "model": None,
+        "depends_on": "htdemucs_4s",
+        "input_stem": None,
+        "formula": {
+            "Instrumental": {"Drums": 1.0, "Other": 1.0}
+        },
+        "custom_output_names": {
+            "Instrumental": "instrumental_no_bass_htdemucs.instrumental"
+        }
+    },
+    "residual_htdemucs": {
+        "type": "derived",
+        "description": "Residual of the 4-stem split (original minus all stems)",
+        "welcome_text": "Whatever the 4-stem split left out. It should be close to silence; anything audible is leakage or artifacts.",
+        "category": "Derived",
+        "model": None,
+        "depends_on": "htdemucs_4s",
+        "input_stem": None,
+        "formula": {
+            "Residual": {"original": 1.0, "Vocals": -1.0, "Drums": -1.0, "Bass": -1.0, "Other": -1.0}
+        },
+        "custom_output_names": {
+            "Residual": "residual_htdemucs.other"
+        }
     }
 }
 
+# Formula term referring to the project's original input
+ORIGINAL_TERM = "original"
+
+
+# Named speed/quality presets per separator architecture, passed to audio-separator
+# as mdxc_params / demucs_params. "standard" keeps audio-separator's usual defaults.
+DEFAULT_PRESET = "standard"
+SEPARATION_PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "mdxc": {
+        "draft": {"segment_size": 256, "override_model_segment_size": False, "overlap": 2, "batch_size": 1, "pitch_shift": 0},
+        "standard": {"segment_size": 256, "override_model_segment_size": False, "overlap": 8, "batch_size": 1, "pitch_shift": 0},
+        "max": {"segment_size": 256, "override_model_segment_size": False, "overlap": 16, "batch_size": 1, "pitch_shift": 0},
+    },
+    "demucs": {
+        "draft": {"segment_size": "Default", "shifts": 0, "overlap": 0.1, "segments_enabled": True},
+        "standard": {"segment_size": "Default", "shifts": 2, "overlap": 0.25, "segments_enabled": True},
+        "max": {"segment_size": "Default", "shifts": 5, "overlap": 0.5, "segments_enabled": True},
+    },
+}
+PRESET_NAMES = ["draft", "standard", "max"]
 
 def get_module(module_name: str) -> Optional[Dict[str, Any]]:
     """Returns module configuration by name, or None if not found."""
@@ -128,6 +195,130 @@ def get_dependency_chain(module_name: str) -> List[str]:
     return chain
 
 
+def is_derived(module_name: str) -> bool:
+    """Whether a module is computed from existing stems instead of running a model."""
+    return MODULE_REGISTRY.get(module_name, {}).get("type") == "derived"
+
+
+def get_input_stems(module_name: str) -> List[str]:
+    """Returns the stems of its parent a module reads (the formula terms of a derived module)."""
+    config = MODULE_REGISTRY[module_name]
+    if config.get("type") == "derived":
+        return sorted({term for formula in config["formula"].values() for term in formula if term != ORIGINAL_TERM})
+    return [config["input_stem"]] if config.get("input_stem") else []
+
+
+def get_module_arch(module_name: str) -> str:
+    """Returns the separator architecture of a module's model ("demucs" for YAML configs, "mdxc", or "derived")."""
+    if is_derived(module_name):
+        return "derived"
+    model = MODULE_REGISTRY[module_name]["model"]
+    return "demucs" if model.endswith(".yaml") else "mdxc"
+
+
+def get_preset_params(module_name: str, preset: str = DEFAULT_PRESET) -> Dict[str, Any]:
+    """
+    Returns the architecture parameters of a preset for a module (empty for derived modules).
+    
+    Raises:
+        ValueError: If the preset is unknown
+    """
+    if preset not in PRESET_NAMES:
+        raise ValueError(f"Unknown preset: {preset}")
+    return dict(SEPARATION_PRESETS.get(get_module_arch(module_name), {}).get(preset, {}))
+
+def get_stem_outputs(output_format: str = "flac") -> Dict[str, Tuple[str, str]]:
+    """Returns every stem filename a registered module can produce -> (module name, stem key)."""
+    return {
+        f"{filename}.{output_format}": (module_name, stem_key)
+        for module_name, config in MODULE_REGISTRY.items()
+        for stem_key, filename in config["custom_output_names"].items()
+    }
+
+
+def get_consumed_stems(module_name: str) -> List[str]:
+    """Returns the output stems of a module that other modules use as their input."""
+    return sorted({
+        stem_key
+        for child, config in MODULE_REGISTRY.items()
+        if config.get("depends_on") == module_name
+        for stem_key in get_input_stems(child)
+    })
+
+
+def get_execution_dag(module_names: Iterable[str], completed: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """
+    Builds the execution DAG for a set of requested modules.
+    
+    The DAG contains every requested module plus any missing dependency,
+    excluding modules that are already completed.
+    
+    Returns:
+        Mapping of module -> list of pending parent modules it must wait for
+    """
+    done = set(completed)
+    dag: Dict[str, List[str]] = {}
+    for module_name in module_names:
+        for name in get_dependency_chain(module_name):
+            if name in done or name in dag:
+                continue
+            parent = MODULE_REGISTRY[name].get("depends_on")
+            dag[name] = [parent] if parent and parent not in done else []
+    return dag
+
+
+def get_topological_levels(dag: Dict[str, List[str]]) -> List[List[str]]:
+    """
+    Groups DAG nodes into levels; every module in a level only depends on earlier levels.
+    Modules within a level can run in parallel.
+    """
+    levels: List[List[str]] = []
+    placed: Dict[str, int] = {}
+    remaining = dict(dag)
+    while remaining:
+        ready = [m for m, parents in remaining.items() if all(p in placed for p in parents)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between modules: {sorted(remaining)}")
+        for name in ready:
+            placed[name] = len(levels)
+            del remaining[name]
+        levels.append(ready)
+    return levels
+
+
+def get_critical_path(dag: Dict[str, List[str]], costs: Optional[Dict[str, float]] = None) -> Tuple[List[str], float]:
+    """
+    Finds the longest (most expensive) dependency chain in the DAG.
+    
+    Args:
+        dag: Mapping of module -> pending parent modules
+        costs: Estimated cost per module (defaults to 1.0 each)
+        
+    Returns:
+        Tuple of (modules on the critical path in execution order, total cost)
+    """
+    costs = costs or {}
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for level in get_topological_levels(dag):
+        for name in level:
+            parents = dag[name]
+            best = max(parents, key=lambda p: finish[p]) if parents else None
+            finish[name] = (finish[best] if best else 0.0) + costs.get(name, 1.0)
+            previous[name] = best
+    
+    if not finish:
+        return [], 0.0
+    
+    current: Optional[str] = max(finish, key=finish.get)
+    total = finish[current]
+    path = []
+    while current:
+        path.insert(0, current)
+        current = previous[current]
+    return path, total
+
+
 def load_model_data() -> Dict[str, Any]:
     """Loads and indexes model data from models.json by filename."""
     import json
@@ -161,9 +352,15 @@ def load_model_data() -> Dict[str, Any]:
         return {}
 
 
-def get_modules_for_api() -> List[Dict[str, Any]]:
-    """Returns all modules in frontend-ready format."""
+def get_modules_for_api(preset_costs: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Returns all modules in frontend-ready format.
+    
+    Args:
+        preset_costs: Measured cost per module and preset (see PresetCosts.describe)
+    """
     model_lookup = load_model_data()
+    preset_costs = preset_costs or {}
     
     return [
         {
@@ -171,10 +368,13 @@ def get_modules_for_api() -> List[Dict[str, Any]]:
             'description': config.get('description', ''),
             'welcomeText': config.get('welcome_text', ''),
             'category': config.get('category', 'Uncategorized'),
-            'model': config.get('model', ''),
+            'type': config.get('type', 'model'),
+            'model': config.get('model') or '',
             'outputs': list(config.get('custom_output_names', {}).keys()),
             'dependsOn': config.get('depends_on'),
-            'scores': model_lookup.get(config.get('model', ''), {}).get('scores', {})
+            'scores': model_lookup.get(config.get('model') or '', {}).get('scores', {}),
+            'presets': preset_costs.get(module_id, {name: {'relative_cost': None, 'realtime_factor': None} for name in PRESET_NAMES}),
+            **({'formula': config['formula']} if config.get('type') == 'derived' else {})
         }
         for module_id, config in MODULE_REGISTRY.items()
     ]
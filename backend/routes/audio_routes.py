@@ -1,9 +1,14 @@
 from flask import Blueprint, jsonify, request
-from services.container import audio_service, project_service, file_service, sse_manager
+from services.container import audio_service, project_service, file_service, sse_manager, job_manager
 from services.SSEMessageHandler import SSEMessageHandler
-from modules import MODULE_REGISTRY, validate_modules, get_modules_for_api
-from services.SSEManager import useSSEManager
+from services.JobManager import JobQueueFullError
+from services.AudioService import DEFAULT_PREVIEW_SECONDS, MAX_PREVIEW_SECONDS
+from modules import MODULE_REGISTRY, PRESET_NAMES, DEFAULT_PRESET, validate_modules, get_modules_for_api
+from routes.jobs_routes import job_accepted_response, queue_full_response, modules_covered
+from AudioProject import AudioProject
 import json
+import math
+import shutil
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
 import os
@@ -19,6 +24,24 @@ def is_valid_url(url: str) -> bool:
     except Exception:
         return False
 
+def parse_preview(start, duration):
+    """
+    Validates the excerpt preview fields of a processing request.
+
+    Returns:
+        (preview, error): preview is None when no preview_start was given
+    """
+    if start is None or start == '':
+        return None, None
+    try:
+        start = float(start)
+        duration = float(duration) if duration not in (None, '') else DEFAULT_PREVIEW_SECONDS
+    except (TypeError, ValueError):
+        return None, 'preview_start and preview_seconds must be numbers'
+    if start < 0 or not 0 < duration <= MAX_PREVIEW_SECONDS:
+        return None, f'preview_start must be >= 0 and preview_seconds in (0, {MAX_PREVIEW_SECONDS:g}]'
+    return {'start': start, 'duration': duration}, None
+
 audio_bp = Blueprint('audio', __name__)
 
 # Re-expose MODULE_REGISTRY map as alias WORKFLOW_MAP for compatibility if needed
@@ -26,7 +49,8 @@ WORKFLOW_MAP = MODULE_REGISTRY
 
 @audio_bp.route('/modules', methods=['GET'])
 def get_modules():
-    return jsonify({'modules': get_modules_for_api()}), 200
+    preset_costs = audio_service.preset_costs.describe() if audio_service.preset_costs else None
+    return jsonify({'modules': get_modules_for_api(preset_costs), 'presets': PRESET_NAMES, 'default_preset': DEFAULT_PRESET}), 200
 
 @audio_bp.route('/process', methods=['POST'])
 def process_audio():
@@ -54,30 +78,44 @@ def process_audio():
     if invalid:
         return jsonify({'error': f'Invalid modules: {invalid}'}), 400
     
-    with useSSEManager(sse_manager, temp_project_id) as (_sse_manager, state):
-        sse_message_handler = SSEMessageHandler(temp_project_id, _sse_manager)
+    preset = request.form.get('preset') or DEFAULT_PRESET
+    if preset not in PRESET_NAMES:
+        return jsonify({'error': f'Invalid preset: {preset}. Expected one of {PRESET_NAMES}'}), 400
+    
+    preview, error = parse_preview(request.form.get('preview_start'), request.form.get('preview_seconds'))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    if not job_manager.has_capacity():
+        return queue_full_response()
+    
+    sse_manager.create(temp_project_id)
+    sse_message_handler = SSEMessageHandler(temp_project_id, sse_manager)
 
-        filename = sanitize_filename(secure_filename(file.filename))
-        original_display_name = os.path.splitext(file.filename)[0]  # Original filename before sanitization (for display)
-        filename_no_ext = os.path.splitext(filename)[0]
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        project_id = f"{timestamp}_{get_ascii_prefix(filename_no_ext)}" 
-        
-        output_folder = project_service.create_project_folder(project_id)
-        original_path = os.path.join(output_folder, filename)
-        file.save(original_path)
-        
-        # Update project ID and notify frontend
-        state["job_id"] = project_id
-        sse_message_handler.set_project_id(project_id)
-        
-        try:
-            result = audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler, display_name=original_display_name)
-            return jsonify(result), 200
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': str(e)}), 500
+    filename = sanitize_filename(secure_filename(file.filename))
+    original_display_name = os.path.splitext(file.filename)[0]  # Original filename before sanitization (for display)
+    filename_no_ext = os.path.splitext(filename)[0]
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    project_id = f"{timestamp}_{get_ascii_prefix(filename_no_ext)}" 
+    
+    output_folder = project_service.create_project_folder(project_id)
+    original_path = os.path.join(output_folder, filename)
+    file.save(original_path)
+    
+    # Notify frontend of the final project ID (moves the SSE channel)
+    sse_message_handler.set_project_id(project_id)
+    
+    def run(job):
+        return audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler, display_name=original_display_name, preset=preset, preview=preview)
+    
+    try:
+        job = job_manager.submit('process', run, project_id=project_id, sse_message_handler=sse_message_handler)
+    except JobQueueFullError:
+        sse_message_handler.close()
+        shutil.rmtree(output_folder, ignore_errors=True)
+        return queue_full_response()
+    
+    return job_accepted_response(job)
 
 @audio_bp.route('/process-url', methods=['POST'])
 def process_url():
@@ -91,47 +129,66 @@ def process_url():
     if not modules_to_run: return jsonify({'error': 'modules required'}), 400
     if not temp_project_id: return jsonify({'error': 'temp_project_id required'}), 400
     
-    try:
-        with useSSEManager(sse_manager, temp_project_id) as (_sse_manager, state):
-
-            sse_message_handler = SSEMessageHandler(temp_project_id, _sse_manager)
-
-            downloaded_filepath, original_filename, thumbnail_url, video_title = audio_service.download_url(url, sse_message_handler)
-            
-            # Sanitize filename from URL download
-            filename = sanitize_filename(original_filename)
-            if filename != original_filename:
-                # Rename the downloaded file to the sanitized name
-                new_downloaded_filepath = os.path.join(os.path.dirname(downloaded_filepath), filename)
-                os.rename(downloaded_filepath, new_downloaded_filepath)
-                downloaded_filepath = new_downloaded_filepath
-
-            # Create Project
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename_no_ext = os.path.splitext(filename)[0]
-            project_id = f"{timestamp}_{get_ascii_prefix(filename_no_ext)}"
-            state["job_id"] = project_id
-            sse_message_handler.set_project_id(project_id)
-            
-            output_folder = project_service.create_project_folder(project_id)
-            persistent_filepath = os.path.join(output_folder, filename)
-            
-            import shutil
-            shutil.move(downloaded_filepath, persistent_filepath)
-            
-            result = audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler, thumbnail=thumbnail_url, display_name=video_title)
-            return jsonify(result), 200
+    invalid = validate_modules(modules_to_run)
+    if invalid:
+        return jsonify({'error': f'Invalid modules: {invalid}'}), 400
+    
+    preset = data.get('preset') or DEFAULT_PRESET
+    if preset not in PRESET_NAMES:
+        return jsonify({'error': f'Invalid preset: {preset}. Expected one of {PRESET_NAMES}'}), 400
+    
+    preview, error = parse_preview(data.get('preview_start'), data.get('preview_seconds'))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    sse_manager.create(temp_project_id)
+    sse_message_handler = SSEMessageHandler(temp_project_id, sse_manager)
+    
+    def run(job):
+        downloaded_filepath, original_filename, thumbnail_url, video_title = audio_service.download_url(url, sse_message_handler)
+        
+        # Sanitize filename from URL download
+        filename = sanitize_filename(original_filename)
+        if filename != original_filename:
+            # Rename the downloaded file to the sanitized name
+            new_downloaded_filepath = os.path.join(os.path.dirname(downloaded_filepath), filename)
+            os.rename(downloaded_filepath, new_downloaded_filepath)
+            downloaded_filepath = new_downloaded_filepath
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        # Create Project
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename_no_ext = os.path.splitext(filename)[0]
+        project_id = f"{timestamp}_{get_ascii_prefix(filename_no_ext)}"
+        job.project_id = project_id
+        sse_message_handler.set_project_id(project_id)
+        
+        output_folder = project_service.create_project_folder(project_id)
+        persistent_filepath = os.path.join(output_folder, filename)
+        shutil.move(downloaded_filepath, persistent_filepath)
+        
+        return audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler, thumbnail=thumbnail_url, display_name=video_title, preset=preset, preview=preview)
+    
+    try:
+        job = job_manager.submit('process_url', run, sse_message_handler=sse_message_handler)
+    except JobQueueFullError:
+        sse_message_handler.close()
+        return queue_full_response()
+    
+    return job_accepted_response(job)
 
 @audio_bp.route('/project/<project_id>/run-modules', methods=['POST'])
 def run_additional_modules(project_id):
     data = request.json
     modules_to_run = data.get('modules', [])
     
+    invalid = validate_modules(modules_to_run)
+    if invalid:
+        return jsonify({'error': f'Invalid modules: {invalid}'}), 400
+    
+    preset = data.get('preset') or DEFAULT_PRESET
+    if preset not in PRESET_NAMES:
+        return jsonify({'error': f'Invalid preset: {preset}. Expected one of {PRESET_NAMES}'}), 400
+    
     project_path = project_service.get_project_path(project_id)
     if not project_path:
         return jsonify({'error': 'Project not found'}), 404
@@ -152,25 +209,96 @@ def run_additional_modules(project_id):
     # But let's assume metadata is correct.
     if not filename:
          return jsonify({'error': 'Original file unknown'}), 500
-         
+    
+    covers = modules_covered(modules_to_run, preset)
+    if not job_manager.has_capacity(project_id, covers):
+        return queue_full_response()
+    
+    # The channel is shared with any job already running on the project
+    opened = sse_manager.create(project_id)
+    sse_message_handler = SSEMessageHandler(project_id, sse_manager)
+    
+    def run(job):
+        # Note: process_separation does "load_or_create" AudioProject, runs modules, and updates metadata.
+        # It effectively handles "run additional" too because AudioProject skips completed modules.
+        return audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler, preset=preset)
+    
     try:
-        with useSSEManager(sse_manager, project_id) as (_sse_manager, state):
-            sse_message_handler = SSEMessageHandler(project_id, _sse_manager)
-            result = audio_service.process_separation(project_id, filename, modules_to_run, sse_message_handler)
-            # Note: process_separation does "load_or_create" AudioProject, runs modules, and updates metadata.
-            # It effectively handles "run additional" too because AudioProject skips completed modules.
-            return jsonify(result), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        # Requests for modules an unfinished job on this project already runs attach to that job
+        job = job_manager.submit('run_modules', run, project_id=project_id, sse_message_handler=sse_message_handler, covers=covers)
+    except JobQueueFullError:
+        if opened:
+            sse_message_handler.close()
+        return queue_full_response()
+    
+    return job_accepted_response(job)
+
+@audio_bp.route('/project/<project_id>/reprocess-region', methods=['POST'])
+def reprocess_region(project_id):
+    data = request.json or {}
+    module_name = data.get('module')
+    if module_name not in MODULE_REGISTRY:
+        return jsonify({'error': f'Invalid module: {module_name}'}), 400
+    
+    try:
+        start = float(data.get('start'))
+        end = float(data.get('end'))
+        padding = float(data['padding']) if data.get('padding') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start, end and padding must be numbers'}), 400
+    if not all(math.isfinite(v) for v in (start, end)) or (padding is not None and not math.isfinite(padding)):
+        return jsonify({'error': 'start, end and padding must be finite numbers'}), 400
+    if start < 0 or end <= start or (padding is not None and padding < 0):
+        return jsonify({'error': 'Expected 0 <= start < end and padding >= 0'}), 400
+    
+    preset = data.get('preset') or DEFAULT_PRESET
+    if preset not in PRESET_NAMES:
+        return jsonify({'error': f'Invalid preset: {preset}. Expected one of {PRESET_NAMES}'}), 400
+    cascade = bool(data.get('cascade', True))
+    
+    if not project_service.get_project_path(project_id):
+        return jsonify({'error': 'Project not found'}), 404
+    try:
+        project = AudioProject.load(project_id, base_library=project_service.library_folder)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return jsonify({'error': str(e)}), 404
+    if not project.is_module_completed(module_name):
+        return jsonify({'error': f"Module '{module_name}' has not been executed"}), 400
+    
+    if not job_manager.has_capacity():
+        return queue_full_response()
+    
+    # The channel is shared with any job already running on the project
+    opened = sse_manager.create(project_id)
+    sse_message_handler = SSEMessageHandler(project_id, sse_manager)
+    
+    def run(job):
+        return audio_service.reprocess_region(project_id, module_name, start, end, sse_message_handler, preset=preset, padding=padding, cascade=cascade)
+    
+    try:
+        job = job_manager.submit('reprocess_region', run, project_id=project_id, sse_message_handler=sse_message_handler)
+    except JobQueueFullError:
+        if opened:
+            sse_message_handler.close()
+        return queue_full_response()
+    
+    return job_accepted_response(job)
 
 @audio_bp.route('/unify', methods=['POST'])
 def unify_tracks():
     data = request.json
     project_id = data.get('id')
     track_names = data.get('tracks')
+    gains = data.get('gains')
+    if gains is not None and not isinstance(gains, dict):
+        return jsonify({'error': 'gains must map track names to linear gains'}), 400
+    for name, gain in (gains or {}).items():
+        # bool is an int subclass, but true/false is not a gain
+        if isinstance(gain, bool) or not isinstance(gain, (int, float)) or not math.isfinite(gain):
+            return jsonify({'error': f"Gain of '{name}' must be a finite number"}), 400
     
     try:
-        new_track = audio_service.unify_tracks(project_id, track_names)
+        new_track = audio_service.unify_tracks(project_id, track_names, gains=gains)
         return jsonify({'message': 'Unify successful', 'new_track': new_track}), 200
     except Exception as e:
         import traceback
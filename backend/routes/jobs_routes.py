@@ -0,0 +1,47 @@
+"""
+Job routes for polling background processing jobs.
+"""
+from flask import Blueprint, jsonify, url_for
+from services.container import job_manager
+from modules import get_dependency_chain
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def job_accepted_response(job):
+    """202 response for a freshly queued job, pointing at its status endpoint."""
+    body = job_manager.describe(job)
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job', job_id=job.id)
+    return response
+
+
+def modules_covered(modules_to_run, preset):
+    """
+    Units of work a separation job performs for its project: the requested
+    modules and their dependencies, each at the job's preset, so a request
+    only attaches to a job producing the same output.
+    """
+    return {f"{name}@{preset}" for module_name in modules_to_run for name in get_dependency_chain(module_name)}
+
+
+def queue_full_response():
+    """503 response used when the job queue is at capacity."""
+    response = jsonify({'error': 'Server is busy, please try again later', 'jobs': job_manager.stats()})
+    response.status_code = 503
+    response.headers['Retry-After'] = '30'
+    return response
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(job_manager.stats()), 200
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_manager.describe(job)), 200
@@ -1,12 +1,129 @@
-from flask import Blueprint, jsonify, request, send_file
-from services.container import project_service, file_service
+import json
+import math
+import hashlib
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
+from services.container import project_service, file_service, audio_service, sse_manager, job_manager, mixdown_service, proxy_service, bundle_service, spectrogram_service
+from services.SSEMessageHandler import SSEMessageHandler
+from services.JobManager import JobQueueFullError
+from routes.jobs_routes import job_accepted_response, queue_full_response, modules_covered
+from modules import DEFAULT_PRESET, get_dependency_chain, get_stem_outputs
+from utils.peaks import read_peaks
 from AudioProject import AudioProject
 
 projects_bp = Blueprint('projects', __name__)
 
+# Cache lifetime of a file requested with its current version (?v=), whose URL then never changes content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def send_versioned_file(path, version=None, etag=None, mimetype=None, cacheable=True):
+    """
+    Sends a file with a strong ETag, answering conditional (If-None-Match,
+    If-Modified-Since) and Range requests. Without a matching `?v=` the client
+    must revalidate, which costs a 304 when the file is unchanged; with it the
+    response may be cached indefinitely (unless `cacheable` is False, for a
+    stand-in the URL will stop serving). `version` defaults to the file's own
+    version (see FileService.get_file_version) and `etag` to the version.
+    """
+    version = version or file_service.get_file_version(path)
+    etag = etag or version
+    immutable = cacheable and request.args.get('v') == version
+    response = send_file(
+        path, mimetype=mimetype, as_attachment=False, etag=etag, conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def compute_stem_response(folder_id, filename):
+    """
+    Queues the modules producing a stem that has not been computed yet (lazy stems).
+
+    Returns:
+        202 response with the job (an in-flight job already running the module is reused), 503 if the
+        queue is full, or None if no pending module can produce the file
+    """
+    producer = get_stem_outputs(audio_service.processor.output_format).get(filename)
+    if not producer or not project_service.get_project_path(folder_id):
+        return None
+    module_name = producer[0]
+
+    metadata = project_service.get_project_metadata(folder_id)
+    original = metadata.get('original') if metadata else None
+    if not original:
+        return None
+    try:
+        project = AudioProject.load(folder_id, base_library=project_service.library_folder)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if project.is_module_completed(module_name):
+        return None  # The module ran but the stem is gone; running it again would skip it
+
+    modules_to_run = get_dependency_chain(module_name)
+    covers = modules_covered(modules_to_run, DEFAULT_PRESET)
+    if not job_manager.has_capacity(folder_id, covers):
+        return queue_full_response()
+
+    # The channel is shared with any job already running on the project
+    opened = sse_manager.create(folder_id)
+    sse_message_handler = SSEMessageHandler(folder_id, sse_manager)
+
+    def run(job):
+        return audio_service.process_separation(folder_id, original, modules_to_run, sse_message_handler)
+
+    # Requests while the stem is being computed attach to the same job
+    try:
+        job = job_manager.submit('compute_stem', run, project_id=folder_id, sse_message_handler=sse_message_handler, covers=covers)
+    except JobQueueFullError:
+        if opened:
+            sse_message_handler.close()
+        return queue_full_response()
+    return job_accepted_response(job)
+
 @projects_bp.route('/history', methods=['GET'])
 def list_history():
-    return jsonify(project_service.get_history()), 200
+    """
+    Lists projects, optionally one page at a time (see ProjectService.get_history).
+    The body stays a plain array; the next page's cursor and the number of
+    matching projects are sent in the X-Next-Cursor and X-Total-Count headers.
+    The ETag changes with the library index, so an unchanged history costs a 304
+    without querying it.
+    """
+    etag = hashlib.sha1(f"{project_service.get_history_revision()}?{request.query_string.decode('utf-8', 'replace')}".encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            limit = int(request.args['limit']) if 'limit' in request.args else None
+            page = project_service.get_history(
+                sort=request.args.get('sort', 'id'),
+                order=request.args.get('order', 'desc'),
+                name=request.args.get('name'),
+                date_from=request.args.get('date_from'),
+                date_to=request.args.get('date_to'),
+                modules=request.args.getlist('has_module'),
+                cursor=request.args.get('cursor'),
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response = jsonify(page['items'])
+        response.headers['X-Total-Count'] = str(page['total'])
+        if page['next_cursor']:
+            response.headers['X-Next-Cursor'] = page['next_cursor']
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+@projects_bp.route('/history/<project_id>', methods=['GET'])
+def get_history_entry(project_id):
+    """Returns the history entry of one project (an indexed lookup, for projects not on a loaded page)."""
+    track = project_service.get_project_metadata(project_id)
+    if not track:
+        return jsonify({'error': 'Project not found'}), 404
+    return jsonify(track), 200
 
 @projects_bp.route('/project/<project_id>/status', methods=['GET'])
 def get_project_status(project_id):
@@ -25,10 +142,14 @@ def get_project_status(project_id):
     # It loads AudioProject and gets executed_modules.
     try:
         project = AudioProject.load(project_id, base_library=project_service.library_folder)
+        files = list(project_track.get('stems', []))
+        if project_track.get('original'):
+            files.append(project_track['original'])
         return jsonify({
             'id': project_id,
             'executed_modules': project.get_executed_modules(),
-            'original_file': project.get_original_file()
+            'original_file': project.get_original_file(),
+            'versions': file_service.get_file_versions(project_id, files)
         }), 200
     except Exception as e:
          return jsonify({'error': str(e)}), 500
@@ -49,19 +170,171 @@ def delete_session(folder_id):
 @projects_bp.route('/download/<folder_id>/<filename>', methods=['GET'])
 def download_file(folder_id, filename):
     path = file_service.get_file_path(folder_id, filename)
+    if not path:
+        pending = compute_stem_response(folder_id, filename) if project_service.lazy_stems else None
+        return pending or (jsonify({'error': 'File not found'}), 404)
+        
+    return send_versioned_file(path)
+
+@projects_bp.route('/proxy/<folder_id>/<filename>', methods=['GET'])
+def download_playback_proxy(folder_id, filename):
+    path = file_service.get_file_path(folder_id, filename)
+    if not path:
+        return jsonify({'error': 'File not found'}), 404
+
+    # Until its proxy is encoded, a stem is played from the lossless file
+    proxy_path = proxy_service.get_proxy_path(folder_id, filename)
+    if not proxy_path:
+        response = send_versioned_file(path, cacheable=False)
+        response.headers['X-Playback-Proxy'] = 'pending' if proxy_service.enabled else 'disabled'
+        return response
+    # Versioned by the stem it was encoded from; the ETag differs from the stem's own
+    version = file_service.get_file_version(path)
+    response = send_versioned_file(proxy_path, version=version, etag=f"{version}-{proxy_service.format}", mimetype=proxy_service.mimetype)
+    response.headers['X-Playback-Proxy'] = 'ready'
+    return response
+
+@projects_bp.route('/preview/<folder_id>/<filename>', methods=['GET'])
+def download_preview_file(folder_id, filename):
+    path = file_service.get_preview_path(folder_id, filename)
     if not path:
         return jsonify({'error': 'File not found'}), 404
         
-    return send_file(path, as_attachment=False)
+    return send_versioned_file(path)
 
-@projects_bp.route('/zip/<folder_id>', methods=['GET'])
-def download_zip(folder_id):
+@projects_bp.route('/peaks/<folder_id>/<filename>', methods=['GET'])
+def get_peaks(folder_id, filename):
     try:
-        zip_path = file_service.create_zip(folder_id)
-        return send_file(zip_path, as_attachment=True)
+        start = float(request.args.get('start', 0))
+        end = float(request.args['end']) if 'end' in request.args else None
+        width = int(request.args['width']) if 'width' in request.args else None
+        level = int(request.args['level']) if 'level' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'start/end must be numbers, width/level integers'}), 400
+
+    try:
+        peaks_path = file_service.get_peaks_path(folder_id, filename)
+        if not peaks_path:
+            return jsonify({'error': 'File not found'}), 404
+        peaks = read_peaks(peaks_path, start=start, end=end, width=width, level=level)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = peaks.pop('peaks')
+    # Per channel, interleaved (min, max) pairs as 16-bit values
+    peaks['bits'] = 16
+    peaks['length'] = len(data)
+    peaks['data'] = [data[:, channel, :].reshape(-1).tolist() for channel in range(peaks['channels'])]
+    response = jsonify(peaks)
+    # Peaks only change with the stem they describe
+    response.set_etag(file_service.get_file_version(file_service.get_file_path(folder_id, filename)))
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@projects_bp.route('/spectrogram/<folder_id>/<filename>', methods=['GET'])
+def get_spectrogram_info(folder_id, filename):
+    try:
+        return jsonify(spectrogram_service.get_info(folder_id, filename)), 200
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@projects_bp.route('/spectrogram/<folder_id>/<filename>/<int:time_level>/<int:freq_level>/<int:x>/<int:y>.png', methods=['GET'])
+def get_spectrogram_tile(folder_id, filename, time_level, freq_level, x, y):
+    try:
+        tile_path = spectrogram_service.get_tile(folder_id, filename, time_level, freq_level, x, y)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not tile_path:
+        return jsonify({'error': 'Tile out of range'}), 404
+    # Tiles are versioned by the stem they are computed from
+    version = file_service.get_file_version(file_service.get_file_path(folder_id, filename))
+    return send_versioned_file(tile_path, version=version, mimetype='image/png')
+
+@projects_bp.route('/bundle/<folder_id>', methods=['GET'])
+def get_stem_bundle(folder_id):
+    stems = request.args.getlist('stem')
+    fmt = request.args['format'].lower() if request.args.get('format') else None
+    if not stems:
+        # Default to every stem of the project
+        metadata = project_service.get_project_metadata(folder_id)
+        if not metadata:
+            return jsonify({'error': 'Project not found'}), 404
+        stems = [name for name in metadata.get('stems', []) if file_service.get_file_path(folder_id, name)]
+
+    try:
+        channel_map = bundle_service.get_bundle(folder_id, stems, fmt)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(channel_map), 200
+
+@projects_bp.route('/bundle/<folder_id>/<filename>', methods=['GET'])
+def download_stem_bundle(folder_id, filename):
+    path = bundle_service.get_bundle_path(folder_id, filename)
+    if not path:
+        return jsonify({'error': 'Bundle not found'}), 404
+    # Bundles are named after the stem versions they hold, so their content never changes
+    response = send_file(path, as_attachment=False, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@projects_bp.route('/mixdown/<folder_id>', methods=['GET'])
+def stream_mixdown(folder_id):
+    stems = request.args.getlist('stem')
+    try:
+        gains = [float(g) for g in request.args.getlist('gain')]
+        start = float(request.args.get('start', 0))
+    except ValueError:
+        return jsonify({'error': 'gain and start must be numbers'}), 400
+    # float() also parses nan and inf
+    if not all(math.isfinite(g) for g in gains) or not math.isfinite(start):
+        return jsonify({'error': 'gain and start must be finite numbers'}), 400
+    fmt = request.args.get('format', 'wav').lower()
+
+    try:
+        mix = mixdown_service.render(folder_id, stems, gains, fmt, start)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Encoded while the response is sent; nothing is written to disk
+    response = Response(stream_with_context(mix.chunks), mimetype=mix.mimetype)
+    if mix.length is not None:
+        response.headers['Content-Length'] = str(mix.length)
+    disposition = 'attachment' if request.args.get('download') else 'inline'
+    response.headers['Content-Disposition'] = f'{disposition}; filename="{mix.filename}"'
+    response.headers['X-Mixdown-Cache'] = 'hit' if mix.cached else 'miss'
+    return response
+
+def zip_response(folder_id, track_names=None):
+    """Sends a project archive, generated while it is sent unless it is cached."""
+    suffix = "_selected" if track_names else ""
+    download_name = f"{folder_id}{suffix}.zip"
+    try:
+        cached_path, chunks = file_service.stream_zip(folder_id, track_names)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    if cached_path:
+        return send_file(cached_path, mimetype='application/zip', as_attachment=True, download_name=download_name)
+    response = Response(stream_with_context(chunks), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+@projects_bp.route('/zip/<folder_id>', methods=['GET'])
+def download_zip(folder_id):
+    return zip_response(folder_id)
+
 @projects_bp.route('/zip-selected', methods=['POST'])
 def download_zip_selected():
     data = request.json
@@ -70,8 +343,4 @@ def download_zip_selected():
     if not folder_id or not track_names:
         return jsonify({'error': 'Missing data'}), 400
         
-    try:
-        zip_path = file_service.create_zip(folder_id, track_names)
-        return send_file(zip_path, as_attachment=True)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return zip_response(folder_id, track_names)
@@ -24,6 +24,13 @@ def get_system_info_endpoint():
     # of trying to access internal state which may cause attributes errors.
     # processor = audio_service.processor
     
+    # Model residency cache counters (hits/misses/evictions and resident models)
+    info['model_cache'] = audio_service.processor.model_cache.stats()
+    
+    # Separation result cache (shared stems across projects)
+    result_cache = audio_service.processor.result_cache
+    info['result_cache'] = result_cache.stats() if result_cache else None
+    
     # Add helpful message
     if info['gpu_accelerated']:
         info['acceleration_message'] = f"🚀 GPU acceleration active via {info['execution_provider']}"
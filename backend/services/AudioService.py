@@ -2,6 +2,7 @@ from .log_interceptor import intercept
 from .SSEMessageHandler import SSEMessageHandler
 import os
 import json
+import shutil
 import logging
 import numpy as np
 import yt_dlp
@@ -9,23 +10,83 @@ import soundfile as sf
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-from AudioProcessor import AudioProcessor
-from AudioProject import AudioProject
-from modules import MODULE_REGISTRY
+from AudioProcessor import AudioProcessor, DEFAULT_MODEL_CACHE_BYTES, INTERMEDIATE_MEMORY
+from AudioProject import AudioProject, PREVIEW_FOLDER
+from ModuleScheduler import ModuleScheduler
+from ResultCache import ResultCache
+from SegmentPool import SegmentPool
+from StemEncoder import StemEncoder, DEFAULT_FLAC_COMPRESSION_LEVEL
+from modules import MODULE_REGISTRY, DEFAULT_PRESET
+from PresetCosts import PresetCosts
+from utils.state import project_lock, write_json
+from utils.audio_blocks import file_blocks, mix_blocks
+from utils.chunking import PARTIAL_SUFFIX
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+PREVIEW_SAMPLE_RATE = 44100
+DEFAULT_PREVIEW_SECONDS = 30.0
+MAX_PREVIEW_SECONDS = 120.0
+PREVIEW_EXCERPT = "excerpt.wav"
+
 class AudioService:
-    def __init__(self, project_service, file_service):
+    def __init__(
+        self,
+        project_service,
+        file_service,
+        model_cache_bytes: int = DEFAULT_MODEL_CACHE_BYTES,
+        module_workers: int = 1,
+        result_cache_config: Optional[Dict[str, Any]] = None,
+        intermediate_mode: str = INTERMEDIATE_MEMORY,
+        encode_workers: int = 2,
+        flac_compression_level: int = DEFAULT_FLAC_COMPRESSION_LEVEL,
+        chunk_seconds: float = 0.0,
+        segment_workers: int = 0,
+        segment_torch_threads: Optional[int] = None,
+        preset_costs_path: Optional[str] = None,
+        proxy_service=None,
+        output_format: str = "flac"
+    ):
         self.project_service = project_service
         self.file_service = file_service
-        self.processor = AudioProcessor()
+        self.proxy_service = proxy_service
+        result_cache = ResultCache(**result_cache_config) if result_cache_config else None
+        self.preset_costs = PresetCosts(preset_costs_path) if preset_costs_path else None
+        segment_pool = None
+        if segment_workers > 1:
+            segment_pool = SegmentPool(
+                max_workers=segment_workers,
+                torch_threads=segment_torch_threads,
+                model_cache_bytes=model_cache_bytes
+            )
+        self.processor = AudioProcessor(
+            output_format=output_format,
+            model_cache_bytes=model_cache_bytes,
+            result_cache=result_cache,
+            intermediate_mode=intermediate_mode,
+            encoder=StemEncoder(max_workers=encode_workers, compression_level=flac_compression_level),
+            chunk_seconds=chunk_seconds,
+            segment_pool=segment_pool
+        )
+        self.scheduler = ModuleScheduler(
+            max_workers=module_workers,
+            output_format=self.processor.output_format,
+            model_cache_bytes=model_cache_bytes,
+            result_cache_config=result_cache_config,
+            intermediate_mode=intermediate_mode,
+            flac_compression_level=flac_compression_level,
+            chunk_seconds=chunk_seconds,
+            preset_costs=self.preset_costs
+        )
 
-    def process_separation(self, project_id: str, filename: str, modules_to_run: List[str], sse_message_handler: SSEMessageHandler, thumbnail: Optional[str] = None, display_name: Optional[str] = None) -> Dict[str, Any]:
+    def process_separation(self, project_id: str, filename: str, modules_to_run: List[str], sse_message_handler: SSEMessageHandler, thumbnail: Optional[str] = None, display_name: Optional[str] = None, preset: str = DEFAULT_PRESET, preview: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
         """
         Runs the separation process for a project.
+        `preset` selects the speed/quality preset for the modules run by this job.
+        `preview` ({'start': seconds, 'duration': seconds}) first separates that
+        excerpt and publishes its stems, then runs the full-length separation.
         """
         output_folder = self.project_service.get_project_path(project_id)
         if not output_folder:
@@ -41,19 +102,18 @@ class AudioService:
             base_library=self.project_service.library_folder
         )
 
-        # Run Modules
-        project.run_modules(modules_to_run, self.processor, sse_message_handler)
+        # Run Modules (stems encode in the background; decoded inputs only live for the duration of the job)
+        project.preset = preset
+        if preview:
+            self.process_preview(project, modules_to_run, preview['start'], preview.get('duration', DEFAULT_PREVIEW_SECONDS), sse_message_handler)
+        project.encode_batch = self.processor.encoder.batch()
+        try:
+            project.run_modules(modules_to_run, self.processor, sse_message_handler, scheduler=self.scheduler)
+        finally:
+            report = project.flush_encodes()
+            project.get_pcm_store().clear()
+        logger.info(f"Encoding for {project_id} took {report['encode_seconds']}")
 
-        # Save/Update Metadata
-        metadata_path = os.path.join(output_folder, 'metadata.json')
-        existing_metadata = {}
-        if os.path.exists(metadata_path):
-             try:
-                 with open(metadata_path, 'r') as f:
-                     existing_metadata = json.load(f)
-             except (json.JSONDecodeError, IOError) as e:
-                 logger.warning(f"Could not load existing metadata for {project_id}: {e}")
-        
         # Timestamp from ID usually
         timestamp = project_id.split('_')[0] if '_' in project_id else datetime.now().strftime("%Y%m%d%H%M%S")
 
@@ -68,23 +128,37 @@ class AudioService:
         }
         if thumbnail:
             metadata['thumbnail'] = thumbnail
-            
-        existing_metadata.update(metadata)
 
-        with open(metadata_path, 'w') as f:
-            json.dump(existing_metadata, f, indent=2)
+        # Save/Update Metadata (read-modify-write under the project's lock)
+        metadata_path = os.path.join(output_folder, 'metadata.json')
+        with project_lock(output_folder):
+            existing_metadata = {}
+            if os.path.exists(metadata_path):
+                 try:
+                     with open(metadata_path, 'r') as f:
+                         existing_metadata = json.load(f)
+                 except (json.JSONDecodeError, IOError) as e:
+                     logger.warning(f"Could not load existing metadata for {project_id}: {e}")
+            existing_metadata.update(metadata)
+            write_json(metadata_path, existing_metadata, indent=2)
 
         # Scan for results
         stems_list = []
         for f in os.listdir(output_folder):
             if f == filename: continue
             if f == 'metadata.json': continue
+            if f.endswith(PARTIAL_SUFFIX): continue  # Left by an interrupted chunked run
             if f.endswith(('.wav', '.mp3', '.flac')):
                 stems_list.append(f)
         stems_list = sorted(stems_list)
 
         # Update Project Service State
-        self.project_service.register_project(project_id, output_folder, filename, timestamp, stems_list)
+        self.project_service.register_project(project_id, output_folder, filename, timestamp)
+        self.stems_written(project_id, stems_list + [filename])
+
+        # The full-length stems supersede the preview
+        if preview:
+            shutil.rmtree(project.get_cache_folder(PREVIEW_FOLDER), ignore_errors=True)
 
         return {
             'message': 'Separation successful',
@@ -94,6 +168,117 @@ class AudioService:
             'thumbnail': existing_metadata.get('thumbnail')
         }
     
+    def stems_written(self, project_id: str, filenames: List[str]) -> None:
+        """
+        Derives what the editor needs from stems that were just written (or
+        rewritten): their waveform peak pyramids, and playback proxies (encoded
+        in the background). Up-to-date ones are skipped. The library index
+        picks up their new sizes and mtimes.
+        """
+        self.project_service.refresh_project(project_id)
+        self.file_service.update_peaks(project_id, filenames)
+        if self.proxy_service is not None:
+            self.proxy_service.schedule(project_id, filenames)
+
+    def reprocess_region(self, project_id: str, module_name: str, start: float, end: float, sse_message_handler: SSEMessageHandler, preset: str = DEFAULT_PRESET, padding: Optional[float] = None, cascade: bool = True) -> Dict[str, Any]:
+        """
+        Re-separates a time range of a completed module and splices it into the
+        existing stems (see AudioProject.reprocess_region).
+        """
+        output_folder = self.project_service.get_project_path(project_id)
+        if not output_folder:
+            raise FileNotFoundError(f"Project folder for {project_id} not found")
+
+        project = AudioProject.load(project_id, self.project_service.library_folder)
+        project.preset = preset
+        options = {'cascade': cascade}
+        if padding is not None:
+            options['padding'] = padding
+        try:
+            report = project.reprocess_region(module_name, start, end, self.processor, sse_message_handler, **options)
+        finally:
+            project.get_pcm_store().clear()
+
+        updated_stems = sorted(
+            os.path.basename(path)
+            for name in report['updated']
+            for path in project.state['results'][name].get('outputs', {}).values()
+        )
+        self.stems_written(project_id, updated_stems)
+        return {
+            'message': 'Region re-processed',
+            'id': project_id,
+            'updated_modules': report['updated'],
+            'updated_stems': updated_stems,
+            'stale_modules': report['stale'],
+            'executed_modules': project.get_executed_modules()
+        }
+
+    def process_preview(self, project: AudioProject, modules_to_run: List[str], start: float, duration: float, sse_message_handler: SSEMessageHandler) -> Optional[Dict[str, Any]]:
+        """
+        Separates a short excerpt of the project's input and publishes the
+        resulting stems as a 'preview' SSE event.
+
+        The excerpt is run as a throwaway project in the hidden preview folder,
+        in this process and with this job's processor, so the models it loads
+        are still cached when the full-length run starts. A failed preview is
+        reported and never fails the job.
+
+        Args:
+            project: Project whose original input is excerpted
+            modules_to_run: Modules to run on the excerpt (dependencies are resolved)
+            start: Start of the excerpt in seconds (moved back if it runs past the end)
+            duration: Length of the excerpt in seconds (capped at MAX_PREVIEW_SECONDS)
+            sse_message_handler: Handler of the job's channel
+
+        Returns:
+            The published preview, or None if it failed
+        """
+        preview_handler = sse_message_handler.for_preview()
+        preview_folder = project.get_cache_folder(PREVIEW_FOLDER)
+        shutil.rmtree(preview_folder, ignore_errors=True)
+        excerpt_project = None
+        try:
+            mix = project.get_pcm_store().open(project.get_original_file(), PREVIEW_SAMPLE_RATE)
+            frames = min(len(mix), int(min(duration, MAX_PREVIEW_SECONDS) * PREVIEW_SAMPLE_RATE))
+            first = min(max(0, int(start * PREVIEW_SAMPLE_RATE)), len(mix) - frames)
+            excerpt = np.array(mix[first:first + frames])
+
+            excerpt_path = os.path.join(preview_folder, PREVIEW_EXCERPT)
+            excerpt_project = AudioProject.create(
+                audio_file=excerpt_path,
+                project_id=PREVIEW_FOLDER,
+                base_library=project.get_cache_folder()
+            )
+            sf.write(excerpt_path, excerpt, PREVIEW_SAMPLE_RATE, subtype="FLOAT")
+            excerpt_project.get_pcm_store().put(excerpt_path, PREVIEW_SAMPLE_RATE, excerpt)
+            excerpt_project.preset = project.preset
+            # The excerpt's outputs would fill the result cache with entries that are never hit again
+            excerpt_project.use_result_cache = False
+
+            logger.info(f"Separating {frames / PREVIEW_SAMPLE_RATE:.1f}s preview of {project.project_id} from {first / PREVIEW_SAMPLE_RATE:.1f}s")
+            excerpt_project.run_modules(modules_to_run, self.processor, preview_handler)
+
+            stems = {
+                module_name: {stem_key: os.path.basename(path) for stem_key, path in result.get("outputs", {}).items()}
+                for module_name, result in excerpt_project.state.get("results", {}).items()
+            }
+            preview = {
+                'start': round(first / PREVIEW_SAMPLE_RATE, 2),
+                'duration': round(frames / PREVIEW_SAMPLE_RATE, 2),
+                'excerpt': PREVIEW_EXCERPT,
+                'stems': stems
+            }
+            preview_handler.send_preview(preview)
+            return preview
+        except Exception as e:
+            logger.error(f"Preview of {project.project_id} failed: {e}")
+            preview_handler.send_preview({'error': str(e)})
+            return None
+        finally:
+            if excerpt_project is not None:
+                excerpt_project.get_pcm_store().clear()
+
     def download_url(self, url, sse_message_handler: SSEMessageHandler):
         
         ydl_opts = {
@@ -136,13 +321,29 @@ class AudioService:
         return downloaded_filepath, filename, thumbnail, title
 
 
-    def unify_tracks(self, project_id: str, track_names: List[str]) -> str:
+    def unify_tracks(self, project_id: str, track_names: List[str], gains: Optional[Dict[str, float]] = None) -> str:
         """
         Mixes multiple tracks into one. Returns the new filename.
+
+        The tracks are read in lockstep, block by block, and the mix is written as
+        it is computed, so memory use does not grow with the track length. Mono
+        tracks are spread over every channel; the sum is clipped to [-1, 1].
+
+        Args:
+            project_id: Project holding the tracks
+            track_names: Filenames of the tracks to mix
+            gains: Optional linear gain per track name (default 1.0)
+
+        Raises:
+            FileNotFoundError: If the project does not exist
+            ValueError: On no tracks, mismatched sample rates or incompatible channel counts
         """
         directory = self.project_service.get_project_path(project_id)
         if not directory:
             raise FileNotFoundError("Project not found")
+        if not track_names:
+            raise ValueError("No audio data read")
+        gains = gains or {}
 
         input_bases = [os.path.splitext(name)[0] for name in track_names]
         combined_name = "+".join(input_bases)
@@ -151,58 +352,25 @@ class AudioService:
         
         inputs = [os.path.join(directory, name) for name in track_names]
         
-        data_list = []
-        sr = None
+        # Check formats up front (headers only)
+        infos = [sf.info(p) for p in inputs]
+        sr = infos[0].samplerate
+        for p, info in zip(inputs, infos):
+            if info.samplerate != sr:
+                raise ValueError(f"Sample rate mismatch: {os.path.basename(p)} is {info.samplerate}, expected {sr}")
+        channels = max(info.channels for info in infos)
+        if any(info.channels not in (1, channels) for info in infos):
+            raise ValueError("Channel mismatch (non-mono)")
         
-        # Read
-        for p in inputs:
-            data, samplerate = sf.read(p)
-            if sr is None: sr = samplerate
-            elif sr != samplerate:
-                raise ValueError(f"Sample rate mismatch: {os.path.basename(p)} is {samplerate}, expected {sr}")
-            
-            if data.ndim == 1:
-                data = data[:, np.newaxis]
-            data_list.append(data)
-            
-        if not data_list:
-            raise ValueError("No audio data read")
-            
-        # Mix
-        max_len = max(len(d) for d in data_list)
-        max_ch = max(d.shape[1] for d in data_list)
-        
-        mixed = np.zeros((max_len, max_ch), dtype=np.float32)
-        
-        for d in data_list:
-            length, channels = d.shape
-            if channels == 1 and max_ch > 1:
-                d = np.tile(d, (1, max_ch))
-            elif channels != max_ch:
-                raise ValueError("Channel mismatch (non-mono)")
-            mixed[:length, :] += d
-            
-        # Clip
-        mixed = np.clip(mixed, -1.0, 1.0)
-        
-        # Write
-        sf.write(output_path, mixed, sr)
+        # Mix and write block by block
+        blocks = mix_blocks(
+            [file_blocks(p) for p in inputs],
+            [float(gains.get(name, 1.0)) for name in track_names],
+            channels
+        )
+        self.processor.encoder.encode_blocks(output_path, blocks, sr, channels)
         
-        # Update Project Service
-        # We need to refresh the stems list in ProjectService
-        current_meta = self.project_service.get_project_metadata(project_id)
-        if current_meta:
-             stems = current_meta.get('stems', [])
-             if new_stem_name not in stems:
-                 stems.append(new_stem_name)
-                 stems.sort()
-                 # Re-register to update in-memory cache
-                 self.project_service.register_project(
-                     project_id, 
-                     directory, 
-                     current_meta.get('original'), 
-                     current_meta.get('date'), 
-                     stems
-                 )
+        # The project's index entry picks up the new stem
+        self.stems_written(project_id, [new_stem_name])
 
         return new_stem_name
@@ -0,0 +1,206 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import soundfile as sf
+
+from AudioProject import CACHE_FOLDER
+from utils.audio_blocks import file_blocks, resampled_blocks, stack_blocks
+from utils.audio_stream import ffmpeg_stream
+from utils.state import write_json
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Sub-folder of a project's CACHE_FOLDER holding the bundles and their channel maps
+BUNDLES_FOLDER = "bundles"
+MAX_BUNDLES_PER_PROJECT = 4
+OPUS_KBPS_PER_CHANNEL = 48
+
+# Bundle format -> (file extension, mimetype, maximum channel count or None)
+BUNDLE_FORMATS = {
+    "flac": ("flac", "audio/flac", 8),
+    "opus": ("opus", "audio/ogg", 255),
+    "wav": ("wav", "audio/wav", None),
+}
+# Without a requested format: lossless while FLAC holds the channels, Opus beyond
+DEFAULT_BUNDLE_FORMAT = "flac"
+WIDE_BUNDLE_FORMAT = "opus"
+
+
+def bundle_sample_rate(sample_rates: Sequence[int]) -> int:
+    """The rate a bundle is written at: the one most stems have (the highest on a tie)."""
+    return max(set(sample_rates), key=lambda rate: (sample_rates.count(rate), rate))
+
+
+class BundleService:
+    """
+    Packs several stems into one interleaved multichannel file.
+
+    The editor then fetches and decodes a single file, and its stems are
+    sample-aligned by construction. Bundles are built on first request and
+    kept in the project's hidden cache folder, next to a JSON channel map.
+    They are named after the versions of the stems they contain, so a
+    rewritten stem leads to a new bundle instead of a stale one; only the
+    most recent bundles of a project are kept.
+    """
+
+    def __init__(self, file_service):
+        """
+        Args:
+            file_service: FileService resolving stem paths and versions
+        """
+        self.file_service = file_service
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+
+    def _folder(self, project_id: str) -> Optional[str]:
+        project_path = self.file_service.project_service.get_project_path(project_id)
+        return os.path.join(project_path, CACHE_FOLDER, BUNDLES_FOLDER) if project_path else None
+
+    def get_bundle_path(self, project_id: str, filename: str) -> Optional[str]:
+        """Returns the path of a built bundle file, if it exists."""
+        folder = self._folder(project_id)
+        if not folder or os.path.basename(filename) != filename or filename.endswith(".json"):
+            return None
+        path = os.path.join(folder, filename)
+        return path if os.path.isfile(path) else None
+
+    def get_bundle(self, project_id: str, stems: Sequence[str], fmt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the channel map of a bundle of `stems`, building the bundle if needed.
+
+        Args:
+            project_id: Project holding the stems
+            stems: Filenames of the stems, in channel order
+            fmt: Bundle format (flac, opus or wav); by default flac, or opus
+                when the stems have more channels than flac holds
+
+        Returns:
+            The channel map: `file` (bundle filename), `format`, `sample_rate`,
+            `frames`, `duration`, `channels` and per stem its `name`, `version`
+            and `channels` (indices into the bundle's channels)
+
+        Raises:
+            FileNotFoundError: If the project or a stem does not exist
+            ValueError: On an unsupported format or too many channels
+        """
+        if fmt is not None and fmt not in BUNDLE_FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}' (expected one of {', '.join(BUNDLE_FORMATS)})")
+        if not stems:
+            raise ValueError("No stems to bundle")
+        if len(set(stems)) != len(stems):
+            raise ValueError("Stems must not repeat")
+        folder = self._folder(project_id)
+        if not folder:
+            raise FileNotFoundError("Project not found")
+
+        paths = []
+        for name in stems:
+            path = self.file_service.get_file_path(project_id, name) if os.path.basename(name) == name else None
+            if not path:
+                raise FileNotFoundError(f"Stem not found: {name}")
+            paths.append(path)
+        versions = [self.file_service.get_file_version(p) for p in paths]
+        infos = [sf.info(p) for p in paths]  # Headers only
+        if fmt is None:
+            channels = sum(info.channels for info in infos)
+            fmt = DEFAULT_BUNDLE_FORMAT if channels <= BUNDLE_FORMATS[DEFAULT_BUNDLE_FORMAT][2] else WIDE_BUNDLE_FORMAT
+
+        extension = BUNDLE_FORMATS[fmt][0]
+        key = hashlib.sha256(json.dumps([fmt, list(zip(stems, versions))]).encode("utf-8")).hexdigest()[:32]
+        map_path = os.path.join(folder, f"{key}.json")
+
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                try:
+                    with open(map_path, "r", encoding="utf-8") as f:
+                        channel_map = json.load(f)
+                    os.utime(map_path)  # Marks the bundle recently used
+                    return channel_map
+                except (OSError, json.JSONDecodeError):
+                    pass
+                channel_map = self._build(folder, f"{key}.{extension}", fmt, stems, paths, versions, infos)
+                write_json(map_path, channel_map, indent=2)
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+        self._prune(folder)
+        return channel_map
+
+    def _build(self, folder: str, filename: str, fmt: str, stems: Sequence[str], paths: List[str], versions: List[str], infos: List[Any]) -> Dict[str, Any]:
+        """Writes the interleaved bundle and returns its channel map."""
+        # Stems at another rate (e.g. derived stems) are resampled while they are read
+        sr = bundle_sample_rate([info.samplerate for info in infos])
+        channels = sum(info.channels for info in infos)
+        max_channels = BUNDLE_FORMATS[fmt][2]
+        if max_channels is not None and channels > max_channels:
+            raise ValueError(f"{fmt} holds at most {max_channels} channels, these stems have {channels}")
+
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, filename)
+        sources = [
+            file_blocks(p) if info.samplerate == sr else resampled_blocks(p, sr, info.channels)
+            for p, info in zip(paths, infos)
+        ]
+        blocks = stack_blocks(sources, [info.channels for info in infos])
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".part")
+        os.close(fd)
+        try:
+            if fmt == "opus":
+                # Mapping family 255: independent channels, none treated as surround or LFE
+                options = [
+                    "-c:a", "libopus", "-mapping_family", "255",
+                    "-b:a", f"{OPUS_KBPS_PER_CHANNEL * channels}k", "-ar", "48000", "-f", "ogg"
+                ]
+                with open(temp_path, "wb") as f:
+                    for chunk in ffmpeg_stream(blocks, sr, channels, options):
+                        f.write(chunk)
+            else:
+                with sf.SoundFile(temp_path, "w", samplerate=sr, channels=channels, format=fmt.upper(), subtype="PCM_16") as f:
+                    for block in blocks:
+                        f.write(block)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        duration = max(info.frames / info.samplerate for info in infos)
+        output_rate = 48000 if fmt == "opus" else sr  # Opus is always encoded at 48 kHz
+        channel_map = {
+            "file": filename,
+            "format": fmt,
+            "sample_rate": output_rate,
+            "frames": int(round(duration * output_rate)),
+            "duration": duration,
+            "channels": channels,
+            "stems": [],
+        }
+        first = 0
+        for name, version, info in zip(stems, versions, infos):
+            channel_map["stems"].append({"name": name, "version": version, "channels": list(range(first, first + info.channels))})
+            first += info.channels
+        logger.info(f"Built {channels}-channel {fmt} bundle of {len(stems)} stems: {filename}")
+        return channel_map
+
+    def _prune(self, folder: str) -> None:
+        """Deletes all but the most recently used bundles of a project."""
+        maps = sorted(
+            (os.path.getmtime(os.path.join(folder, name)), name)
+            for name in os.listdir(folder) if name.endswith(".json")
+        )
+        for _, name in maps[:-MAX_BUNDLES_PER_PROJECT]:
+            key = os.path.splitext(name)[0]
+            for other in os.listdir(folder):
+                if os.path.splitext(other)[0] == key:
+                    try:
+                        os.remove(os.path.join(folder, other))
+                    except OSError:
+                        pass
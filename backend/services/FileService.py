@@ -1,13 +1,23 @@
 import os
-import zipfile
 import shutil
-from typing import List, Optional
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from AudioProject import CACHE_FOLDER, PREVIEW_FOLDER, PEAKS_FOLDER
+from utils.chunking import PARTIAL_SUFFIX
+from utils.peaks import PEAKS_EXTENSION, build_peaks, peaks_current
+from utils.zip_stream import ArchiveCache, zip_stream
+
+logger = logging.getLogger(__name__)
+
+ZIP_CACHE_FOLDER = "zip-cache"
 
 class FileService:
-    def __init__(self, project_service, upload_folder: str):
+    def __init__(self, project_service, upload_folder: str, zip_cache_bytes: int = 0):
         self.project_service = project_service
         self.upload_folder = upload_folder
         os.makedirs(self.upload_folder, exist_ok=True)
+        self.zip_cache = ArchiveCache(os.path.join(self.upload_folder, ZIP_CACHE_FOLDER), zip_cache_bytes)
 
     def get_file_path(self, project_id: str, filename: str) -> Optional[str]:
         project_path = self.project_service.get_project_path(project_id)
@@ -19,28 +29,109 @@ class FileService:
             return file_path
         return None
 
-    def create_zip(self, project_id: str, selected_tracks: List[str] = None) -> str:
+    @staticmethod
+    def get_file_version(path: str) -> str:
         """
-        Creates a zip file for the project. If selected_tracks is provided, only zips those.
-        Returns the path to the zip file.
+        Returns a strong validator of a file's content, used as its ETag.
+
+        Stems are only ever replaced whole (written aside and moved into place),
+        so size, mtime and inode change whenever the content does. Partial stems
+        of a chunked separation grow in place, which changes size and mtime.
+        """
+        stat = os.stat(path)
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}-{stat.st_ino:x}"
+
+    def get_file_versions(self, project_id: str, filenames: List[str]) -> Dict[str, str]:
+        """Returns the version (see get_file_version) of each existing file of a project."""
+        versions = {}
+        for filename in filenames:
+            path = self.get_file_path(project_id, filename)
+            if path:
+                versions[filename] = self.get_file_version(path)
+        return versions
+
+    def get_preview_path(self, project_id: str, filename: str) -> Optional[str]:
+        """Returns the path of a file of the project's excerpt preview, if it exists."""
+        project_path = self.project_service.get_project_path(project_id)
+        if not project_path or os.path.basename(filename) != filename:
+            return None
+        
+        file_path = os.path.join(project_path, CACHE_FOLDER, PREVIEW_FOLDER, filename)
+        if os.path.exists(file_path):
+            return file_path
+        return None
+
+    def get_peaks_path(self, project_id: str, filename: str) -> Optional[str]:
+        """
+        Returns the waveform peak pyramid of a project file, (re)building it if
+        it is missing or older than the file.
+
+        Returns:
+            Path of the pyramid, or None if the file does not exist
+        """
+        path = self.get_file_path(project_id, filename) if os.path.basename(filename) == filename else None
+        if not path:
+            return None
+        peaks_path = os.path.join(os.path.dirname(path), CACHE_FOLDER, PEAKS_FOLDER, f"{filename}{PEAKS_EXTENSION}")
+        if not peaks_current(path, peaks_path):
+            build_peaks(path, peaks_path)
+        return peaks_path
+
+    def update_peaks(self, project_id: str, filenames: List[str]) -> None:
+        """Builds the peak pyramids of freshly written files that do not have a current one."""
+        for filename in filenames:
+            try:
+                self.get_peaks_path(project_id, filename)
+            except Exception as e:
+                logger.warning(f"Could not compute peaks of {filename}: {e}")
+
+    def get_zip_entries(self, project_id: str, selected_tracks: List[str] = None) -> List[Tuple[str, str]]:
+        """
+        Lists the files of a project archive. If selected_tracks is provided, only those.
+
+        Returns:
+            (path, name in the archive) pairs
+
+        Raises:
+            FileNotFoundError: If the project does not exist
         """
         project_path = self.project_service.get_project_path(project_id)
         if not project_path:
             raise FileNotFoundError("Project not found")
-        
-        suffix = "_selected" if selected_tracks else ""
-        zip_filename = f"{project_id}{suffix}.zip"
-        zip_path = os.path.join(self.upload_folder, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            if selected_tracks:
-                 for name in selected_tracks:
-                    p = os.path.join(project_path, name)
-                    if os.path.exists(p):
-                        zipf.write(p, name)
-            else:
-                for root, dirs, files in os.walk(project_path):
-                    for file in files:
-                        zipf.write(os.path.join(root, file), file)
-        
-        return zip_path
+
+        entries = []
+        if selected_tracks:
+            for name in selected_tracks:
+                p = os.path.join(project_path, name)
+                if os.path.basename(name) == name and os.path.isfile(p):
+                    entries.append((p, name))
+        else:
+            for root, dirs, files in os.walk(project_path):
+                # Skip hidden working folders (decoded PCM, caches)
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for file in sorted(files):
+                    # Partial stems of a chunked run are superseded by the stem once it finishes
+                    if not file.endswith(PARTIAL_SUFFIX):
+                        entries.append((os.path.join(root, file), file))
+        return entries
+
+    def stream_zip(self, project_id: str, selected_tracks: List[str] = None) -> Tuple[Optional[str], Optional[Iterator[bytes]]]:
+        """
+        Zips the project (or only selected_tracks) as the archive is sent.
+
+        Nothing is written to the upload folder; with the zip cache enabled the
+        finished archive is kept and later requests for the same files (same
+        names, sizes and mtimes) are served from it.
+
+        Returns:
+            (path of a cached archive, None) on a cache hit, else (None, archive chunks)
+
+        Raises:
+            FileNotFoundError: If the project does not exist
+        """
+        entries = self.get_zip_entries(project_id, selected_tracks)
+        key = self.zip_cache.key(entries)
+        cached = self.zip_cache.get(key)
+        if cached:
+            return cached, None
+        return None, self.zip_cache.tee(key, zip_stream(entries))
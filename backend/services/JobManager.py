@@ -0,0 +1,233 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set
+
+from .SSEMessageHandler import SSEMessageHandler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """A unit of background work and its observable state."""
+
+    def __init__(self, kind: str, func: Callable[["Job"], Any], project_id: Optional[str] = None, sse_message_handler: Optional[SSEMessageHandler] = None, covers: Optional[Iterable[str]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.project_id = project_id
+        self.sse_message_handler = sse_message_handler
+        self.covers: FrozenSet[str] = frozenset(covers or ())  # Units of work (module@preset) done for the project
+        self.status = JOB_QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'project_id': self.project_id,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == JOB_COMPLETED:
+            data['result'] = self.result
+        if self.status == JOB_FAILED:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Bounded worker pool draining a FIFO job queue.
+
+    Jobs that carry an SSEMessageHandler get their status pushed over SSE and
+    their channel closed once they finish, so the request thread can return
+    as soon as the job is queued.
+
+    Jobs on the same project never run at the same time: a job whose project is
+    busy is held back and requeued when the running one finishes, so it sees
+    that job's results. A submission whose work is already covered by an
+    unfinished job of the same project attaches to that job instead.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 16, max_finished: int = 256):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(1, max_queue)
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: List[str] = []
+        self._workers: List[threading.Thread] = []
+        self._busy_projects: Set[str] = set()
+        self._deferred: Dict[str, List[Job]] = {}
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def has_capacity(self, project_id: Optional[str] = None, covers: Optional[Iterable[str]] = None) -> bool:
+        """
+        Returns True if a job submitted with these arguments would be accepted:
+        the queue has room, or an unfinished job of the project covers the same work.
+        """
+        with self._lock:
+            if self._find_covering(project_id, frozenset(covers or ())) is not None:
+                return True
+            return len(self._pending) < self.max_queue
+
+    def submit(self, kind: str, func: Callable[[Job], Any], project_id: Optional[str] = None, sse_message_handler: Optional[SSEMessageHandler] = None, covers: Optional[Iterable[str]] = None) -> Job:
+        """
+        Enqueues a job, or returns the unfinished job of the same project that
+        already covers the same work.
+
+        Args:
+            kind: Short job type label (e.g. 'process', 'process_url')
+            func: Callable receiving the Job; its return value becomes the job result
+            project_id: Project the job works on, if known
+            sse_message_handler: Handler used to report status and close the SSE channel
+            covers: Units of work the job performs for the project (see
+                routes.jobs_routes.modules_covered: module names with the preset);
+                jobs without it are never attached to
+
+        Returns:
+            The queued Job, or the in-flight Job it was attached to
+
+        Raises:
+            JobQueueFullError: If the queue is at capacity
+        """
+        job = Job(kind, func, project_id=project_id, sse_message_handler=sse_message_handler, covers=covers)
+        with self._lock:
+            in_flight = self._find_covering(project_id, job.covers)
+            if in_flight is not None:
+                logger.info(f"Attached {kind} request for project {project_id} to in-flight job {in_flight.id}")
+                return in_flight
+            if len(self._pending) >= self.max_queue:
+                raise JobQueueFullError(f"Job queue is full ({self.max_queue} pending jobs)")
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+            self._prune()
+        self._queue.put(job)
+        self._notify(job)
+        logger.info(f"Queued job {job.id} ({kind}) for project {project_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_position(self, job_id: str) -> Optional[int]:
+        """Returns the 0-based queue position of a pending job, or None if not queued."""
+        with self._lock:
+            try:
+                return self._pending.index(job_id)
+            except ValueError:
+                return None
+
+    def describe(self, job: Job) -> Dict[str, Any]:
+        data = job.to_dict()
+        if job.status == JOB_QUEUED:
+            data['position'] = self.get_position(job.id)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.status == JOB_RUNNING)
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': len(self._pending),
+                'running': running,
+            }
+
+    def _find_covering(self, project_id: Optional[str], covers: FrozenSet[str]) -> Optional[Job]:
+        """Returns an unfinished job of the project covering all of `covers`. Caller holds the lock."""
+        if not project_id or not covers:
+            return None
+        for job in self._jobs.values():
+            if job.project_id == project_id and job.status in (JOB_QUEUED, JOB_RUNNING) and covers <= job.covers:
+                return job
+        return None
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            project_id = job.project_id  # A job may learn its project id while running
+            with self._lock:
+                if project_id and project_id in self._busy_projects:
+                    # Held back until the job working on this project finishes
+                    self._deferred.setdefault(project_id, []).append(job)
+                    self._queue.task_done()
+                    continue
+                if project_id:
+                    self._busy_projects.add(project_id)
+                if job.id in self._pending:
+                    self._pending.remove(job.id)
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+            if job.sse_message_handler:
+                job.sse_message_handler.open()
+            self._notify(job)
+
+            try:
+                job.result = job.func(job)
+                job.status = JOB_COMPLETED
+            except Exception as e:
+                logger.exception(f"Job {job.id} ({job.kind}) failed: {e}")
+                job.error = str(e)
+                job.status = JOB_FAILED
+                if job.sse_message_handler:
+                    job.sse_message_handler.send_error(str(e))
+            finally:
+                job.finished_at = time.time()
+                self._notify(job)
+                if job.sse_message_handler:
+                    job.sse_message_handler.close()
+                job.done.set()
+                if project_id:
+                    self._release_project(project_id)
+                self._queue.task_done()
+
+    def _release_project(self, project_id: str) -> None:
+        """Marks a project idle and requeues the next job held back for it."""
+        with self._lock:
+            self._busy_projects.discard(project_id)
+            deferred = self._deferred.get(project_id)
+            if not deferred:
+                return
+            next_job = deferred.pop(0)
+            if not deferred:
+                del self._deferred[project_id]
+        self._queue.put(next_job)
+
+    def _notify(self, job: Job) -> None:
+        if job.sse_message_handler:
+            job.sse_message_handler.send_job_status(self.describe(job))
+
+    def _prune(self) -> None:
+        """Drops the oldest finished jobs beyond max_finished. Caller holds the lock."""
+        finished = [j.id for j in self._jobs.values() if j.status in (JOB_COMPLETED, JOB_FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,157 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import soundfile as sf
+
+from utils.audio_blocks import file_blocks, mix_blocks
+from utils.audio_stream import STREAM_FORMATS, WAV_HEADER_BYTES, encode_stream
+
+
+class Mixdown:
+    """A rendered (or rendering) mix: its byte stream and response details."""
+
+    def __init__(self, chunks: Iterator[bytes], mimetype: str, filename: str, length: Optional[int] = None, cached: bool = False):
+        self.chunks = chunks
+        self.mimetype = mimetype
+        self.filename = filename
+        self.length = length  # Known up front for WAV and cached mixes
+        self.cached = cached
+
+
+class MixdownService:
+    """
+    Mixes stems on the fly and streams the encoded result.
+
+    Nothing is written to disk: the stems are read block by block and encoded
+    as the response goes out. Fully streamed mixes are kept in a small LRU
+    cache (bounded by total size) so replaying or re-downloading the same mix
+    does not render it again. Cache keys include each stem's size and mtime, so
+    a rewritten stem never serves a stale mix.
+    """
+
+    def __init__(self, file_service, cache_bytes: int = 0):
+        """
+        Args:
+            file_service: FileService resolving stem paths
+            cache_bytes: Total size of cached mixes (0 disables the cache)
+        """
+        self.file_service = file_service
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._cached_size = 0
+
+    def render(
+        self,
+        project_id: str,
+        stems: Sequence[str],
+        gains: Optional[Sequence[float]] = None,
+        fmt: str = "wav",
+        start_seconds: float = 0.0
+    ) -> Mixdown:
+        """
+        Prepares the mix of `stems`, starting `start_seconds` into it.
+
+        Inputs are validated here, before any byte is sent; rendering happens
+        while the returned chunks are consumed.
+
+        Args:
+            project_id: Project holding the stems
+            stems: Filenames of the stems to mix
+            gains: Linear gain per stem, in the same order (default 1.0 each)
+            fmt: Output format (wav, flac or opus)
+            start_seconds: Seek offset into the mix
+
+        Raises:
+            FileNotFoundError: If the project or a stem does not exist
+            ValueError: On invalid arguments, mismatched sample rates or incompatible channel counts
+        """
+        if not stems:
+            raise ValueError("No stems to mix")
+        gains = list(gains) if gains else [1.0] * len(stems)
+        if len(gains) != len(stems):
+            raise ValueError("Expected one gain per stem")
+        if not all(math.isfinite(g) for g in gains):
+            raise ValueError("Gains must be finite numbers")
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}' (expected one of {', '.join(STREAM_FORMATS)})")
+        if not math.isfinite(start_seconds) or start_seconds < 0:
+            raise ValueError("start must be a finite, non-negative number")
+
+        paths = []
+        for name in stems:
+            path = self.file_service.get_file_path(project_id, name) if os.path.basename(name) == name else None
+            if not path:
+                raise FileNotFoundError(f"Stem not found: {name}")
+            paths.append(path)
+
+        # Check formats up front (headers only)
+        infos = [sf.info(p) for p in paths]
+        sr = infos[0].samplerate
+        for name, info in zip(stems, infos):
+            if info.samplerate != sr:
+                raise ValueError(f"Sample rate mismatch: {name} is {info.samplerate}, expected {sr}")
+        channels = max(info.channels for info in infos)
+        if any(info.channels not in (1, channels) for info in infos):
+            raise ValueError("Channel mismatch (non-mono)")
+
+        start = int(round(start_seconds * sr))
+        total_frames = max(info.frames for info in infos)
+        if start >= total_frames:
+            raise ValueError("start is past the end of the mix")
+
+        mimetype, extension, _ = STREAM_FORMATS[fmt]
+        filename = f"{'+'.join(os.path.splitext(name)[0] for name in stems)}.mix.{extension}"
+        key = (
+            project_id, fmt, start, tuple(float(g) for g in gains),
+            tuple((name, os.path.getsize(p), os.path.getmtime(p)) for name, p in zip(stems, paths))
+        )
+        data = self._get(key)
+        if data is not None:
+            return Mixdown(iter([data]), mimetype, filename, length=len(data), cached=True)
+
+        frames = total_frames - start
+        blocks = mix_blocks([file_blocks(p, start=start) for p in paths], gains, channels)
+        chunks = encode_stream(blocks, fmt, frames, sr, channels)
+        length = WAV_HEADER_BYTES + frames * channels * 2 if fmt == "wav" else None
+        return Mixdown(self._tee(key, chunks), mimetype, filename, length=length)
+
+    def _tee(self, key: Tuple, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Passes chunks through and caches the whole mix once it has been streamed completely."""
+        if self.cache_bytes <= 0:
+            yield from chunks
+            return
+        # A single mix may take up to a quarter of the cache; larger ones stream without being kept
+        limit = self.cache_bytes // 4
+        parts: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= limit:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            self._put(key, b"".join(parts))
+
+    def _get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+            return data
+
+    def _put(self, key: Tuple, data: bytes) -> None:
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = data
+            self._cached_size += len(data)
+            while self._cached_size > self.cache_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_size -= len(evicted)
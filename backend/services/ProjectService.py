@@ -1,109 +1,164 @@
 import os
 import json
+import base64
 import shutil
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import threading
+from typing import Dict, Optional, Any, Sequence
+
+from modules import get_stem_outputs
 
 # Assuming these are in the python path (backend root)
 try:
     from AudioProject import AudioProject
+    from LibraryIndex import LibraryIndex, SORT_COLUMNS
 except ImportError:
     # If running from inside services/ for testing
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from AudioProject import AudioProject
+    from LibraryIndex import LibraryIndex, SORT_COLUMNS
+
+# Largest page of /api/history
+MAX_HISTORY_PAGE = 500
+
+
+def _normalize_date(value: Optional[str]) -> Optional[str]:
+    """Turns 2024-01-31 or 2024-01-31T12:00 into the digits-only form of project dates (20240131, 202401311200)."""
+    if not value:
+        return None
+    digits = ''.join(c for c in value if c not in '-: T')
+    if not digits.isdigit():
+        raise ValueError(f"Invalid date '{value}' (expected e.g. 2024-01-31 or 20240131)")
+    return digits
+
 
 class ProjectService:
-    def __init__(self, library_folder: str):
+    def __init__(self, library_folder: str, lazy_stems: bool = False, index_path: Optional[str] = None, output_format: str = "flac"):
+        """
+        Args:
+            library_folder: Folder holding one sub-folder per project
+            lazy_stems: Advertise every stem the registered modules can produce
+                (`available_stems`); missing ones are computed when first downloaded
+            output_format: Extension of the stems the modules write (as AudioProcessor.output_format)
+            index_path: SQLite file of the library index (default: a hidden file in the library folder)
+        """
         self.library_folder = library_folder
-        self.track_sessions: Dict[str, Dict[str, Any]] = {}
-        self.session_history: List[Dict[str, Any]] = []
+        self.lazy_stems = lazy_stems
+        self.output_format = output_format
         
         # Ensure library exists
         os.makedirs(self.library_folder, exist_ok=True)
-        # Initial scan
-        self.refresh_history()
+        self.index = LibraryIndex(self.library_folder, index_path)
+        # History is served from the persisted index right away; changes made
+        # while the server was down are picked up in the background
+        threading.Thread(target=self.refresh_history, name="library-reconcile", daemon=True).start()
 
     def refresh_history(self):
-        """Scans LIBRARY_FOLDER and populates session history."""
-        print(f"Scanning for existing history in {self.library_folder}...")
-        self.session_history = []
-        self.track_sessions = {}
-        
-        if not os.path.exists(self.library_folder):
-            return
-
-        found_folders = []
-        for folder_name in os.listdir(self.library_folder):
-            folder_path = os.path.join(self.library_folder, folder_name)
-            if os.path.isdir(folder_path):
-                try:
-                    metadata_path = os.path.join(folder_path, 'metadata.json')
-                    
-                    track_id = folder_name
-                    track_name = folder_name
-                    original_file = None
-                    track_date = folder_name
-                    
-                    thumbnail = None  # Initialize before metadata loading
-                    if os.path.exists(metadata_path):
-                        try:
-                            with open(metadata_path, 'r') as f:
-                                meta = json.load(f)
-                                track_id = meta.get('id', folder_name)
-                                track_name = meta.get('name', folder_name)
-                                original_file = meta.get('original_file')
-                                thumbnail = meta.get('thumbnail')  # Extract thumbnail here
-                                if 'date' in meta:
-                                    track_date = meta['date']
-                        except (json.JSONDecodeError, IOError) as e:
-                            print(f"Error reading metadata for {folder_name}: {e}")
-                    
-                    stems_list = []
-                    all_audio = []
-                    for f in os.listdir(folder_path):
-                        if f.endswith('.wav') or f.endswith('.mp3') or f.endswith('.flac'):
-                            all_audio.append(f)
-                    
-                    for f in all_audio:
-                        if original_file and f == original_file: continue
-                        stems_list.append(f)
-                    
-                    stems_list = sorted(stems_list)
-                    
-                    track_data = {
-                        'id': track_id,
-                        'name': track_name,
-                        'date': track_date,
-                        'stems': stems_list,
-                    }
-                    if original_file:
-                        track_data['original'] = original_file
-                    
-                    if thumbnail:
-                        track_data['thumbnail'] = thumbnail
-
-                    found_folders.append(track_data)
-                    
-                    self.track_sessions[track_id] = {
-                        'path': folder_path,
-                        'original': original_file
-                    }
-                    
-                except Exception as e:
-                    print(f"Error loading {folder_name}: {e}")
-                    continue
-
-        found_folders.sort(key=lambda x: x['id'], reverse=True)
-        self.session_history.extend(found_folders)
-        print(f"Loaded {len(found_folders)} tracks from disk.")
-
-    def get_history(self) -> List[Dict[str, Any]]:
-        return self.session_history
+        """Reconciles the library index with LIBRARY_FOLDER (only changed project folders are read)."""
+        print(f"Reconciling history with {self.library_folder}...")
+        counts = self.index.reconcile()
+        print(f"Library has {counts['projects']} tracks ({counts['updated']} re-indexed, {counts['removed']} removed).")
+
+    def _track(self, project: Dict[str, Any]) -> Dict[str, Any]:
+        """Shapes an indexed project as a history entry."""
+        track_data = {
+            'id': project['id'],
+            'name': project['name'],
+            'date': project['date'],
+            'stems': project['stems'],
+        }
+        if project['original']:
+            track_data['original'] = project['original']
+        if project['thumbnail']:
+            track_data['thumbnail'] = project['thumbnail']
+        self._advertise_stems(track_data)
+        return track_data
+
+    def _advertise_stems(self, track_data: Dict[str, Any]) -> None:
+        """In lazy mode, lists every stem a module could produce next to the computed ones."""
+        if self.lazy_stems:
+            track_data['available_stems'] = sorted(set(track_data['stems']) | set(get_stem_outputs(self.output_format)))
+
+    def get_history(
+        self,
+        sort: str = 'id',
+        order: str = 'desc',
+        name: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        modules: Sequence[str] = (),
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Returns one page of the history, filtered and sorted by the library index.
+
+        Args:
+            sort: `id` (default), `date` or `name`
+            order: `desc` (default) or `asc`
+            name: Only projects whose name starts with this (case-insensitive)
+            date_from: Only projects dated on or after this (e.g. 2024-01-01)
+            date_to: Only projects dated on or before this (inclusive, e.g. 2024-01-31)
+            modules: Only projects where all these modules were executed
+            cursor: `next_cursor` of the previous page (same sort and order)
+            limit: Page size, at most MAX_HISTORY_PAGE (None: all)
+
+        Returns:
+            Dict with `items` (history entries), `total` (projects matching the
+            filters) and `next_cursor` (None on the last page)
+
+        Raises:
+            ValueError: On an invalid sort, order, date, limit or cursor
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort '{sort}' (expected one of {', '.join(SORT_COLUMNS)})")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Invalid order '{order}' (expected asc or desc)")
+        if limit is not None and not 1 <= limit <= MAX_HISTORY_PAGE:
+            raise ValueError(f"limit must be between 1 and {MAX_HISTORY_PAGE}")
+
+        after = None
+        if cursor:
+            try:
+                cursor_sort, cursor_order, key, folder = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            except (ValueError, TypeError):
+                raise ValueError("Invalid cursor")
+            if not isinstance(key, str) or not isinstance(folder, str):
+                raise ValueError("Invalid cursor")
+            if (cursor_sort, cursor_order) != (sort, order):
+                raise ValueError("The cursor belongs to another sort order")
+            after = (key, folder)
+
+        # One extra row tells whether there is a next page
+        projects, total = self.index.query_projects(
+            sort=sort,
+            descending=order == 'desc',
+            name_prefix=name,
+            date_from=_normalize_date(date_from),
+            date_to=_normalize_date(date_to),
+            modules=modules,
+            after=after,
+            limit=limit + 1 if limit is not None else None
+        )
+        next_cursor = None
+        if limit is not None and len(projects) > limit:
+            projects = projects[:limit]
+            key, folder = projects[-1]['sort_key']
+            next_cursor = base64.urlsafe_b64encode(json.dumps([sort, order, key, folder]).encode('utf-8')).decode('ascii').rstrip('=')
+        return {
+            'items': [self._track(project) for project in projects],
+            'total': total,
+            'next_cursor': next_cursor,
+        }
+
+    def get_history_revision(self) -> str:
+        """Changes whenever the history does (see LibraryIndex.get_revision)."""
+        return self.index.get_revision()
 
     def get_project_path(self, project_id: str) -> Optional[str]:
-        if project_id in self.track_sessions:
-            return self.track_sessions[project_id]['path']
+        project = self.index.get_project(project_id)
+        if project:
+            return os.path.join(self.library_folder, project['folder'])
         
         # Fallback: check disk directly
         path = os.path.join(self.library_folder, project_id)
@@ -112,75 +167,38 @@ class ProjectService:
         return None
 
     def get_project_metadata(self, project_id: str) -> Optional[Dict[str, Any]]:
-        # Check in memory history first
-        for track in self.session_history:
-            if track['id'] == project_id:
-                return track
-        return None
+        project = self.index.get_project(project_id)
+        return self._track(project) if project else None
 
     def create_project_folder(self, folder_name: str) -> str:
         path = os.path.join(self.library_folder, folder_name)
         os.makedirs(path, exist_ok=True)
         return path
 
-    def register_project(self, project_id: str, folder_path: str, filename: str, timestamp: str, new_stems: List[str] = None):
-        """Updates in-memory state after a new project creation or update."""
-        filename_no_ext = os.path.splitext(filename)[0]
-        
-        # Update Session Map
-        self.track_sessions[project_id] = {
-            'path': folder_path,
-            'original': filename
-        }
-
-        # Update History List
-        # Check if already exists (update)
-        existing = next((item for item in self.session_history if item["id"] == project_id), None)
-        
-        # Read metadata for thumbnail and display name - easier than passing it down if we want full consistency
-        thumbnail = None
-        display_name = filename_no_ext  # Fallback to filename without extension
-        metadata_path = os.path.join(folder_path, 'metadata.json')
-        if os.path.exists(metadata_path):
-             try:
-                 with open(metadata_path, 'r') as f:
-                     meta = json.load(f)
-                     thumbnail = meta.get('thumbnail')
-                     display_name = meta.get('name', filename_no_ext)  # Use saved display name if available
-             except (json.JSONDecodeError, IOError):
-                 pass  # Metadata read failed, use defaults
-
-        stems = new_stems if new_stems is not None else []
-        if not stems and os.path.exists(folder_path):
-             for f in os.listdir(folder_path):
-                if f == filename: continue
-                if f == 'metadata.json': continue
-                if f.endswith(('.wav', '.mp3', '.flac')):
-                    stems.append(f)
-             stems = sorted(stems)
-
-        track_data = {
+    def register_project(self, project_id: str, folder_path: str, filename: str, timestamp: str):
+        """
+        Indexes a project after its creation or an update. Its display name,
+        thumbnail and stems (with sizes and mtimes) are read from the folder.
+        """
+        self.index.index_project(folder_path, defaults={
             'id': project_id,
-            'name': display_name,
+            'name': os.path.splitext(filename)[0],
             'date': timestamp,
-            'stems': stems,
             'original': filename,
-        }
-        if thumbnail:
-            track_data['thumbnail'] = thumbnail
+        })
 
-        if existing:
-            # Update existing
-            existing.update(track_data)
-        else:
-            # Insert new
-            self.session_history.insert(0, track_data)
+    def refresh_project(self, project_id: str) -> None:
+        """Re-indexes a registered project whose stems were rewritten in place."""
+        project = self.index.get_project(project_id)
+        if project:
+            self.index.index_project(os.path.join(self.library_folder, project['folder']))
 
     def delete_project(self, project_id: str) -> bool:
-        if project_id not in self.track_sessions:
+        project = self.index.get_project(project_id)
+        if not project:
             return False
         
-        directory = self.track_sessions[project_id]['path']
+        directory = os.path.join(self.library_folder, project['folder'])
         
         # Security check
         try:
@@ -193,8 +211,7 @@ class ProjectService:
 
         try:
             shutil.rmtree(directory)
-            del self.track_sessions[project_id]
-            self.session_history[:] = [t for t in self.session_history if t['id'] != project_id]
+            self.index.remove_project(project['folder'])
             return True
         except Exception as e:
             print(f"Error deleting project {project_id}: {e}")
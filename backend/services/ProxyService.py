@@ -0,0 +1,135 @@
+import os
+import glob
+import logging
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from AudioProject import CACHE_FOLDER
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Sub-folder of a project's CACHE_FOLDER holding the playback proxies
+PROXIES_FOLDER = "proxies"
+
+# Proxy format -> (file extension, mimetype, ffmpeg output options)
+PROXY_FORMATS = {
+    "opus": ("opus", "audio/ogg", ["-c:a", "libopus", "-vbr", "on", "-ar", "48000", "-f", "ogg"]),
+    "aac": ("m4a", "audio/mp4", ["-c:a", "aac", "-movflags", "+faststart", "-f", "mp4"]),
+}
+
+
+class ProxyService:
+    """
+    Low-bitrate playback copies of stems for the editor.
+
+    Proxies are encoded with ffmpeg on a small thread pool, in the background,
+    after stems are written. A proxy's filename carries the version of the
+    stem it was encoded from (see FileService.get_file_version), so a rewritten
+    stem simply has no proxy until a new one is built; proxies of older
+    versions are deleted when it is. Downloads and exports always use the
+    lossless stems.
+    """
+
+    def __init__(self, file_service, fmt: str = "opus", bitrate_kbps: int = 96, max_workers: int = 1):
+        """
+        Args:
+            file_service: FileService resolving stem paths and versions
+            fmt: Proxy format (opus or aac)
+            bitrate_kbps: Target bitrate of the proxies
+            max_workers: Number of concurrent encodes (0 disables proxies)
+
+        Raises:
+            ValueError: If the format is not supported
+        """
+        if fmt not in PROXY_FORMATS:
+            raise ValueError(f"Unsupported proxy format '{fmt}' (expected one of {', '.join(PROXY_FORMATS)})")
+        self.file_service = file_service
+        self.format = fmt
+        self.bitrate_kbps = bitrate_kbps
+        self.enabled = max_workers > 0
+        self.extension, self.mimetype, self._output_options = PROXY_FORMATS[fmt]
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="proxy-encoder")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def _locate(self, project_id: str, filename: str) -> Optional[Tuple[str, str]]:
+        """Returns (stem path, proxy path for the stem's current version), or None if the stem does not exist."""
+        path = self.file_service.get_file_path(project_id, filename) if os.path.basename(filename) == filename else None
+        if not path:
+            return None
+        version = self.file_service.get_file_version(path)
+        folder = os.path.join(os.path.dirname(path), CACHE_FOLDER, PROXIES_FOLDER)
+        return path, os.path.join(folder, f"{filename}.{version}.{self.extension}")
+
+    def get_proxy_path(self, project_id: str, filename: str) -> Optional[str]:
+        """
+        Returns the proxy of the stem's current content, scheduling it if it
+        has not been built yet.
+
+        Returns:
+            Path of the proxy, or None if it is not ready (or the stem does not exist)
+        """
+        if not self.enabled:
+            return None
+        located = self._locate(project_id, filename)
+        if not located:
+            return None
+        if os.path.exists(located[1]):
+            return located[1]
+        self._schedule(*located)
+        return None
+
+    def schedule(self, project_id: str, filenames: List[str]) -> None:
+        """Queues proxies for stems that were just written (up-to-date ones are skipped)."""
+        if not self.enabled:
+            return
+        for filename in filenames:
+            located = self._locate(project_id, filename)
+            if located and not os.path.exists(located[1]):
+                self._schedule(*located)
+
+    def _schedule(self, source_path: str, proxy_path: str) -> None:
+        with self._lock:
+            if proxy_path in self._pending:
+                return
+            future = self.executor.submit(self._encode, source_path, proxy_path)
+            self._pending[proxy_path] = future
+        future.add_done_callback(lambda _: self._done(proxy_path))
+
+    def _done(self, proxy_path: str) -> None:
+        with self._lock:
+            self._pending.pop(proxy_path, None)
+
+    def _encode(self, source_path: str, proxy_path: str) -> None:
+        os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+        temp_path = f"{proxy_path}.part"
+        command = [
+            "ffmpeg", "-v", "error", "-nostdin", "-y", "-i", source_path,
+            "-vn", *self._output_options, "-b:a", f"{self.bitrate_kbps}k", temp_path
+        ]
+        try:
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                logger.error(f"Could not encode playback proxy of {os.path.basename(source_path)}: {result.stderr.decode(errors='replace').strip()}")
+                return
+            os.replace(temp_path, proxy_path)
+        except OSError as e:
+            logger.error(f"Could not encode playback proxy of {os.path.basename(source_path)}: {e}")
+            return
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        # Proxies of earlier versions of the stem are no longer served
+        prefix = os.path.basename(source_path)
+        for old in glob.glob(os.path.join(glob.escape(os.path.dirname(proxy_path)), f"{glob.escape(prefix)}.*.{self.extension}")):
+            if old != proxy_path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        logger.info(f"Playback proxy ready: {os.path.basename(proxy_path)}")
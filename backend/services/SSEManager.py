@@ -4,18 +4,33 @@ import json
 import queue
 import threading
 import time
-from typing import Dict, Generator, Optional
+from typing import Dict, Generator, Optional, Set
 from contextlib import contextmanager
 
 class SSEManager:
     def __init__(self) -> None:
         self._lock = threading.Lock()
         self._channels: Dict[str, "queue.Queue[Optional[dict]]"] = {}
+        self._closed: Set[str] = set()  # Channels whose queue already holds the end sentinel
 
-    def create(self, job_id: str) -> None:
+    def create(self, job_id: str) -> bool:
+        """Opens a channel unless one exists. Returns True if this call opened it."""
         with self._lock:
             if job_id not in self._channels:
                 self._channels[job_id] = queue.Queue()
+                return True
+            return False
+
+    def reopen(self, job_id: str) -> None:
+        """
+        Opens a channel for another job on the same id. A channel closed by an
+        earlier job gets a fresh queue: its subscribers still drain the old one
+        and end, while events of the new job are not queued behind the sentinel.
+        """
+        with self._lock:
+            if job_id not in self._channels or job_id in self._closed:
+                self._channels[job_id] = queue.Queue()
+                self._closed.discard(job_id)
 
     def publish(self, job_id: str, event: str, data: dict) -> None:
         with self._lock:
@@ -28,6 +43,7 @@ class SSEManager:
             q = self._channels.get(job_id)
             if q:
                 q.put(None)  # sentinel to stop generator
+                self._closed.add(job_id)
 
     def subscribe(self, job_id: str, heartbeat_seconds: int = 15) -> Generator[str, None, None]:
         with self._lock:
@@ -49,7 +65,10 @@ class SSEManager:
             if msg is None:
                 # cleanup at end
                 with self._lock:
-                    self._channels.pop(job_id, None)
+                    # The channel may have been reopened with a new queue meanwhile
+                    if self._channels.get(job_id) is q:
+                        self._channels.pop(job_id)
+                        self._closed.discard(job_id)
                 yield self._format("done", {"message": "closed"})
                 return
 
@@ -64,6 +83,9 @@ class SSEManager:
     def set_project_id(self, old_id: str, new_id: str) -> None:
         with self._lock:
             self._channels[new_id] = self._channels.pop(old_id)
+            if old_id in self._closed:
+                self._closed.discard(old_id)
+                self._closed.add(new_id)
 
     def _format(self, event: str, data: dict) -> str:
         # SSE framing: event + data (JSON) + blank line
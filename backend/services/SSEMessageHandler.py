@@ -4,15 +4,31 @@ class SSEMessageHandler():
         self.sse_manager = sse_manager
         self.module = None
         self.current_model = None
+        self.preview = False  # Events of an excerpt preview carry 'preview': true
 
     def set_module(self, module_name: str):
         self.module = module_name
 
+    def for_module(self, module_name: str) -> "SSEMessageHandler":
+        """Returns a handler on the same channel bound to another module (for modules running concurrently)."""
+        handler = SSEMessageHandler(self.project_id, self.sse_manager)
+        handler.set_module(module_name)
+        handler.preview = self.preview
+        return handler
+
+    def for_preview(self) -> "SSEMessageHandler":
+        """Returns a handler on the same channel whose events are flagged as belonging to the excerpt preview."""
+        handler = SSEMessageHandler(self.project_id, self.sse_manager)
+        handler.preview = True
+        return handler
+
     def set_current_model(self, model_name: str):
         """Set the current model being loaded/downloaded."""
         self.current_model = model_name
 
     def _send_raw(self, event: str, data: dict):
+        if self.preview:
+            data = {**data, 'preview': True}
         self.sse_manager.publish(self.project_id, event, data)
 
     def _send(self, event: str, status: str, message: str):
@@ -32,7 +48,7 @@ class SSEMessageHandler():
         
         Args:
             message: The log message
-            event_type: "model_download" or "processing"
+            event_type: "model_download", "processing" or "chunk"
         """
         if event_type == "model_download":
             # Model download progress - parse download percentage/status
@@ -46,6 +62,10 @@ class SSEMessageHandler():
             elif 'MB' in message or 'KB' in message or 'Downloading' in message.lower():
                 # Download status message
                 self.send_model_downloading(message)
+        elif event_type == "chunk":
+            # Chunked separation of a long input: "<done>/<total>/<seconds separated>/<partial stems>"
+            done, total, seconds, partials = message.split('/')
+            self.send_chunk_progress(int(done), int(total), float(seconds), partials.split(','))
         else:
             # Processing progress - original behavior
             if '%' not in message:
@@ -85,9 +105,35 @@ class SSEMessageHandler():
             'progress': '100'
         })
 
+    def send_chunk_progress(self, done: int, total: int, seconds: float, partials: list):
+        """Signal that another chunk of a long input has been separated and appended to the partial stems."""
+        self._send_raw('chunk_progress', {
+            'module': self.module, 'chunk': done, 'total': total, 'seconds': seconds, 'partials': partials
+        })
+
+    def send_preview(self, preview: dict):
+        """Send the stems separated from the excerpt preview (the full-length run follows)."""
+        self._send_raw('preview', preview)
+
     def send_module_completed(self):
         self.send_running('module_processing', 100)
 
+    def send_schedule(self, plan: dict):
+        """Send the execution plan (parallel levels and critical path) of the modules about to run."""
+        self._send_raw('schedule', plan)
+
+    def send_job_status(self, job: dict):
+        """Send the state of the background job driving this channel."""
+        self._send_raw('job_status', job)
+
+    def open(self):
+        """Recreates the channel if an earlier job on it has closed it."""
+        self.sse_manager.reopen(self.project_id)
+
+    def close(self):
+        """Close the current channel (ends the client's stream)."""
+        self.sse_manager.close(self.project_id)
+
     def send_id_changed(self, new_id: str):
         self._send_raw('id_changed', {'new_id': new_id})
 
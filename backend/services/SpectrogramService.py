@@ -0,0 +1,119 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+import soundfile as sf
+
+from AudioProject import CACHE_FOLDER
+from utils.spectrogram import build_spectrogram, encode_png, render_tile, spectrogram_info
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Sub-folder of a project's CACHE_FOLDER holding the spectrograms and their tiles
+SPECTROGRAMS_FOLDER = "spectrograms"
+BASE_FILE = "base.npy"
+TILES_FOLDER = "tiles"
+
+
+class SpectrogramService:
+    """
+    Spectrogram tiles of stems, built on first request and cached.
+
+    Per stem and stem version, the finest spectrogram is computed once into
+    `.cache/spectrograms/<stem>/<version>/base.npy`; every tile requested is
+    then rendered from it and kept as a PNG next to it. A rewritten stem gets
+    a new version folder and the old one is deleted.
+    """
+
+    def __init__(self, file_service):
+        """
+        Args:
+            file_service: FileService resolving stem paths and versions
+        """
+        self.file_service = file_service
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+
+    def _locate(self, project_id: str, filename: str):
+        path = self.file_service.get_file_path(project_id, filename) if os.path.basename(filename) == filename else None
+        if not path:
+            raise FileNotFoundError(f"File not found: {filename}")
+        version = self.file_service.get_file_version(path)
+        stem_folder = os.path.join(os.path.dirname(path), CACHE_FOLDER, SPECTROGRAMS_FOLDER, filename)
+        return path, version, stem_folder
+
+    def get_info(self, project_id: str, filename: str) -> Dict[str, Any]:
+        """
+        Describes the tile pyramid of a stem (see utils.spectrogram.spectrogram_info)
+        and the stem `version` tiles are cached under.
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        path, version, _ = self._locate(project_id, filename)
+        info = sf.info(path)
+        return {**spectrogram_info(info.frames, info.samplerate), 'version': version}
+
+    def _ensure_base(self, path: str, version_folder: str) -> str:
+        """Computes the finest spectrogram of the stem version if it is not cached yet."""
+        base_path = os.path.join(version_folder, BASE_FILE)
+        with self._lock:
+            build_lock = self._building.setdefault(version_folder, threading.Lock())
+        try:
+            with build_lock:
+                if os.path.exists(base_path):
+                    return base_path
+                stem_folder = os.path.dirname(version_folder)
+                # Spectrograms of earlier versions of the stem are no longer served
+                if os.path.isdir(stem_folder):
+                    for name in os.listdir(stem_folder):
+                        shutil.rmtree(os.path.join(stem_folder, name), ignore_errors=True)
+                os.makedirs(version_folder, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=version_folder, suffix=".part")
+                os.close(fd)
+                try:
+                    build_spectrogram(path, temp_path)
+                    os.replace(temp_path, base_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                logger.info(f"Computed spectrogram of {os.path.basename(path)}")
+                return base_path
+        finally:
+            with self._lock:
+                self._building.pop(version_folder, None)
+
+    def get_tile(self, project_id: str, filename: str, time_level: int, freq_level: int, x: int, y: int) -> Optional[str]:
+        """
+        Returns the PNG of one tile, rendering it (and the stem's spectrogram) on first request.
+
+        Returns:
+            Path of the tile, or None if the tile lies outside the pyramid
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        path, version, stem_folder = self._locate(project_id, filename)
+        version_folder = os.path.join(stem_folder, version)
+        tile_path = os.path.join(version_folder, TILES_FOLDER, f"{time_level}-{freq_level}-{x}-{y}.png")
+        if os.path.exists(tile_path):
+            return tile_path
+
+        tile = render_tile(self._ensure_base(path, version_folder), time_level, freq_level, x, y)
+        if tile is None:
+            return None
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(tile_path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_png(tile))
+            os.replace(temp_path, tile_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return tile_path
@@ -2,16 +2,68 @@ from .ProjectService import ProjectService
 from .AudioService import AudioService
 from .FileService import FileService
 from .SSEManager import SSEManager
+from .JobManager import JobManager
+from .MixdownService import MixdownService
+from .ProxyService import ProxyService
+from .BundleService import BundleService
+from .SpectrogramService import SpectrogramService
 import os
 
 # Configuration (Could be moved to config.py)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 LIBRARY_FOLDER = os.path.join(PROJECT_ROOT, 'Library')
+LIBRARY_INDEX_FILE = os.environ.get('LIBRARY_INDEX_FILE') or None
 UPLOAD_FOLDER = os.path.abspath(os.path.join(BASE_DIR, 'uploads'))
+MODEL_CACHE_MB = int(os.environ.get('MODEL_CACHE_MB', 4096))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 16))
+MODULE_WORKERS = int(os.environ.get('MODULE_WORKERS', 1))
+INTERMEDIATE_STEMS = os.environ.get('INTERMEDIATE_STEMS', 'memory')
+ENCODE_WORKERS = int(os.environ.get('ENCODE_WORKERS', 2))
+FLAC_COMPRESSION_LEVEL = int(os.environ.get('FLAC_COMPRESSION_LEVEL', 5))
+CHUNK_SECONDS = float(os.environ.get('CHUNK_SECONDS', 600))
+SEGMENT_WORKERS = int(os.environ.get('SEGMENT_WORKERS', 0))
+SEGMENT_TORCH_THREADS = int(os.environ.get('SEGMENT_TORCH_THREADS', 0)) or None
+RESULT_CACHE_FOLDER = os.path.join(PROJECT_ROOT, 'ResultCache')
+RESULT_CACHE_MB = int(os.environ.get('RESULT_CACHE_MB', 20480))
+RESULT_CACHE_DAYS = float(os.environ.get('RESULT_CACHE_DAYS', 30))
+# Extension of the stems written by the modules (shared by processing and the advertised lazy stems)
+OUTPUT_FORMAT = 'flac'
+LAZY_STEMS = os.environ.get('LAZY_STEMS', 'true').lower() == 'true'
+ZIP_CACHE_MB = int(os.environ.get('ZIP_CACHE_MB', 2048))
+MIXDOWN_CACHE_MB = int(os.environ.get('MIXDOWN_CACHE_MB', 256))
+PROXY_WORKERS = int(os.environ.get('PROXY_WORKERS', 1))
+PROXY_FORMAT = os.environ.get('PROXY_FORMAT', 'opus')
+PROXY_BITRATE_KBPS = int(os.environ.get('PROXY_BITRATE_KBPS', 96))
+PRESET_COSTS_FILE = os.path.join(PROJECT_ROOT, 'preset_costs.json')
 
 # Initialize Services
 sse_manager = SSEManager()
-project_service = ProjectService(LIBRARY_FOLDER)
-file_service = FileService(project_service, UPLOAD_FOLDER)
-audio_service = AudioService(project_service, file_service)
+job_manager = JobManager(max_workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE)
+project_service = ProjectService(LIBRARY_FOLDER, lazy_stems=LAZY_STEMS, index_path=LIBRARY_INDEX_FILE, output_format=OUTPUT_FORMAT)
+file_service = FileService(project_service, UPLOAD_FOLDER, zip_cache_bytes=ZIP_CACHE_MB * 1024 ** 2)
+proxy_service = ProxyService(file_service, fmt=PROXY_FORMAT, bitrate_kbps=PROXY_BITRATE_KBPS, max_workers=PROXY_WORKERS)
+bundle_service = BundleService(file_service)
+spectrogram_service = SpectrogramService(file_service)
+mixdown_service = MixdownService(file_service, cache_bytes=MIXDOWN_CACHE_MB * 1024 ** 2)
+audio_service = AudioService(
+    project_service,
+    file_service,
+    model_cache_bytes=MODEL_CACHE_MB * 1024 ** 2,
+    module_workers=MODULE_WORKERS,
+    result_cache_config={
+        'root': RESULT_CACHE_FOLDER,
+        'max_bytes': RESULT_CACHE_MB * 1024 ** 2,
+        'max_age_seconds': RESULT_CACHE_DAYS * 86400,
+    } if RESULT_CACHE_MB > 0 else None,
+    intermediate_mode=INTERMEDIATE_STEMS,
+    encode_workers=ENCODE_WORKERS,
+    flac_compression_level=FLAC_COMPRESSION_LEVEL,
+    chunk_seconds=CHUNK_SECONDS,
+    segment_workers=SEGMENT_WORKERS,
+    segment_torch_threads=SEGMENT_TORCH_THREADS,
+    preset_costs_path=PRESET_COSTS_FILE,
+    proxy_service=proxy_service,
+    output_format=OUTPUT_FORMAT
+)
@@ -0,0 +1,166 @@
+"""
+Block-wise arithmetic on audio streams.
+Several sources are read in lockstep, block by block, and combined with
+per-source gains, so mixing and derived stems run in bounded memory however
+long the audio is.
+"""
+import subprocess
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import soundfile as sf
+
+DEFAULT_BLOCK_FRAMES = 65536
+
+
+def array_blocks(array: np.ndarray, block_frames: int = DEFAULT_BLOCK_FRAMES, start: int = 0) -> Iterator[np.ndarray]:
+    """
+    Streams an array (e.g. a PCM memmap) of shape (frames, channels) from frame `start`.
+
+    Yields:
+        float32 blocks of shape (frames, channels)
+    """
+    if array.ndim == 1:
+        array = array[:, np.newaxis]
+    for position in range(start, len(array), block_frames):
+        yield np.asarray(array[position:position + block_frames], dtype=np.float32)
+
+
+def file_blocks(path: str, block_frames: int = DEFAULT_BLOCK_FRAMES, start: int = 0) -> Iterator[np.ndarray]:
+    """
+    Streams an audio file from frame `start`.
+
+    Yields:
+        float32 blocks of shape (frames, channels)
+    """
+    return sf.blocks(path, blocksize=block_frames, start=start, dtype="float32", always_2d=True)
+
+
+def resampled_blocks(path: str, sample_rate: int, channels: int, block_frames: int = DEFAULT_BLOCK_FRAMES) -> Iterator[np.ndarray]:
+    """
+    Streams an audio file resampled to `sample_rate` by ffmpeg, keeping its `channels`.
+
+    Yields:
+        float32 blocks of shape (frames, channels)
+
+    Raises:
+        RuntimeError: If ffmpeg is unavailable or fails to decode the file
+    """
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin", "-i", path,
+        "-map", "0:a:0", "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"
+    ]
+    try:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise RuntimeError(f"ffmpeg unavailable: {e}")
+    block_bytes = block_frames * channels * 4
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % (channels * 4)
+            yield np.frombuffer(data[:usable], dtype="<f4").reshape(-1, channels)
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()  # Closed early
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def _check_channels(block: np.ndarray, channels: int) -> None:
+    if block.shape[1] not in (1, channels):
+        raise ValueError(f"Cannot mix {block.shape[1]} channels into {channels}")
+
+
+def mix_blocks(
+    sources: Sequence[Iterable[np.ndarray]],
+    gains: Sequence[float],
+    channels: int,
+    clip: bool = True
+) -> Iterator[np.ndarray]:
+    """
+    Sums gain-weighted block streams in lockstep.
+
+    The streams must use the same block size. A stream that ends early counts
+    as silence for the rest of the output, and mono streams are broadcast to
+    `channels`. Memory use depends on the block size and number of sources only.
+
+    Args:
+        sources: Block streams of shape (frames, channels), e.g. from array_blocks or file_blocks
+        gains: Linear gain per source
+        channels: Channel count of the output
+        clip: Clip the output to [-1, 1]
+
+    Yields:
+        float32 blocks of shape (frames, channels)
+
+    Raises:
+        ValueError: If a source has more channels than the output (and is not mono)
+    """
+    iterators: List[Optional[Iterator[np.ndarray]]] = [iter(source) for source in sources]
+    gains = [np.float32(gain) for gain in gains]
+    while True:
+        blocks = []
+        for index, iterator in enumerate(iterators):
+            if iterator is None:
+                continue
+            block = next(iterator, None)
+            if block is None or not len(block):
+                iterators[index] = None
+                continue
+            blocks.append((index, block))
+        if not blocks:
+            return
+
+        mixed = np.zeros((max(len(block) for _, block in blocks), channels), dtype=np.float32)
+        for index, block in blocks:
+            _check_channels(block, channels)
+            # Mono blocks broadcast across the output channels without being copied
+            if gains[index] == 1.0:
+                mixed[:len(block)] += block
+            else:
+                mixed[:len(block)] += block * gains[index]
+        if clip:
+            np.clip(mixed, -1.0, 1.0, out=mixed)
+        yield mixed
+
+
+def stack_blocks(sources: Sequence[Iterable[np.ndarray]], channels: Sequence[int]) -> Iterator[np.ndarray]:
+    """
+    Places block streams side by side as the channels of one stream, in lockstep.
+
+    The streams must use the same block size. A stream that ends early
+    continues as silence until the longest one ends.
+
+    Args:
+        sources: Block streams of shape (frames, channels), e.g. from file_blocks
+        channels: Channel count of each source
+
+    Yields:
+        float32 blocks of shape (frames, sum(channels))
+    """
+    iterators: List[Optional[Iterator[np.ndarray]]] = [iter(source) for source in sources]
+    offsets = np.concatenate([[0], np.cumsum(channels)]).astype(int)
+    while True:
+        blocks = []
+        for index, iterator in enumerate(iterators):
+            if iterator is None:
+                continue
+            block = next(iterator, None)
+            if block is None or not len(block):
+                iterators[index] = None
+                continue
+            blocks.append((index, block))
+        if not blocks:
+            return
+
+        stacked = np.zeros((max(len(block) for _, block in blocks), offsets[-1]), dtype=np.float32)
+        for index, block in blocks:
+            stacked[:len(block), offsets[index]:offsets[index + 1]] = block
+        yield stacked
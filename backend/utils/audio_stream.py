@@ -0,0 +1,150 @@
+"""
+Encoders turning a stream of audio blocks into a stream of file bytes.
+WAV is written directly (header first, then PCM); FLAC and Opus are piped
+through ffmpeg. Bytes are produced as blocks arrive, so a response can start
+before the audio has been fully rendered and nothing is written to disk.
+"""
+import struct
+import logging
+import threading
+import subprocess
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_BYTES = 65536
+
+# Output format -> (mimetype, file extension, ffmpeg output options or None for native WAV)
+STREAM_FORMATS = {
+    "wav": ("audio/wav", "wav", None),
+    "flac": ("audio/flac", "flac", ["-c:a", "flac", "-sample_fmt", "s16", "-f", "flac"]),
+    "opus": ("audio/ogg", "opus", ["-c:a", "libopus", "-b:a", "160k", "-ar", "48000", "-f", "ogg"]),
+}
+
+WAV_HEADER_BYTES = 44
+_WAV_MAX_DATA_BYTES = 0xFFFFFFFF - 36
+
+
+def wav_header(frames: int, sample_rate: int, channels: int) -> bytes:
+    """Returns a 16-bit PCM WAV header for `frames` frames (the sizes saturate past 4 GB)."""
+    block_align = channels * 2
+    data_bytes = min(frames * block_align, _WAV_MAX_DATA_BYTES)
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, 16,
+        b"data", data_bytes
+    )
+
+
+def _pcm16(block: np.ndarray) -> bytes:
+    return (np.clip(block, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def wav_stream(blocks: Iterable[np.ndarray], frames: int, sample_rate: int, channels: int) -> Iterator[bytes]:
+    """
+    Encodes blocks as a 16-bit WAV of exactly `frames` frames.
+
+    The length is declared in the header up front, so the stream is cut or
+    padded with silence to match it.
+
+    Yields:
+        The header, then the PCM data of each block
+    """
+    yield wav_header(frames, sample_rate, channels)
+    remaining = frames
+    for block in blocks:
+        if remaining <= 0:
+            break
+        block = block[:remaining]
+        remaining -= len(block)
+        yield _pcm16(block)
+    if remaining > 0:
+        yield bytes(remaining * channels * 2)
+
+
+def ffmpeg_stream(blocks: Iterable[np.ndarray], sample_rate: int, channels: int, output_options: List[str]) -> Iterator[bytes]:
+    """
+    Encodes blocks with ffmpeg, reading the encoded bytes while blocks are still being fed.
+
+    Closing the generator early (e.g. the client went away) stops ffmpeg.
+
+    Yields:
+        Encoded bytes in chunks of at most STREAM_CHUNK_BYTES
+
+    Raises:
+        RuntimeError: If ffmpeg is unavailable or fails
+    """
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+        *output_options, "pipe:1"
+    ]
+    try:
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise RuntimeError(f"ffmpeg unavailable: {e}")
+
+    failure: List[Optional[BaseException]] = [None]
+
+    def feed():
+        try:
+            for block in blocks:
+                proc.stdin.write(np.ascontiguousarray(block, dtype="<f4").tobytes())
+        except BrokenPipeError:
+            pass  # ffmpeg stopped reading (failed or was stopped)
+        except Exception as e:
+            failure[0] = e
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    writer = threading.Thread(target=feed, name="ffmpeg-feed", daemon=True)
+    writer.start()
+    finished = False
+    try:
+        while True:
+            chunk = proc.stdout.read1(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+        finished = True
+    finally:
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+        writer.join()
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+
+    if failure[0] is not None:
+        raise RuntimeError(f"Failed to render audio: {failure[0]}")
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode the stream: {stderr}")
+
+
+def encode_stream(blocks: Iterable[np.ndarray], fmt: str, frames: int, sample_rate: int, channels: int) -> Iterator[bytes]:
+    """
+    Encodes a block stream to one of STREAM_FORMATS.
+
+    Args:
+        blocks: float32 blocks of shape (frames, channels)
+        fmt: Key of STREAM_FORMATS
+        frames: Number of frames in the stream (declared in WAV headers)
+        sample_rate: Sample rate of the blocks
+        channels: Channel count of the blocks
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}' (expected one of {', '.join(STREAM_FORMATS)})")
+    output_options = STREAM_FORMATS[fmt][2]
+    if output_options is None:
+        return wav_stream(blocks, frames, sample_rate, channels)
+    return ffmpeg_stream(blocks, sample_rate, channels, output_options)
@@ -0,0 +1,198 @@
+"""
+Windowing helpers for separating long inputs in overlapping chunks.
+Windows are separated independently, stitched back with crossfades over the
+overlap, and every finished chunk is appended to a partial stem and
+checkpointed, so the separated prefix is playable while later chunks run and
+a restarted job resumes from the last one instead of starting over.
+"""
+import os
+import json
+import shutil
+import logging
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "progress.json"
+
+# Stems of a chunked separation grow in a WAV next to the final file, whose header
+# is updated on every flush, so readers always see a complete file. Samples are
+# float, so stems peaking above full scale are kept until the final normalization.
+PARTIAL_SUFFIX = ".partial.wav"
+PARTIAL_SUBTYPE = "FLOAT"
+
+# Context re-separated around a region on each side, used to crossfade it into the existing stem
+DEFAULT_REGION_PADDING_SECONDS = 2.0
+
+
+def plan_windows(total_frames: int, chunk_frames: int, overlap_frames: int) -> List[Tuple[int, int]]:
+    """
+    Splits [0, total_frames) into windows starting every chunk_frames, each
+    extending overlap_frames into the next one. A remainder no longer than the
+    overlap is merged into the last window.
+
+    Returns:
+        List of (start, end) frame ranges
+    """
+    windows = []
+    start = 0
+    while start < total_frames:
+        end = min(total_frames, start + chunk_frames + overlap_frames)
+        if total_frames - (start + chunk_frames) <= overlap_frames:
+            end = total_frames
+        windows.append((start, end))
+        if end == total_frames:
+            break
+        start += chunk_frames
+    return windows
+
+
+def crossfade(tail: np.ndarray, head: np.ndarray) -> np.ndarray:
+    """
+    Blends the end of one window into the start of the next over their overlap.
+    The fades sum to one, so correlated material passes through unchanged.
+    """
+    frames = len(tail)
+    t = (np.arange(frames, dtype=np.float32) + 0.5) / max(1, frames)
+    fade_in = (np.sin(0.5 * np.pi * t) ** 2)[:, np.newaxis]
+    return tail * (1.0 - fade_in) + head * fade_in
+
+
+def partial_path(path: str) -> str:
+    """Returns the partial stem written while the stem at `path` is separated in chunks."""
+    return f"{os.path.splitext(path)[0]}{PARTIAL_SUFFIX}"
+
+
+def open_partial(path: str, sample_rate: int, channels: int, resume_frames: int = 0) -> sf.SoundFile:
+    """
+    Opens a partial stem for appending chunks.
+
+    Args:
+        path: Partial stem path (see partial_path)
+        sample_rate: Sample rate of the stem
+        channels: Channel count of the stem (ignored when resuming)
+        resume_frames: Frames already finished; the file is kept up to there and
+            written from there on (0 starts a new file)
+
+    Raises:
+        ValueError: If the file to resume is missing or shorter than resume_frames
+    """
+    if not resume_frames:
+        return sf.SoundFile(path, "w", samplerate=sample_rate, channels=channels, format="WAV", subtype=PARTIAL_SUBTYPE)
+    try:
+        f = sf.SoundFile(path, "r+")
+    except (OSError, RuntimeError) as e:
+        raise ValueError(f"Cannot resume {os.path.basename(path)}: {e}")
+    if f.samplerate != sample_rate or f.frames < resume_frames:
+        f.close()
+        raise ValueError(f"Cannot resume {os.path.basename(path)}: {f.frames} of {resume_frames} frames at {f.samplerate} Hz")
+    f.seek(resume_frames)
+    return f
+
+
+def splice_blocks(path: str, region: np.ndarray, region_start: int, block_frames: int = 65536) -> Iterator[np.ndarray]:
+    """
+    Streams an audio file with the frames from region_start on replaced by region.
+
+    Yields:
+        float32 blocks of shape (frames, channels)
+    """
+    with sf.SoundFile(path) as f:
+        position = 0
+        while position < region_start:
+            block = f.read(min(block_frames, region_start - position), dtype="float32", always_2d=True)
+            if not len(block):
+                break
+            position += len(block)
+            yield block
+        yield region
+        f.seek(min(f.frames, region_start + len(region)))
+        for block in f.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+            yield block
+
+
+class ChunkCheckpoint:
+    """
+    Per-module folder recording the progress of a chunked separation.
+
+    The chunks' stitched output is held by the partial stems; the checkpoint
+    keeps the number of finished chunks and the overlap tail per stem the next
+    chunk crossfades into.
+    """
+
+    def __init__(self, folder: str, signature: Dict[str, Any]):
+        """
+        Args:
+            folder: Checkpoint folder (e.g. <project>/.cache/chunks/<module>)
+            signature: Identifies input, model and chunking; a stored checkpoint
+                with another signature is discarded
+        """
+        self.folder = folder
+        self.signature = signature
+        self.state: Dict[str, Any] = {"signature": signature, "chunks_done": 0, "stems": []}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def load(self) -> int:
+        """
+        Loads a previous run's progress.
+
+        Returns:
+            Number of chunks already finished (0 when starting fresh)
+        """
+        try:
+            with open(self._path(CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            state = None
+
+        if state and state.get("signature") == self.signature:
+            self.state = state
+            logger.info(f"Resuming chunked separation from chunk {state['chunks_done']} ({self.folder})")
+        else:
+            self.clear()
+        os.makedirs(self.folder, exist_ok=True)
+        return self.state["chunks_done"]
+
+    def tails(self) -> Dict[str, np.ndarray]:
+        """Returns the overlap tails left by the last finished chunk."""
+        tails = {}
+        index = self.state["chunks_done"] - 1
+        for name in self.state["stems"]:
+            path = self._path(f"{name}.tail.{index:05d}.npy")
+            if os.path.exists(path):
+                tails[name] = np.load(path)
+        return tails
+
+    def save_chunk(self, index: int, tails: Dict[str, np.ndarray]) -> None:
+        """
+        Marks a chunk done once its output has been appended to the partial stems.
+
+        Args:
+            index: Chunk index
+            tails: Overlap tail per stem filename for the next chunk, shape (frames, channels)
+        """
+        for name, tail in tails.items():
+            np.save(self._path(f"{name}.tail.{index:05d}.npy"), tail)
+
+        self.state["stems"] = sorted(tails)
+        self.state["chunks_done"] = index + 1
+        temp_path = self._path(f"{CHECKPOINT_FILE}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self._path(CHECKPOINT_FILE))
+
+        # Only the latest tails are needed once the chunk is marked done
+        for name in tails:
+            previous = self._path(f"{name}.tail.{index - 1:05d}.npy")
+            if os.path.exists(previous):
+                os.remove(previous)
+
+    def clear(self) -> None:
+        """Deletes the checkpoint folder."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.state = {"signature": self.signature, "chunks_done": 0, "stems": []}
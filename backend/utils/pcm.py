@@ -0,0 +1,136 @@
+"""
+Decoded PCM buffers shared by every module of a job.
+Inputs are decoded once with ffmpeg into raw interleaved float32 files and
+memory-mapped, so several readers share one copy of the waveform.
+"""
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PCM_CHANNELS = 2
+
+
+def as_stereo_float32(array: np.ndarray) -> np.ndarray:
+    """Converts an audio array to contiguous float32 of shape (samples, 2)."""
+    array = np.asarray(array, dtype=np.float32)
+    if array.ndim == 1:
+        array = array[:, np.newaxis]
+    elif array.shape[0] == PCM_CHANNELS and array.shape[1] != PCM_CHANNELS:
+        array = array.T  # (channels, samples)
+    if array.shape[1] == 1:
+        array = np.repeat(array, PCM_CHANNELS, axis=1)
+    return np.ascontiguousarray(array[:, :PCM_CHANNELS])
+
+
+class PcmStore:
+    """
+    Folder of decoded inputs, one raw float32 file per (source file, sample rate).
+
+    Arrays are returned as read-only memmaps of shape (samples, channels).
+    A store lives for one job: files are trusted as long as they exist, so
+    outputs handed over with put() stay valid after their FLAC is written.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._open: Dict[str, np.memmap] = {}
+
+    def path_for(self, source_path: str, sample_rate: int) -> str:
+        """Returns the raw PCM file path used for a source file at a sample rate."""
+        name = os.path.basename(source_path)
+        return os.path.join(self.folder, f"{name}.{sample_rate}.f32")
+
+    def open(self, source_path: str, sample_rate: int) -> np.memmap:
+        """
+        Returns the decoded audio of source_path at sample_rate, decoding it on first use.
+
+        Raises:
+            RuntimeError: If ffmpeg fails to decode the file
+        """
+        pcm_path = self.path_for(source_path, sample_rate)
+        with self._lock:
+            cached = self._open.get(pcm_path)
+            if cached is not None:
+                return cached
+
+            if not os.path.exists(pcm_path):
+                self._decode(source_path, pcm_path, sample_rate)
+
+            frames = os.path.getsize(pcm_path) // (4 * PCM_CHANNELS)
+            if frames == 0:
+                raise RuntimeError(f"No audio decoded from {source_path}")
+            array = np.memmap(pcm_path, dtype=np.float32, mode="r", shape=(frames, PCM_CHANNELS))
+            self._open[pcm_path] = array
+            return array
+
+    def put(self, source_path: str, sample_rate: int, array: np.ndarray, in_memory: bool = True) -> None:
+        """
+        Registers already decoded audio for source_path (e.g. a stem that was just separated),
+        so later readers skip decoding the file.
+
+        Args:
+            source_path: Path the audio belongs to (it may not be written yet)
+            sample_rate: Sample rate of the array
+            array: Audio of shape (samples, channels) or (channels, samples)
+            in_memory: Keep the array in this process only; otherwise write it as raw
+                float32 so other processes can map it
+        """
+        pcm_path = self.path_for(source_path, sample_rate)
+        array = as_stereo_float32(array)
+        with self._lock:
+            if in_memory:
+                self._open[pcm_path] = array
+                return
+
+            os.makedirs(self.folder, exist_ok=True)
+            temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            array.tofile(temp_path)
+            os.replace(temp_path, pcm_path)
+            self._open[pcm_path] = np.memmap(pcm_path, dtype=np.float32, mode="r", shape=array.shape)
+
+    def export(self, source_path: str, sample_rate: int) -> str:
+        """
+        Returns the raw PCM file of source_path at sample_rate for readers in other
+        processes, writing it out if the audio was only registered in memory.
+        """
+        array = self.open(source_path, sample_rate)
+        pcm_path = self.path_for(source_path, sample_rate)
+        with self._lock:
+            if not os.path.exists(pcm_path):
+                os.makedirs(self.folder, exist_ok=True)
+                temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                np.ascontiguousarray(array).tofile(temp_path)
+                os.replace(temp_path, pcm_path)
+        return pcm_path
+
+    def _decode(self, source_path: str, pcm_path: str, sample_rate: int) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        command = [
+            "ffmpeg", "-v", "error", "-nostdin", "-y", "-i", source_path,
+            "-map", "0:a:0", "-f", "f32le", "-ac", str(PCM_CHANNELS), "-ar", str(sample_rate), temp_path
+        ]
+        logger.info(f"Decoding {os.path.basename(source_path)} to {sample_rate} Hz PCM")
+        try:
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise RuntimeError(f"ffmpeg unavailable: {e}")
+        if result.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise RuntimeError(f"ffmpeg failed to decode {source_path}: {result.stderr.decode(errors='replace').strip()}")
+        os.replace(temp_path, pcm_path)
+
+    def clear(self) -> None:
+        """Drops open maps and deletes every decoded file."""
+        with self._lock:
+            self._open.clear()
+            shutil.rmtree(self.folder, ignore_errors=True)
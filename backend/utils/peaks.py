@@ -0,0 +1,203 @@
+"""
+Min/max waveform peak pyramids.
+A stem is reduced once, in a single streaming pass, to min/max pairs per
+channel at several zoom levels, each level 4x coarser than the one below.
+The pyramid is stored in a small binary file so a waveform can be drawn at
+any zoom from a slice of one level, without decoding the audio.
+
+File layout (little-endian):
+    header      magic "PEAK", version u16, channels u16, levels u16, reserved u16,
+                sample_rate u32, frames u64, source size u64, source mtime_ns u64
+    level table per level: samples_per_peak u32, peak count u32
+    data        per level: int16 array of shape (peak count, channels, 2) holding (min, max)
+"""
+import os
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+from utils.audio_blocks import file_blocks
+
+PEAKS_EXTENSION = ".peaks"
+BASE_SAMPLES_PER_PEAK = 512
+LEVEL_FACTOR = 4
+MIN_LEVEL_PEAKS = 256  # Coarser levels are not stored once a level has fewer peaks than this
+
+_MAGIC = b"PEAK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHHHIQQQ")
+_LEVEL = struct.Struct("<II")
+_SCALE = 32767.0
+
+
+def _reduce(peaks: np.ndarray, factor: int) -> np.ndarray:
+    """Merges every `factor` consecutive (min, max) pairs of a level into one."""
+    count = -(-len(peaks) // factor)
+    padded = np.empty((count * factor,) + peaks.shape[1:], dtype=peaks.dtype)
+    padded[:len(peaks)] = peaks
+    padded[len(peaks):] = peaks[-1]  # Repeating the last pair leaves min/max unchanged
+    grouped = padded.reshape(count, factor, *peaks.shape[1:])
+    reduced = np.empty((count,) + peaks.shape[1:], dtype=peaks.dtype)
+    reduced[..., 0] = grouped[..., 0].min(axis=1)
+    reduced[..., 1] = grouped[..., 1].max(axis=1)
+    return reduced
+
+
+def compute_peaks(source_path: str, block_frames: int = BASE_SAMPLES_PER_PEAK * 128) -> Dict[str, Any]:
+    """
+    Reduces an audio file to its finest peak level in one streaming pass.
+
+    Returns:
+        Dict with `sample_rate`, `frames` and `peaks`, a float32 array of shape (count, channels, 2)
+    """
+    info = sf.info(source_path)
+    parts: List[np.ndarray] = []
+    frames = 0
+    for block in file_blocks(source_path, block_frames=block_frames):
+        frames += len(block)
+        count = -(-len(block) // BASE_SAMPLES_PER_PEAK)
+        if len(block) % BASE_SAMPLES_PER_PEAK:
+            # Only the last block is partial; pad it with its own final sample
+            padded = np.empty((count * BASE_SAMPLES_PER_PEAK, block.shape[1]), dtype=np.float32)
+            padded[:len(block)] = block
+            padded[len(block):] = block[-1]
+            block = padded
+        bins = block.reshape(count, BASE_SAMPLES_PER_PEAK, block.shape[1])
+        parts.append(np.stack([bins.min(axis=1), bins.max(axis=1)], axis=-1))
+    peaks = np.concatenate(parts) if parts else np.zeros((0, info.channels, 2), dtype=np.float32)
+    return {"sample_rate": info.samplerate, "frames": frames, "peaks": peaks}
+
+
+def build_peaks(source_path: str, peaks_path: str) -> str:
+    """
+    Computes the peak pyramid of an audio file and writes it to `peaks_path`.
+    The file is written aside and moved into place, so readers never see a partial file.
+
+    Returns:
+        peaks_path
+    """
+    stat = os.stat(source_path)
+    computed = compute_peaks(source_path)
+    base = np.round(np.clip(computed["peaks"], -1.0, 1.0) * _SCALE).astype("<i2")
+
+    levels = [(BASE_SAMPLES_PER_PEAK, base)]
+    while len(levels[-1][1]) > MIN_LEVEL_PEAKS * LEVEL_FACTOR:
+        samples_per_peak, peaks = levels[-1]
+        levels.append((samples_per_peak * LEVEL_FACTOR, _reduce(peaks, LEVEL_FACTOR)))
+
+    os.makedirs(os.path.dirname(peaks_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(peaks_path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(
+                _MAGIC, _VERSION, base.shape[1], len(levels), 0,
+                computed["sample_rate"], computed["frames"], stat.st_size, stat.st_mtime_ns
+            ))
+            for samples_per_peak, peaks in levels:
+                f.write(_LEVEL.pack(samples_per_peak, len(peaks)))
+            for _, peaks in levels:
+                f.write(np.ascontiguousarray(peaks).tobytes())
+        os.replace(temp_path, peaks_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return peaks_path
+
+
+def _read_header(f) -> Optional[Dict[str, Any]]:
+    raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        return None
+    magic, version, channels, level_count, _, sample_rate, frames, size, mtime_ns = _HEADER.unpack(raw)
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    levels = []
+    offset = _HEADER.size + level_count * _LEVEL.size
+    for _ in range(level_count):
+        samples_per_peak, count = _LEVEL.unpack(f.read(_LEVEL.size))
+        levels.append({"samples_per_peak": samples_per_peak, "count": count, "offset": offset})
+        offset += count * channels * 2 * 2
+    return {
+        "channels": channels, "sample_rate": sample_rate, "frames": frames,
+        "source_size": size, "source_mtime_ns": mtime_ns, "levels": levels,
+    }
+
+
+def peaks_current(source_path: str, peaks_path: str) -> bool:
+    """Whether `peaks_path` exists and was built from the current content of `source_path`."""
+    try:
+        stat = os.stat(source_path)
+        with open(peaks_path, "rb") as f:
+            header = _read_header(f)
+    except OSError:
+        return False
+    return bool(header) and header["source_size"] == stat.st_size and header["source_mtime_ns"] == stat.st_mtime_ns
+
+
+def read_peaks(
+    peaks_path: str,
+    start: float = 0.0,
+    end: Optional[float] = None,
+    width: Optional[int] = None,
+    level: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Reads the peaks of a time range from one level of a pyramid.
+
+    Args:
+        peaks_path: File written by build_peaks
+        start: Start of the range in seconds
+        end: End of the range in seconds (None: end of the audio)
+        width: Desired number of peaks over the range; picks the coarsest level
+            giving at least this many (ignored when `level` is given)
+        level: Level index, 0 being the finest
+
+    Returns:
+        Dict with `sample_rate`, `channels`, `duration`, `level`, `levels`,
+        `samples_per_peak`, the actual `start`/`end` covered and `peaks`,
+        an int16 array of shape (count, channels, 2) scaled to +/-32767
+
+    Raises:
+        ValueError: If the file is not a peak pyramid or the level does not exist
+    """
+    with open(peaks_path, "rb") as f:
+        header = _read_header(f)
+        if header is None:
+            raise ValueError(f"Not a peaks file: {os.path.basename(peaks_path)}")
+        levels = header["levels"]
+        sample_rate = header["sample_rate"]
+        duration = header["frames"] / sample_rate if sample_rate else 0.0
+        start = min(max(0.0, start), duration)
+        end = duration if end is None else min(max(start, end), duration)
+
+        if level is None:
+            level = 0
+            if width:
+                for index, candidate in enumerate(levels):
+                    if (end - start) * sample_rate / candidate["samples_per_peak"] >= width:
+                        level = index
+        if not 0 <= level < len(levels):
+            raise ValueError(f"Level {level} does not exist (0-{len(levels) - 1})")
+
+        selected = levels[level]
+        samples_per_peak = selected["samples_per_peak"]
+        first = min(int(start * sample_rate) // samples_per_peak, selected["count"])
+        last = min(-(-int(np.ceil(end * sample_rate)) // samples_per_peak), selected["count"])
+        channels = header["channels"]
+        f.seek(selected["offset"] + first * channels * 4)
+        peaks = np.fromfile(f, dtype="<i2", count=(last - first) * channels * 2).reshape(-1, channels, 2)
+
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "duration": duration,
+        "level": level,
+        "levels": len(levels),
+        "samples_per_peak": samples_per_peak,
+        "start": first * samples_per_peak / sample_rate if sample_rate else 0.0,
+        "end": min(last * samples_per_peak / sample_rate, duration) if sample_rate else 0.0,
+        "peaks": peaks,
+    }
@@ -0,0 +1,162 @@
+"""
+Log-magnitude spectrograms cut into zoomable tiles.
+A stem's STFT is computed once, block by block with vectorized NumPy, into a
+quantized uint8 array (one column per hop, dB mapped to 0-255). Tiles at any
+time/frequency zoom level are max-pooled from that array on demand and
+encoded as small grayscale PNGs.
+"""
+import math
+import struct
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+import soundfile as sf
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.audio_blocks import file_blocks
+
+FFT_SIZE = 2048
+HOP_SIZE = 512
+FREQ_BINS = FFT_SIZE // 2  # The Nyquist bin is dropped so bins split evenly into tiles
+TILE_SIZE = 256
+DB_FLOOR = -100.0  # Maps to 0; 0 dBFS maps to 255
+FREQ_LEVELS = int(math.log2(FREQ_BINS // TILE_SIZE)) + 1
+
+
+def time_levels(columns: int) -> int:
+    """Number of time zoom levels, the coarsest fitting in one tile."""
+    levels = 1
+    while -(-columns // 2 ** (levels - 1)) > TILE_SIZE:
+        levels += 1
+    return levels
+
+
+def spectrogram_info(frames: int, sample_rate: int) -> Dict[str, Any]:
+    """
+    Describes the tile pyramid of a stem with `frames` frames.
+
+    Level 0 is the finest on both axes; each level halves the resolution.
+    """
+    columns = -(-frames // HOP_SIZE)
+    levels = []
+    for level in range(time_levels(columns)):
+        level_columns = -(-columns // 2 ** level)
+        levels.append({
+            "level": level,
+            "samples_per_column": HOP_SIZE * 2 ** level,
+            "columns": level_columns,
+            "tiles": -(-level_columns // TILE_SIZE),
+        })
+    freq_levels = []
+    for level in range(FREQ_LEVELS):
+        bins = FREQ_BINS // 2 ** level
+        freq_levels.append({
+            "level": level,
+            "bins": bins,
+            "hz_per_bin": sample_rate / 2 / bins,
+            "tiles": bins // TILE_SIZE,
+        })
+    return {
+        "sample_rate": sample_rate,
+        "duration": frames / sample_rate if sample_rate else 0.0,
+        "fft_size": FFT_SIZE,
+        "hop_size": HOP_SIZE,
+        "tile_size": TILE_SIZE,
+        "db_floor": DB_FLOOR,
+        "time_levels": levels,
+        "freq_levels": freq_levels,
+    }
+
+
+def build_spectrogram(source_path: str, base_path: str, block_frames: int = HOP_SIZE * 256) -> None:
+    """
+    Computes the finest spectrogram of an audio file (downmixed to mono) into
+    a uint8 .npy file of shape (columns, FREQ_BINS), one block at a time.
+
+    Frames are centered on multiples of HOP_SIZE, the signal being padded
+    with silence at both ends.
+    """
+    info = sf.info(source_path)
+    columns = -(-info.frames // HOP_SIZE)
+    window = np.hanning(FFT_SIZE + 1)[:-1].astype(np.float32)  # Periodic Hann
+    scale = np.float32(2.0 / window.sum())
+    output = np.lib.format.open_memmap(base_path, mode="w+", dtype=np.uint8, shape=(columns, FREQ_BINS))
+
+    carry = np.zeros(FFT_SIZE // 2, dtype=np.float32)
+    written = 0
+
+    def emit(buffer: np.ndarray) -> np.ndarray:
+        nonlocal written
+        count = min((len(buffer) - FFT_SIZE) // HOP_SIZE + 1 if len(buffer) >= FFT_SIZE else 0, columns - written)
+        if count > 0:
+            frames = sliding_window_view(buffer, FFT_SIZE)[::HOP_SIZE][:count]
+            magnitude = np.abs(np.fft.rfft(frames * window, axis=1)[:, :FREQ_BINS]).astype(np.float32) * scale
+            db = 20.0 * np.log10(np.maximum(magnitude, 1e-10))
+            output[written:written + count] = np.clip((db - DB_FLOOR) * (255.0 / -DB_FLOOR), 0, 255).astype(np.uint8)
+            written += count
+        return buffer[max(0, count) * HOP_SIZE:]
+
+    for block in file_blocks(source_path, block_frames=block_frames):
+        carry = emit(np.concatenate([carry, block.mean(axis=1)]))
+    # Trailing silence completes the frames centered near the end
+    while written < columns:
+        carry = emit(np.concatenate([carry, np.zeros(FFT_SIZE, dtype=np.float32)]))
+    output.flush()
+    del output
+
+
+def render_tile(base_path: str, time_level: int, freq_level: int, x: int, y: int) -> Optional[np.ndarray]:
+    """
+    Cuts one tile out of a spectrogram written by build_spectrogram.
+
+    Args:
+        base_path: The .npy file
+        time_level: Time zoom level (0 is the finest, one column per hop)
+        freq_level: Frequency zoom level (0 is the finest, FREQ_BINS bins)
+        x: Tile column (time)
+        y: Tile row (frequency, 0 holding the lowest frequencies)
+
+    Returns:
+        uint8 image of TILE_SIZE x TILE_SIZE, higher frequencies at the top and
+        columns past the end left black; None if the tile does not exist
+    """
+    base = np.load(base_path, mmap_mode="r")
+    columns = len(base)
+    if not (0 <= time_level < time_levels(columns) and 0 <= freq_level < FREQ_LEVELS):
+        return None
+    time_factor = 2 ** time_level
+    freq_factor = 2 ** freq_level
+    if x < 0 or x * TILE_SIZE >= -(-columns // time_factor) or not 0 <= y < FREQ_BINS // freq_factor // TILE_SIZE:
+        return None
+
+    start = x * TILE_SIZE * time_factor
+    region = np.asarray(base[start:start + TILE_SIZE * time_factor])
+    pooled_columns = -(-len(region) // time_factor)
+    if len(region) % time_factor:
+        region = np.concatenate([region, np.zeros((pooled_columns * time_factor - len(region), FREQ_BINS), dtype=np.uint8)])
+    # Max-pooling keeps narrow peaks (e.g. leakage) visible when zoomed out
+    region = region.reshape(pooled_columns, time_factor, FREQ_BINS).max(axis=1)
+    region = region.reshape(pooled_columns, FREQ_BINS // freq_factor, freq_factor).max(axis=2)
+
+    tile = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    tile[:, :pooled_columns] = region[:, y * TILE_SIZE:(y + 1) * TILE_SIZE].T
+    return tile[::-1]
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encodes a 2D uint8 array as an 8-bit grayscale PNG."""
+    height, width = image.shape
+    rows = np.empty((height, width + 1), dtype=np.uint8)
+    rows[:, 0] = 0  # No filter
+    rows[:, 1:] = image
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
@@ -0,0 +1,35 @@
+"""
+Serialized, atomic writes of per-project state files (metadata.json).
+A write goes to a temporary file that is moved into place, so readers never
+see a partial file; read-modify-write cycles hold the project's lock so
+concurrent updates are not lost.
+"""
+import os
+import json
+import threading
+from typing import Any, Dict
+
+_locks: Dict[str, threading.RLock] = {}
+_locks_guard = threading.Lock()
+
+
+def project_lock(folder: str) -> threading.RLock:
+    """Returns the lock serializing state updates of the project in `folder`."""
+    key = os.path.realpath(folder)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.RLock()
+        return lock
+
+
+def write_json(path: str, data: Any, **dump_options: Any) -> None:
+    """Writes `data` as JSON to `path` atomically (json.dump options are passed through)."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_options)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,186 @@
+"""
+ZIP archives generated on the fly.
+The archive is written to an unseekable buffer that is drained after every
+chunk, so a response can send it while later files are still being read and
+no temporary archive is written. Finished archives can be kept in a small
+on-disk cache keyed by the files they contain.
+"""
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ZIP_CHUNK_BYTES = 1024 * 1024
+
+# Already compressed formats are stored as-is; deflating them costs CPU for almost no gain
+COMPRESSED_EXTENSIONS = {".flac", ".mp3", ".ogg", ".opus", ".m4a", ".aac", ".zip", ".png", ".jpg", ".jpeg"}
+
+
+class _StreamBuffer:
+    """Write-only sink for ZipFile; has no tell/seek, so ZipFile writes data descriptors."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(entries: Iterable[Tuple[str, str]], chunk_bytes: int = ZIP_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Generates a ZIP archive of `entries`.
+
+    Compressed audio is stored, everything else deflated; zip64 records are
+    used where sizes require them.
+
+    Args:
+        entries: (path, name in the archive) pairs
+        chunk_bytes: Read size per file chunk
+
+    Yields:
+        Consecutive bytes of the archive
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", allowZip64=True, strict_timestamps=False) as zf:
+        for path, arcname in entries:
+            # from_file records the size up front, which decides whether the entry needs zip64
+            info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+            extension = os.path.splitext(arcname)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if extension in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, "w") as dst:
+                while True:
+                    chunk = src.read(chunk_bytes)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+class ArchiveCache:
+    """
+    Finished archives on disk, keyed by the name, size and mtime of every file
+    they contain, evicted least-recently-used once their total size exceeds
+    the budget.
+    """
+
+    def __init__(self, folder: str, max_bytes: int):
+        """
+        Args:
+            folder: Folder holding the cached archives
+            max_bytes: Total size of cached archives (0 disables the cache)
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if self.max_bytes > 0:
+            os.makedirs(self.folder, exist_ok=True)
+            self._clear_partial()
+
+    @staticmethod
+    def key(entries: Iterable[Tuple[str, str]]) -> str:
+        """Returns the cache key of an archive of `entries`."""
+        digest = hashlib.sha256()
+        for path, arcname in entries:
+            stat = os.stat(path)
+            digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.zip")
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the path of the cached archive, if any, and marks it recently used."""
+        if self.max_bytes <= 0:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def tee(self, key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """
+        Passes an archive's chunks through and stores the archive once it has
+        been generated completely. Archives larger than the budget are not kept.
+        """
+        if self.max_bytes <= 0:
+            yield from chunks
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".part")
+        f = os.fdopen(fd, "wb")
+        size = 0
+        complete = False
+        try:
+            for chunk in chunks:
+                if f is not None:
+                    size += len(chunk)
+                    if size <= self.max_bytes:
+                        f.write(chunk)
+                    else:
+                        f.close()
+                        f = None
+                yield chunk
+            complete = f is not None
+        finally:
+            if f is not None:
+                f.close()
+            if complete:
+                os.replace(temp_path, self._path(key))
+                self._evict()
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _evict(self) -> None:
+        with self._lock:
+            archives = []
+            for name in os.listdir(self.folder):
+                if not name.endswith(".zip"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                archives.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in archives)
+            for _, size, name in sorted(archives):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                    total -= size
+                    logger.info(f"Evicted cached archive {name}")
+                except OSError:
+                    pass
+
+    def _clear_partial(self) -> None:
+        """Removes archives left half-written by an interrupted process."""
+        cutoff = time.time() - 3600
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                if name.endswith(".part") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,71 @@
+"""
+Check that the residual of a 4-stem split is near silent for a loud input.
+
+The input is scaled to a peak of --peak (default 0 dBFS), so the stems come out
+loud enough to be peak normalized, then htdemucs_4s and residual_htdemucs are
+run and the residual's level is reported relative to the input. A level above
+--max-db means the derived stems do not line up with the original.
+
+Usage:
+    python verify_residual.py song.flac
+    python verify_residual.py song.flac --chunk-seconds 60 --max-db -25
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import soundfile as sf
+import static_ffmpeg
+
+from AudioProcessor import AudioProcessor, DERIVED_SAMPLE_RATE
+from modules import get_module
+from utils.pcm import PcmStore
+
+
+def rms_db(audio: np.ndarray) -> float:
+    """RMS level of an array in dBFS."""
+    rms = float(np.sqrt(np.mean(np.square(audio, dtype=np.float64))))
+    return 20 * np.log10(max(rms, 1e-10))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Audio file to separate")
+    parser.add_argument("--peak", type=float, default=1.0, help="Peak the input is scaled to before separating")
+    parser.add_argument("--chunk-seconds", type=float, default=0.0, help="Separate in chunks of this length (0 runs a single pass)")
+    parser.add_argument("--max-db", type=float, default=-30.0, help="Highest residual level accepted, relative to the input")
+    args = parser.parse_args()
+
+    static_ffmpeg.add_paths()
+    work_dir = tempfile.mkdtemp(prefix="residual-check-")
+    pcm_store = PcmStore(os.path.join(work_dir, ".cache", "pcm"))
+    try:
+        mix = np.array(pcm_store.open(os.path.abspath(args.input), DERIVED_SAMPLE_RATE))
+        input_path = os.path.join(work_dir, "input.wav")
+        sf.write(input_path, mix * np.float32(args.peak / max(float(np.max(np.abs(mix))), 1e-9)), DERIVED_SAMPLE_RATE, subtype="FLOAT")
+        original = np.array(pcm_store.open(input_path, DERIVED_SAMPLE_RATE))
+
+        processor = AudioProcessor(chunk_seconds=args.chunk_seconds)
+        processor.execute_module("htdemucs_4s", input_path, work_dir, pcm_store=pcm_store)
+        outputs = processor.execute_module("residual_htdemucs", input_path, work_dir, pcm_store=pcm_store)
+        residual, _ = sf.read(outputs["Residual"], dtype="float32", always_2d=True)
+
+        gains = processor.get_stem_gains(work_dir, get_module("residual_htdemucs")["depends_on"])
+        level = rms_db(residual) - rms_db(original)
+        print(f"Stem gains: {gains}")
+        print(f"Input: {rms_db(original):.1f} dBFS  Residual: {rms_db(residual):.1f} dBFS ({level:+.1f} dB)")
+    finally:
+        pcm_store.clear()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if level > args.max_db:
+        print(f"FAIL: residual is above {args.max_db:.1f} dB")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Worker-process entry points for running separations outside the API process.
+Each worker process owns one AudioProcessor (and thus its own model cache),
+created once by the pool initializer.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from modules import DEFAULT_PRESET
+from utils.pcm import PcmStore, PCM_CHANNELS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_processor = None
+
+
+def init_worker(
+    output_format: str,
+    model_cache_bytes: int,
+    torch_threads: Optional[int] = None,
+    result_cache_config: Optional[Dict[str, Any]] = None,
+    intermediate_mode: str = "raw",
+    flac_compression_level: int = 5,
+    chunk_seconds: float = 0.0
+) -> None:
+    """
+    Pool initializer: creates the per-process AudioProcessor.
+
+    Args:
+        output_format: Output format for separated audio
+        model_cache_bytes: Memory budget for models resident in this worker
+        torch_threads: Intra-op thread count for torch in this worker (None keeps the default)
+        result_cache_config: ResultCache constructor arguments (None disables result caching)
+        intermediate_mode: Stem hand-over mode ("memory" is not shared across processes, use "raw")
+        flac_compression_level: FLAC compression level for stems written by this worker
+        chunk_seconds: Inputs longer than this are separated in chunks (0 disables chunking)
+    """
+    global _processor
+    import static_ffmpeg
+    static_ffmpeg.add_paths()
+
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+    from AudioProcessor import AudioProcessor
+    from ResultCache import ResultCache
+    from StemEncoder import StemEncoder
+    result_cache = ResultCache(**result_cache_config) if result_cache_config else None
+    _processor = AudioProcessor(
+        output_format=output_format,
+        model_cache_bytes=model_cache_bytes,
+        result_cache=result_cache,
+        intermediate_mode=intermediate_mode,
+        encoder=StemEncoder(max_workers=1, compression_level=flac_compression_level),
+        chunk_seconds=chunk_seconds
+    )
+
+
+def _progress_callback(progress_queue: Any, key: str):
+    """Builds an interceptor callback that forwards messages to the parent process."""
+    if progress_queue is None:
+        return None
+
+    def callback(message: str, event_type: str = "processing"):
+        progress_queue.put((key, message, event_type))
+    return callback
+
+
+def run_module_task(
+    module_name: str,
+    input_path: str,
+    output_dir: str,
+    progress_queue: Any = None,
+    cache_key: Optional[str] = None,
+    pcm_folder: Optional[str] = None,
+    preset: str = DEFAULT_PRESET
+) -> Dict[str, str]:
+    """
+    Runs a single module in this worker process.
+    Decoded inputs are shared with the other workers through the project's PCM folder.
+
+    Returns:
+        Mapping of stem_key -> output_filepath
+    """
+    if _processor is None:
+        raise RuntimeError("Worker process was not initialized")
+    return _processor.execute_module(
+        module_name=module_name,
+        input_path=input_path,
+        output_dir=output_dir,
+        interceptor_callback=_progress_callback(progress_queue, module_name),
+        cache_key=cache_key,
+        pcm_store=PcmStore(pcm_folder) if pcm_folder else None,
+        preset=preset,
+    )
+
+
+def separate_segment_task(
+    module_name: str,
+    input_path: str,
+    pcm_path: str,
+    frames: int,
+    start: int,
+    end: int,
+    gain: float = 1.0,
+    preset: str = DEFAULT_PRESET
+) -> Dict[str, np.ndarray]:
+    """
+    Separates frames [start, end) of a raw PCM input in this worker process.
+
+    Returns:
+        Mapping of output filename -> float32 stem array of shape (samples, channels)
+    """
+    if _processor is None:
+        raise RuntimeError("Worker process was not initialized")
+    mix = np.memmap(pcm_path, dtype=np.float32, mode="r", shape=(frames, PCM_CHANNELS))
+    window = np.asarray(mix[start:end], dtype=np.float32) * np.float32(gain)
+    return _processor.separate_window(module_name, window, input_path, preset=preset)
@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from 'react'
 import { Routes, Route, Navigate, useNavigate, useParams } from 'react-router-dom'
-import { getHistory, unifyStems } from './services/api'
+import { getHistoryPage, getHistoryEntry, unifyStems } from './services/api'
 import './App.css'
 
 // Components
@@ -13,6 +13,9 @@ import SettingsView from './components/SettingsView/SettingsView'
 import NotFound from './components/NotFound'
 import { ContextMenuProvider } from './components/ContextMenu/ContextMenuProvider'
 
+// Tracks fetched per page of the library view
+const LIBRARY_PAGE_SIZE = 60
+
 // Wrapper for EditorView to handle ID from params
 const EditorRoute = ({ library, onUnify, isLoading }) => {
   const { id } = useParams()
@@ -21,20 +24,25 @@ const EditorRoute = ({ library, onUnify, isLoading }) => {
   const [notFound, setNotFound] = useState(false)
 
   useEffect(() => {
-    if (!isLoading) {
-      if (library.length > 0) {
-        const found = library.find(t => t.id === id)
-        if (found) {
-          setTrack(found)
-          setNotFound(false)
-        } else {
-          setNotFound(true)
-        }
-      } else if (library.length === 0) {
-        // Library is empty after loading, so definitely not found
-        setNotFound(true)
-      }
+    if (isLoading) return
+    const found = library.find(t => t.id === id)
+    if (found) {
+      setTrack(found)
+      setNotFound(false)
+      return
     }
+    // Not on a loaded page of the library: look the track up directly
+    let cancelled = false
+    getHistoryEntry(id)
+      .then(entry => {
+        if (cancelled) return
+        setTrack(entry)
+        setNotFound(false)
+      })
+      .catch(() => {
+        if (!cancelled) setNotFound(true)
+      })
+    return () => { cancelled = true }
   }, [id, library, isLoading])
 
   if (isLoading) return <div className="loader"></div>
@@ -47,13 +55,20 @@ const EditorRoute = ({ library, onUnify, isLoading }) => {
 function App() {
   const [library, setLibrary] = useState([])
   const [loading, setLoading] = useState(true)
+  const [libraryQuery, setLibraryQuery] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [libraryTotal, setLibraryTotal] = useState(0)
 
-  const refreshLibrary = async () => {
+  // Reloads the first page of the library (name: optional name prefix filter)
+  const refreshLibrary = async (name = libraryQuery) => {
     try {
-      const data = await getHistory()
-      setLibrary(data)
+      const page = await getHistoryPage({ limit: LIBRARY_PAGE_SIZE, ...(name ? { name } : {}) })
+      setLibraryQuery(name)
+      setLibrary(page.items)
+      setNextCursor(page.nextCursor)
+      setLibraryTotal(page.total)
       setLoading(false)
-      return data
+      return page.items
     } catch (err) {
       console.error("Failed to load library", err)
       setLoading(false)
@@ -61,6 +76,22 @@ function App() {
     }
   }
 
+  const loadMoreLibrary = async () => {
+    if (!nextCursor) return
+    try {
+      const page = await getHistoryPage({
+        limit: LIBRARY_PAGE_SIZE,
+        cursor: nextCursor,
+        ...(libraryQuery ? { name: libraryQuery } : {})
+      })
+      setLibrary(prev => [...prev, ...page.items])
+      setNextCursor(page.nextCursor)
+      setLibraryTotal(page.total)
+    } catch (err) {
+      console.error("Failed to load more of the library", err)
+    }
+  }
+
   useEffect(() => {
     refreshLibrary()
   }, []) // Initial load
@@ -87,10 +118,17 @@ function App() {
         <main className="main-content">
           <Routes>
             <Route path="/" element={<Navigate to="/split" replace />} />
-            <Route path="/split" element={<UploadView onUploadSuccess={refreshLibrary} />} />
+            <Route path="/split" element={<UploadView onUploadSuccess={() => refreshLibrary()} />} />
             {/* Note: UploadView onSuccess handling needs improvement to use useNavigate from within or pass navigate */}
 
-            <Route path="/library" element={<LibraryView items={library} refresh={refreshLibrary} />} />
+            <Route path="/library" element={<LibraryView
+              items={library}
+              total={libraryTotal}
+              query={libraryQuery}
+              hasMore={!!nextCursor}
+              onLoadMore={loadMoreLibrary}
+              onSearch={refreshLibrary}
+            />} />
             <Route path="/library/:id" element={<EditorRoute library={library} onUnify={handleUnify} isLoading={loading} />} />
             <Route path="/models" element={<ModelsView />} />
             <Route path="/settings" element={<SettingsView />} />
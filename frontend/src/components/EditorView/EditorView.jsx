@@ -4,6 +4,7 @@ import StemRow from './StemRow';
 import StemBrowser from './StemBrowser';
 import { useAudioPlayer } from '../../hooks/useAudioPlayer';
 import { useProjectData } from '../../hooks/useProjectData';
+import { downloadStem } from '../../services/api';
 import './EditorView.css';
 
 import { ArrowLeftIcon } from '../common/Icons';
@@ -24,8 +25,7 @@ const EditorView = ({ track, onBack }) => {
 
     const {
         activeStemIds,
-        audioUrls,
-        loadingStems,
+        loadAudio,
         addToPlayer,
         removeFromPlayer,
         loadNewStems
@@ -106,13 +106,17 @@ const EditorView = ({ track, onBack }) => {
         });
     };
 
-    const handleDownloadStem = (stem) => {
-        const url = audioUrls[stem];
-        if (url) {
+    const handleDownloadStem = async (stem) => {
+        // The player may hold a low-bitrate proxy; downloads always use the lossless stem
+        try {
+            const url = URL.createObjectURL(await downloadStem(track.id, stem));
             const a = document.createElement('a');
             a.href = url;
             a.download = stem;
             a.click();
+            setTimeout(() => URL.revokeObjectURL(url), 0);
+        } catch (e) {
+            console.error("Error downloading stem", stem, e);
         }
     };
 
@@ -219,7 +223,8 @@ const EditorView = ({ track, onBack }) => {
                                     displayName={stem === track.original ? track.name : null}
                                     visible={activeStemIds.includes(stem)}
                                     sState={stemState[stem] || { vol: 0.5, muted: false, solo: false, locked: false }}
-                                    audioUrl={audioUrls[stem]}
+                                    trackId={track.id}
+                                    loadAudio={loadAudio}
                                     onUpdate={(key, val) => updateStem(stem, key, val)}
                                     onRemove={removeFromPlayer}
                                     onDownload={handleDownloadStem}
@@ -3,9 +3,13 @@ import WaveSurfer from 'wavesurfer.js';
 import './EditorView.css';
 import { useContextMenu } from '../ContextMenu/ContextMenuProvider';
 import getStemIcon from '../utils/getStemIcon';
+import { getPeaks } from '../../services/api';
 
 import { MuteIcon, VolumeIcon, SoloIcon, DownloadIcon, LockIcon, UnlockIcon, MoreHorizontalIcon as MoreIcon, XIcon } from '../common/Icons';
 
+// Fewest peaks requested per waveform (more on wide or high-DPI rows)
+const MIN_PEAKS = 2000;
+
 // Custom Slider Component (Horizontal/Vertical)
 const Slider = ({ value, min, max, onChange, orientation = 'horizontal', label, disabled }) => {
     const barRef = useRef(null);
@@ -95,7 +99,8 @@ const StemRow = ({
     stem,
     displayName,
     sState = { vol: 0.5, muted: false, solo: false, locked: false },
-    audioUrl,
+    trackId,
+    loadAudio,
     onUpdate,
     onRemove,
     onDownload,
@@ -111,6 +116,9 @@ const StemRow = ({
     const nameToShow = displayName || stem;
     const containerRef = useRef(null);
     const wsRef = useRef(null);
+    const playbackRef = useRef(null); // Loads the audio behind the drawn waveform (null once loaded or if drawn from the audio)
+    const visibleRef = useRef(visible);
+    visibleRef.current = visible;
     const [isReady, setIsReady] = useState(false);
     const stemNameRef = useRef(null);
     const [shouldScroll, setShouldScroll] = useState(false);
@@ -178,7 +186,7 @@ const StemRow = ({
     }, [stem, isReady, visible]); // Check when stem, waveform ready state, or visibility changes
 
     useEffect(() => {
-        if (!audioUrl || !containerRef.current || !audioContext) return;
+        if (!trackId || !containerRef.current || !audioContext) return;
 
         const abortController = new AbortController();
         let ws = null;
@@ -187,6 +195,16 @@ const StemRow = ({
             try {
                 if (abortController.signal.aborted) return;
 
+                // Draw from the precomputed peaks; the audio is fetched on first play
+                let waveform = null;
+                try {
+                    const width = Math.ceil((containerRef.current?.clientWidth || 0) * (window.devicePixelRatio || 1));
+                    waveform = await getPeaks(trackId, stem, { width: Math.max(MIN_PEAKS, width) });
+                } catch (e) {
+                    console.warn('No peaks for', stem, '- decoding the audio instead', e);
+                }
+                if (abortController.signal.aborted) return;
+
                 ws = WaveSurfer.create({
                     container: containerRef.current,
                     waveColor: getComputedStyle(document.documentElement).getPropertyValue('--accent').trim(),
@@ -205,13 +223,25 @@ const StemRow = ({
 
                 wsRef.current = ws;
 
+                // Loads the audio behind the drawn waveform, once
+                let audioLoaded = null;
+                const loadPlayback = () => {
+                    if (!audioLoaded) {
+                        audioLoaded = loadAudio(stem).then(url => ws.load(url, waveform.peaks, waveform.duration));
+                        audioLoaded.then(() => { playbackRef.current = null; }, () => { audioLoaded = null; });
+                    }
+                    return audioLoaded;
+                };
+                playbackRef.current = waveform ? loadPlayback : null;
+
                 // Set up event listeners BEFORE loading
-                ws.on('ready', () => {
+                ws.once('ready', () => {
                     if (abortController.signal.aborted) return;
 
                     setIsReady(true);
                     ws.setVolume(sState?.muted ? 0 : (sState?.vol ?? 0.5));
-                    registerWaveSurfer(stem, ws);
+                    // Only stems on the player stage are fetched when playback starts
+                    registerWaveSurfer(stem, ws, waveform ? () => visibleRef.current && loadPlayback() : null);
                 });
 
                 ws.on('error', (err) => {
@@ -220,8 +250,14 @@ const StemRow = ({
                     console.error('WaveSurfer error:', stem, err);
                 });
 
-                // Load the audio URL directly (it's already a blob URL from EditorView)
-                await ws.load(audioUrl).catch((e) => { if (e.name !== 'AbortError') console.error('WaveSurfer load error:', stem, e); });
+                if (waveform) {
+                    await ws.load('', waveform.peaks, waveform.duration);
+                } else {
+                    // No peaks (e.g. a stem not computed yet): fetch and decode the audio now
+                    const url = await loadAudio(stem);
+                    if (abortController.signal.aborted) return;
+                    await ws.load(url).catch((e) => { if (e.name !== 'AbortError') console.error('WaveSurfer load error:', stem, e); });
+                }
 
                 // Check if we were aborted during loading
                 if (abortController.signal.aborted) {
@@ -264,12 +300,25 @@ const StemRow = ({
             }, 0);
 
             wsRef.current = null;
+            playbackRef.current = null;
             setIsReady(false);
 
             // 3. Update parent state
             registerWaveSurfer(stem, null);
         };
-    }, [audioUrl, stem, audioContext]);
+    }, [trackId, stem, audioContext]);
+
+    // A stem added to the player during playback fetches its audio and joins in
+    useEffect(() => {
+        if (!visible || !isPlaying || !isReady || !playbackRef.current) return;
+        playbackRef.current()
+            .then(() => {
+                if (!wsRef.current) return;
+                wsRef.current.setTime(currentTime);
+                wsRef.current.play();
+            })
+            .catch((e) => console.error('Error loading audio for playback', stem, e));
+    }, [visible, isPlaying, isReady]);
 
     // Handle Volume Updates from Parent (effective volume includes solo/mute/main logic)
     useEffect(() => {
@@ -1,14 +1,30 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import TrackCard from './TrackCard';
 import './LibraryView.css';
 
-const LibraryView = ({ items, refresh }) => {
-    const [search, setSearch] = useState('');
+// Delay before a search is sent to the server
+const SEARCH_DEBOUNCE_MS = 250;
 
-    const filteredItems = items.filter(item =>
-        item.name.toLowerCase().includes(search.toLowerCase())
-    );
+const LibraryView = ({ items, total, query, hasMore, onLoadMore, onSearch }) => {
+    const [search, setSearch] = useState(query);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    // Search runs on the server (name prefix), so it covers pages not loaded yet
+    useEffect(() => {
+        if (search.trim() === query) return;
+        const timer = setTimeout(() => onSearch(search.trim()), SEARCH_DEBOUNCE_MS);
+        return () => clearTimeout(timer);
+    }, [search]); // eslint-disable-line react-hooks/exhaustive-deps
+
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            await onLoadMore();
+        } finally {
+            setLoadingMore(false);
+        }
+    };
 
     return (
         <div className="library-view fade-in">
@@ -19,7 +35,7 @@ const LibraryView = ({ items, refresh }) => {
                         <span className="search-icon">🔍</span>
                         <input
                             type="search"
-                            placeholder="Search tracks..."
+                            placeholder="Search tracks by name..."
                             value={search}
                             onChange={(e) => setSearch(e.target.value)}
                             className="search-input"
@@ -30,17 +46,24 @@ const LibraryView = ({ items, refresh }) => {
 
             <div className="library-grid-container">
                 <div className="library-grid">
-                    {filteredItems.map(item => (
+                    {items.map(item => (
                         <Link to={`/library/${item.id}`} key={item.id} style={{ textDecoration: 'none' }}>
                             <TrackCard item={item} />
                         </Link>
                     ))}
-                    {filteredItems.length === 0 && (
+                    {items.length === 0 && (
                         <div className="empty-state">
                             <p>No tracks found.</p>
                         </div>
                     )}
                 </div>
+                {hasMore && (
+                    <div className="library-load-more">
+                        <button className="btn btn-secondary" onClick={handleLoadMore} disabled={loadingMore}>
+                            {loadingMore ? 'Loading...' : `Load more (${items.length} of ${total})`}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     );
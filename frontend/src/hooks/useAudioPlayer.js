@@ -1,5 +1,10 @@
 import { useState, useRef, useEffect, useCallback } from 'react';
 
+// Stems drawn from peaks have no audio until they are played on the stage
+const play = (ws) => {
+    if (ws.getMediaElement()?.src) ws.play();
+};
+
 export const useAudioPlayer = () => {
     const [isPlaying, setIsPlaying] = useState(false);
     const [currentTime, setCurrentTime] = useState(0);
@@ -8,6 +13,7 @@ export const useAudioPlayer = () => {
 
     // Refs
     const wsRefs = useRef({}); // Map: stemId -> WaveSurfer instance
+    const audioLoaders = useRef({}); // Map: stemId -> function loading its audio (waveforms are drawn from peaks first)
     const isScrubbingRef = useRef(false);
     const sliderRef = useRef(false);
 
@@ -39,9 +45,10 @@ export const useAudioPlayer = () => {
         return () => cancelAnimationFrame(animationFrame);
     }, [isPlaying]);
 
-    const registerWaveSurfer = useCallback((id, ws) => {
+    const registerWaveSurfer = useCallback((id, ws, loadAudio) => {
         if (ws) {
             wsRefs.current[id] = ws;
+            audioLoaders.current[id] = loadAudio;
             // Sync new instance to global state
             ws.setVolume(mainVolume); // This might need to be per-stem masked by solo/mute logic, but base volume is main
             ws.setTime(currentTime);
@@ -57,19 +64,28 @@ export const useAudioPlayer = () => {
             });
         } else {
             delete wsRefs.current[id];
+            delete audioLoaders.current[id];
         }
     }, [currentTime, mainVolume, duration]);
 
-    const togglePlay = useCallback(() => {
-        setIsPlaying(prev => {
-            const next = !prev;
-            Object.values(wsRefs.current).forEach(ws => {
-                if (next) ws.play();
-                else ws.pause();
-            });
-            return next;
+    const togglePlay = useCallback(async () => {
+        const next = !isPlaying;
+        if (next) {
+            // Fetch the audio of stems that have only been drawn so far, then resync them
+            try {
+                await Promise.all(Object.values(audioLoaders.current).map(load => load?.()));
+            } catch (e) {
+                console.error('Error loading audio for playback', e);
+                return;
+            }
+            Object.values(wsRefs.current).forEach(ws => ws.setTime(currentTime));
+        }
+        Object.values(wsRefs.current).forEach(ws => {
+            if (next) play(ws);
+            else ws.pause();
         });
-    }, []);
+        setIsPlaying(next);
+    }, [isPlaying, currentTime]);
 
     const seek = useCallback((time) => {
         setCurrentTime(time);
@@ -92,7 +108,7 @@ export const useAudioPlayer = () => {
     // When isPlaying changes, ensure sync
     useEffect(() => {
         Object.values(wsRefs.current).forEach(ws => {
-            if (isPlaying) ws.play();
+            if (isPlaying) play(ws);
             else ws.pause();
         });
     }, [isPlaying]);
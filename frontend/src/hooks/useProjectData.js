@@ -1,49 +1,65 @@
-import { useState, useEffect, useCallback } from 'react';
-import { getProjectStatus, downloadStem } from '../services/api';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { getProjectStatus, downloadPlaybackStem } from '../services/api';
 
 export const useProjectData = (track) => {
     // track object comes from parent (App or Router loader), but we might want to refresh it?
     // Actually EditorView receives `track` prop.
     // This hook will manage the "Active Stems" and "Audio URLs" (blobs).
+    // Waveforms are drawn from precomputed peaks, so audio is only fetched when a stem is played.
 
     const [activeStemIds, setActiveStemIds] = useState([]);
     const [audioUrls, setAudioUrls] = useState({});
     const [loadingStems, setLoadingStems] = useState({});
+    const versionsRef = useRef({});
+    const pendingRef = useRef({}); // Map: stem -> Promise of its blob URL
+
+    // Versioned URLs are served from the browser cache when the project is reopened
+    const refreshVersions = useCallback(async () => {
+        if (!track?.id) return;
+        try {
+            versionsRef.current = (await getProjectStatus(track.id)).versions || {};
+        } catch (e) {
+            console.error("Error loading stem versions", e);
+        }
+    }, [track?.id]);
 
     // Initial Load
     useEffect(() => {
         // Reset state when track changes
         setActiveStemIds([]);
         setAudioUrls({});
+        versionsRef.current = {};
+        pendingRef.current = {};
 
         if (!track) return;
-
-        const loadAll = async () => {
-            const allFiles = [...track.stems];
-            if (track.original) allFiles.push(track.original);
-
-            // We load blobs for ALL files initially? The original code did.
-            // This might be heavy for large projects, but let's replicate logic for now.
-            for (const s of allFiles) {
-                setLoadingStems(prev => ({ ...prev, [s]: true }));
-                try {
-                    const blob = await downloadStem(track.id, s);
-                    setAudioUrls(prev => ({ ...prev, [s]: URL.createObjectURL(blob) }));
-                } catch (e) {
-                    console.error("Error loading stem", s, e);
-                } finally {
-                    setLoadingStems(prev => ({ ...prev, [s]: false }));
-                }
-            }
-        };
-        loadAll();
+        refreshVersions();
 
         return () => {
             // Cleanup Blobs
-            Object.values(audioUrls).forEach(u => URL.revokeObjectURL(u));
+            Object.values(pendingRef.current).forEach(p => p.then(u => URL.revokeObjectURL(u), () => { }));
         };
     }, [track?.id]); // Only reload if ID changes
 
+    // Fetches a stem's playback audio once; later calls share the same request
+    const loadAudio = useCallback((stem) => {
+        if (!pendingRef.current[stem]) {
+            setLoadingStems(prev => ({ ...prev, [stem]: true }));
+            pendingRef.current[stem] = downloadPlaybackStem(track.id, stem, versionsRef.current[stem])
+                .then((blob) => {
+                    const url = URL.createObjectURL(blob);
+                    setAudioUrls(prev => ({ ...prev, [stem]: url }));
+                    return url;
+                })
+                .catch((e) => {
+                    delete pendingRef.current[stem];
+                    console.error("Error loading stem", stem, e);
+                    throw e;
+                })
+                .finally(() => setLoadingStems(prev => ({ ...prev, [stem]: false })));
+        }
+        return pendingRef.current[stem];
+    }, [track?.id]);
+
     const addToPlayer = useCallback((stem) => {
         setActiveStemIds(prev => prev.includes(stem) ? prev : [...prev, stem]);
     }, []);
@@ -52,27 +68,16 @@ export const useProjectData = (track) => {
         setActiveStemIds(prev => prev.filter(id => id !== stem));
     }, []);
 
-    const loadNewStems = useCallback(async (newStemsList) => {
-        // filter already loaded
-        const unique = newStemsList.filter(s => !audioUrls[s]);
-
-        for (const s of unique) {
-            setLoadingStems(prev => ({ ...prev, [s]: true }));
-            try {
-                const blob = await downloadStem(track.id, s);
-                setAudioUrls(prev => ({ ...prev, [s]: URL.createObjectURL(blob) }));
-            } catch (e) {
-                console.error("Error loading new stem", s, e);
-            } finally {
-                setLoadingStems(prev => ({ ...prev, [s]: false }));
-            }
-        }
-    }, [track?.id, audioUrls]);
+    // New stems are fetched on first play like the others; only their versions are needed now
+    const loadNewStems = useCallback(async () => {
+        await refreshVersions();
+    }, [refreshVersions]);
 
     return {
         activeStemIds,
         audioUrls,
         loadingStems,
+        loadAudio,
         addToPlayer,
         removeFromPlayer,
         loadNewStems
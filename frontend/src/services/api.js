@@ -58,46 +58,180 @@ export const getModules = async () => {
 };
 
 /**
- * Download a specific stem audio file as a blob
+ * Download a specific stem audio file as a blob.
+ * Stems listed in a track's `available_stems` but not computed yet are
+ * computed first (the server answers 202 with a job), then downloaded.
  * @param {string} trackId - The track ID
  * @param {string} stemName - The stem name/filename
+ * @param {string} [version] - The stem's version from getProjectStatus; lets the browser cache it indefinitely
  * @returns {Promise<Blob>} The audio file blob
  */
-export const downloadStem = async (trackId, stemName) => {
+export const downloadStem = async (trackId, stemName, version) => {
     const response = await axios.get(`${API_BASE}/download/${trackId}/${stemName}`, {
+        params: version ? { v: version } : undefined,
         responseType: 'blob'
     });
+    if (response.status === 202) {
+        const job = JSON.parse(await response.data.text());
+        await waitForJob(job.job_id);
+        return downloadStem(trackId, stemName);
+    }
+    return response.data;
+};
+
+/**
+ * Download a stem for playback: its low-bitrate proxy when one has been
+ * encoded, else the lossless file. Use downloadStem for saving/exporting.
+ * @param {string} trackId - The track ID
+ * @param {string} stemName - The stem name/filename
+ * @param {string} [version] - The stem's version from getProjectStatus; lets the browser cache it indefinitely
+ * @returns {Promise<Blob>} The audio file blob
+ */
+export const downloadPlaybackStem = async (trackId, stemName, version) => {
+    try {
+        const response = await axios.get(`${API_BASE}/proxy/${trackId}/${stemName}`, {
+            params: version ? { v: version } : undefined,
+            responseType: 'blob'
+        });
+        return response.data;
+    } catch (e) {
+        if (e.response?.status === 404) {
+            return downloadStem(trackId, stemName, version);  // Not computed yet (lazy stems)
+        }
+        throw e;
+    }
+};
+
+/**
+ * Get the spectrogram tile pyramid of a stem (levels, tile counts, version)
+ * @param {string} trackId - The track ID
+ * @param {string} stemName - The stem name/filename
+ * @returns {Promise<Object>} Pyramid info
+ */
+export const getSpectrogramInfo = async (trackId, stemName) => {
+    const response = await axios.get(`${API_BASE}/spectrogram/${trackId}/${stemName}`);
+    return response.data;
+};
+
+/**
+ * Build the URL of one spectrogram tile (usable as an image source)
+ * @param {string} trackId - The track ID
+ * @param {string} stemName - The stem name/filename
+ * @param {Object} info - Pyramid info from getSpectrogramInfo (its version makes the tile cacheable)
+ * @param {number} timeLevel - Time zoom level (0 is the finest)
+ * @param {number} freqLevel - Frequency zoom level (0 is the finest)
+ * @param {number} x - Tile column (time)
+ * @param {number} y - Tile row (frequency, 0 is the lowest band)
+ * @returns {string} The tile URL
+ */
+export const getSpectrogramTileUrl = (trackId, stemName, info, timeLevel, freqLevel, x, y) =>
+    `${API_BASE}/spectrogram/${trackId}/${stemName}/${timeLevel}/${freqLevel}/${x}/${y}.png?v=${encodeURIComponent(info.version)}`;
+
+/**
+ * Load several stems as one interleaved multichannel file
+ * @param {string} trackId - The track ID
+ * @param {Array<string>} [stemNames] - Stems in channel order (default: every stem of the track)
+ * @param {string} [format] - 'flac' (up to 8 channels), 'opus' or 'wav' (default: flac, or opus beyond 8 channels)
+ * @returns {Promise<Object>} { channelMap, blob } where channelMap.stems[i].channels are the stem's channel indices
+ */
+export const downloadStemBundle = async (trackId, stemNames = [], format = null) => {
+    const params = new URLSearchParams(format ? { format } : {});
+    stemNames.forEach((name) => params.append('stem', name));
+    const { data: channelMap } = await axios.get(`${API_BASE}/bundle/${trackId}?${params.toString()}`);
+    const response = await axios.get(`${API_BASE}/bundle/${trackId}/${channelMap.file}`, {
+        responseType: 'blob'
+    });
+    return { channelMap, blob: response.data };
+};
+
+/**
+ * Get the waveform peaks of a stem (or a time range of it)
+ * @param {string} trackId - The track ID
+ * @param {string} stemName - The stem name/filename
+ * @param {Object} [options] - { start, end (seconds), width (desired number of peaks), level }
+ * @returns {Promise<Object>} Peaks info with `peaks` (one Float32Array of interleaved min/max per channel, in [-1, 1]) and `duration`, usable as WaveSurfer's `peaks`/`duration`
+ */
+export const getPeaks = async (trackId, stemName, options = {}) => {
+    const response = await axios.get(`${API_BASE}/peaks/${trackId}/${stemName}`, { params: options });
+    const { data, bits, ...info } = response.data;
+    const scale = 2 ** (bits - 1) - 1;
+    return { ...info, peaks: data.map((channel) => Float32Array.from(channel, (v) => v / scale)) };
+};
+
+/**
+ * Get the status of a background processing job
+ * @param {string} jobId - The job ID returned when the job was queued
+ * @returns {Promise<Object>} Job status ({ job_id, status, position?, result?, error? })
+ */
+export const getJob = async (jobId) => {
+    const response = await axios.get(`${API_BASE}/jobs/${jobId}`);
     return response.data;
 };
 
+/**
+ * Poll a background job until it completes
+ * @param {string} jobId - The job ID returned when the job was queued
+ * @param {number} intervalMs - Polling interval in milliseconds
+ * @returns {Promise<Object>} The job result
+ */
+export const waitForJob = async (jobId, intervalMs = 1000) => {
+    while (true) {
+        const job = await getJob(jobId);
+        if (job.status === 'completed') {
+            return job.result;
+        }
+        if (job.status === 'failed') {
+            // Shape the error like an axios error so callers can read err.response.data.error
+            const error = new Error(job.error || 'Processing failed');
+            error.response = { data: { error: job.error } };
+            error.userMessage = job.error;
+            throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+};
+
 /**
  * Upload and process an audio file
  * @param {File} file - The audio file to process
  * @param {Array<string>} modules - Array of module IDs to run (required)
  * @param {string} temp_project_id - Temporary project ID for SSE tracking
- * @returns {Promise<Object>} Response data with track ID
+ * @param {string} [preset] - Speed/quality preset ('draft', 'standard' or 'max')
+ * @param {Object} [preview] - Excerpt to separate first: { start, seconds } in seconds (stems arrive as a 'preview' SSE event)
+ * @returns {Promise<Object>} Job result with track ID (resolves once processing finishes)
  */
-export const processFile = async (file, modules, temp_project_id) => {
+export const processFile = async (file, modules, temp_project_id, preset, preview) => {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('modules', JSON.stringify(modules));
     formData.append('temp_project_id', temp_project_id);
+    if (preset) formData.append('preset', preset);
+    if (preview) {
+        formData.append('preview_start', preview.start);
+        if (preview.seconds) formData.append('preview_seconds', preview.seconds);
+    }
     const response = await axios.post(`${API_BASE}/process`, formData);
-    return response.data;
+    return waitForJob(response.data.job_id);
 };
 
 /**
  * Process audio from a URL (e.g., YouTube)
  * @param {string} url - The URL to process audio from
  * @param {Array<string>} modules - Array of module IDs to run (required)
- * @returns {Promise<Object>} Response data with track ID
+ * @param {string} [preset] - Speed/quality preset ('draft', 'standard' or 'max')
+ * @param {Object} [preview] - Excerpt to separate first: { start, seconds } in seconds (stems arrive as a 'preview' SSE event)
+ * @returns {Promise<Object>} Job result with track ID (resolves once processing finishes)
  */
-export const processUrl = async (url, modules) => {
+export const processUrl = async (url, modules, preset, preview) => {
     url = url.split('&')[0]
     let temp_project_id = url.split('=')
     temp_project_id = temp_project_id[temp_project_id.length - 1]
-    const response = await axios.post(`${API_BASE}/process-url`, { url, modules, temp_project_id });
-    return response.data;
+    const response = await axios.post(`${API_BASE}/process-url`, {
+        url, modules, temp_project_id, preset,
+        preview_start: preview?.start,
+        preview_seconds: preview?.seconds
+    });
+    return waitForJob(response.data.job_id);
 };
 
 /**
@@ -109,20 +243,69 @@ export const getHistory = async () => {
     return response.data;
 };
 
+/**
+ * Get the history entry of one track
+ * @param {string} trackId - The track ID
+ * @returns {Promise<Object>} The track, as in getHistory
+ */
+export const getHistoryEntry = async (trackId) => {
+    const response = await axios.get(`${API_BASE}/history/${trackId}`);
+    return response.data;
+};
+
+/**
+ * Get one page of the history
+ * @param {Object} [params] - sort, order, limit, cursor, name, date_from, date_to, has_module (array)
+ * @returns {Promise<{items: Array, total: number, nextCursor: (string|null)}>}
+ */
+export const getHistoryPage = async (params = {}) => {
+    const response = await axios.get(`${API_BASE}/history`, {
+        params,
+        paramsSerializer: { indexes: null } // has_module=a&has_module=b
+    });
+    return {
+        items: response.data,
+        total: Number(response.headers['x-total-count']),
+        nextCursor: response.headers['x-next-cursor'] || null
+    };
+};
+
 /**
  * Unify selected stems into a single track
  * @param {string} trackId - The track ID
  * @param {Array<string>} stemNames - Array of stem names to unify
+ * @param {Object} [gains] - Optional linear gain per stem name (default 1)
  * @returns {Promise<Object>} Response data
  */
-export const unifyStems = async (trackId, stemNames) => {
+export const unifyStems = async (trackId, stemNames, gains) => {
     const response = await axios.post(`${API_BASE}/unify`, {
         id: trackId,
-        tracks: stemNames
+        tracks: stemNames,
+        gains
     });
     return response.data;
 };
 
+/**
+ * Build the URL of a live mixdown of selected stems (usable as an audio element source)
+ * @param {string} trackId - The track ID
+ * @param {Array<string>} stemNames - Array of stem names to mix
+ * @param {Object} [options] - { gains: Object (linear gain per stem name), format: 'wav'|'flac'|'opus', start: seconds, download: boolean }
+ * @returns {string} The mixdown URL
+ */
+export const getMixdownUrl = (trackId, stemNames, options = {}) => {
+    const { gains = {}, format = 'wav', start = 0, download = false } = options;
+    const params = new URLSearchParams();
+    stemNames.forEach((name) => {
+        params.append('stem', name);
+        params.append('gain', gains[name] ?? 1);
+    });
+    params.append('format', format);
+    if (start) params.append('start', start);
+    if (download) params.append('download', '1');
+    return `${API_BASE}/mixdown/${trackId}?${params.toString()}`;
+};
+
 /**
  * Download all files for a track as a ZIP archive
  * @param {string} trackId - The track ID
@@ -168,11 +351,26 @@ export const deleteTrack = async (trackId) => {
  * Run additional modules on an existing project
  * @param {string} trackId - The track/project ID
  * @param {Array<string>} modules - Array of module IDs to run
- * @returns {Promise<Object>} Response with executed modules and updated stems
+ * @param {string} [preset] - Speed/quality preset ('draft', 'standard' or 'max')
+ * @returns {Promise<Object>} Job result with executed modules and updated stems
  */
-export const runModules = async (trackId, modules) => {
-    const response = await axios.post(`${API_BASE}/project/${trackId}/run-modules`, { modules });
-    return response.data;
+export const runModules = async (trackId, modules, preset) => {
+    const response = await axios.post(`${API_BASE}/project/${trackId}/run-modules`, { modules, preset });
+    return waitForJob(response.data.job_id);
+};
+
+/**
+ * Re-separate a time range of a module and splice it into its existing stems
+ * @param {string} trackId - The track/project ID
+ * @param {string} module - Module ID to re-process
+ * @param {number} start - Start of the range in seconds
+ * @param {number} end - End of the range in seconds
+ * @param {Object} [options] - { preset, padding, cascade }
+ * @returns {Promise<Object>} Job result with updated_stems and stale_modules
+ */
+export const reprocessRegion = async (trackId, module, start, end, options = {}) => {
+    const response = await axios.post(`${API_BASE}/project/${trackId}/reprocess-region`, { module, start, end, ...options });
+    return waitForJob(response.data.job_id);
 };
 
 /**
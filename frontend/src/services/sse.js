@@ -8,6 +8,7 @@ import { SSE_BASE } from './api';
  * - 'module_processing': Module processing { module, status: 'running'|'resolving_dependency', message: '<percentage>|<module_name>' }
  * - 'model_downloading': Model download progress { module, model, status: 'downloading'|'complete', progress: '<percentage>|<message>' }
  * - 'id_changed': Project ID changed { new_id: '<new_project_id>' }
+ * - 'job_status': Background job state { job_id, kind, status: 'queued'|'running'|'completed'|'failed', position? }
  * - 'error': Error occurred { module, status: 'error', message: '<error_message>' }
  * - 'done': Stream completed { message: 'closed' }
  */
@@ -19,6 +20,7 @@ import { SSE_BASE } from './api';
  * @param {Function} handlers.onDownloadProgress - Called with { module, status, message } for download updates
  * @param {Function} handlers.onModuleProgress - Called with { module, status, message } for module processing updates
  * @param {Function} handlers.onIdChanged - Called with { new_id } when project ID changes
+ * @param {Function} handlers.onJobStatus - Called with { job_id, status, position? } when the job state changes
  * @param {Function} handlers.onError - Called with { module, status, message } on error
  * @param {Function} handlers.onDone - Called when stream is complete
  * @param {Function} handlers.onConnectionError - Called when SSE connection fails
@@ -38,6 +40,7 @@ export function createSSEConnection(jobId, handlers = {}) {
         onModuleProgress,
         onModelDownloading,
         onIdChanged,
+        onJobStatus,
         onError,
         onDone,
         onConnectionError
@@ -94,6 +97,19 @@ export function createSSEConnection(jobId, handlers = {}) {
             }
         });
 
+        // Handle background job status events
+        eventSource.addEventListener('job_status', (event) => {
+            retryCount = 0; // Reset retry count on successful event
+            try {
+                const data = JSON.parse(event.data);
+                if (onJobStatus) {
+                    onJobStatus(data);
+                }
+            } catch (e) {
+                console.error('Failed to parse job_status event:', e);
+            }
+        });
+
         // Handle project ID change events - reconnect to new ID
         eventSource.addEventListener('id_changed', (event) => {
             retryCount = 0; // Reset retry count on successful event